@@ -144,6 +144,9 @@ function loadPersonaProfile(): PersonaProfile | null {
 router.post('/chat', async (req: Request, res: Response) => {
   console.log('[CHAT_FN] POST /chat received.');
   const userMessageText = req.body.message;
+  // Optional caller-supplied context (e.g. the evaluation runner's per-case persona snapshot);
+  // when absent, the context is built from the bundled data files
+  const requestContext = typeof req.body.context === 'string' && req.body.context.trim() ? req.body.context : null;
 
   if (!userMessageText) {
     console.log('[CHAT_FN] No message provided by user.');
@@ -157,26 +160,32 @@ router.post('/chat', async (req: Request, res: Response) => {
 
   try {
     const systemPromptContent = loadSystemPrompt();
-    const currentMetrics = loadCurrentMetrics();
-    const recentTrends = loadRecentTrends();
-    const personaProfile = loadPersonaProfile();
-    const now = new Date();
-    const formatter = new Intl.DateTimeFormat('en-CA', { // 'en-CA' locale often gives YYYY-MM-DD format
-      timeZone: 'America/Los_Angeles',
-      year: 'numeric',
-      month: '2-digit',
-      day: '2-digit',
-    });
-    const currentDate = formatter.format(now); // This will be YYYY-MM-DD for 'America/Los_Angeles' in 'en-CA' locale
-
-    let contextForAI = `Today's Date: ${currentDate}\n\n`;
-
-    contextForAI += "## Current Metrics (Today's Snapshot):\n";
-    contextForAI += currentMetrics ? JSON.stringify(currentMetrics, null, 2) : "No current metrics available.\n";
-    contextForAI += "\n\n## Recent Trends (Summary of last 14 days):\n";
-    contextForAI += recentTrends;
-    contextForAI += "\n\n## My Persona Profile (Goals, Baselines, Lifestyle):\n";
-    contextForAI += personaProfile ? JSON.stringify(personaProfile, null, 2) : "No persona profile available.\n";
+    let contextForAI: string;
+    if (requestContext) {
+      console.log('[CHAT_FN] Using context supplied in the request.');
+      contextForAI = requestContext;
+    } else {
+      const currentMetrics = loadCurrentMetrics();
+      const recentTrends = loadRecentTrends();
+      const personaProfile = loadPersonaProfile();
+      const now = new Date();
+      const formatter = new Intl.DateTimeFormat('en-CA', { // 'en-CA' locale often gives YYYY-MM-DD format
+        timeZone: 'America/Los_Angeles',
+        year: 'numeric',
+        month: '2-digit',
+        day: '2-digit',
+      });
+      const currentDate = formatter.format(now); // This will be YYYY-MM-DD for 'America/Los_Angeles' in 'en-CA' locale
+
+      contextForAI = `Today's Date: ${currentDate}\n\n`;
+
+      contextForAI += "## Current Metrics (Today's Snapshot):\n";
+      contextForAI += currentMetrics ? JSON.stringify(currentMetrics, null, 2) : "No current metrics available.\n";
+      contextForAI += "\n\n## Recent Trends (Summary of last 14 days):\n";
+      contextForAI += recentTrends;
+      contextForAI += "\n\n## My Persona Profile (Goals, Baselines, Lifestyle):\n";
+      contextForAI += personaProfile ? JSON.stringify(personaProfile, null, 2) : "No persona profile available.\n";
+    }
 
     const messages: OpenAI.Chat.Completions.ChatCompletionMessageParam[] = [
       { role: 'system', content: systemPromptContent },
@@ -199,7 +208,7 @@ router.post('/chat', async (req: Request, res: Response) => {
       throw new Error('No text in OpenAI completion choice.');
     }
     console.log('[CHAT_FN] Successfully received response from OpenAI.');
-    res.json({ reply: aiText });
+    res.json({ reply: aiText, contextSource: requestContext ? 'request' : 'static' });
     console.log('[CHAT_FN] Sent AI reply to client.');
 
   } catch (error: any) {
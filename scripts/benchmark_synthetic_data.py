@@ -0,0 +1,195 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import dataset_io
+import generate_synthetic_data as gsd
+from generate_population import generate_population
+from metric_store import MetricStore
+
+# name -> (users, days). Single-user scales use the one-user engine, the others the population path.
+SCALES = {
+    '90_days': (1, 90),
+    '10_years': (1, 3650),
+    '1k_users': (1_000, 90),
+    '100k_users': (100_000, 90),
+}
+DEFAULT_SCALES = ['90_days', '10_years', '1k_users', '100k_users']
+# Stages left out of a scale unless --stages names them: JSON at 9M rows goes through pandas
+# and needs several GB and minutes per run
+DEFAULT_SKIPPED_STAGES = {'100k_users': {'export_json'}}
+QUERIES_PER_RUN = 1000
+DEFAULT_REGRESSION_THRESHOLD = 0.25 # Fraction slower (or larger) than baseline that counts as a regression
+# Smaller increases never count, whatever the fraction: sub-millisecond stages vary by +50-100%
+# between identical runs, which is scheduler noise, not a regression
+DEFAULT_MIN_REGRESSION_MS = 5.0
+MIN_REGRESSION_BYTES = 1 << 20
+BENCHMARK_SEED = 1234
+
+def _children_usage() -> tuple[float, int]:
+    """(CPU seconds, peak RSS in bytes of the largest one) over every child process that has exited."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss * 1024 # ru_maxrss is in KiB on Linux
+
+def measure(func, repeat: int) -> tuple[object, float, int, int]:
+    """
+    Runs func `repeat` times untraced and keeps the best wall time, then once more under
+    tracemalloc for memory (tracing slows allocation-heavy stages several-fold, so it never
+    overlaps the timed runs). Returns (last result, best wall time in s, traced in-process peak
+    in bytes, peak RSS in bytes of the largest worker process the memory run started, or 0).
+    Worker memory comes from getrusage(RUSAGE_CHILDREN), which only reports the largest child
+    since startup, so it is only attributed to a stage whose run actually started children.
+    """
+    best_time = float('inf')
+    result = None
+    for _ in range(repeat):
+        result = None # Let the previous result go before the next run
+        started = time.perf_counter()
+        result = func()
+        best_time = min(best_time, time.perf_counter() - started)
+
+    result = None
+    children_cpu_before, _ = _children_usage()
+    tracemalloc.start()
+    result = func()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    children_cpu_after, children_peak_rss = _children_usage()
+    return result, best_time, peak_bytes, children_peak_rss if children_cpu_after > children_cpu_before else 0
+
+def run_queries(store: MetricStore, num_queries: int) -> None:
+    """Mixes the three query helpers over dates spread across the store."""
+    offsets = np.linspace(0, store.num_days - 1, num_queries).astype(int)
+    for offset in offsets.tolist():
+        date = store.start_date + np.timedelta64(offset, 'D')
+        gsd.get_metric_for_date(store, date, 'hrv')
+        gsd.get_last_n_days_average(store, 'recovery_score_percent', 7)
+        gsd.get_yesterdays_metric(store, 'strain_score')
+
+def benchmark_scale(scale: str, repeat: int, stages: list[str]) -> list[dict]:
+    """Benchmarks each requested stage at one scale and returns one result record per stage."""
+    num_users, num_days = SCALES[scale]
+    start_date = gsd.END_DATE - datetime.timedelta(days=num_days - 1)
+    num_rows = num_users * num_days
+
+    def generate():
+        if num_users == 1:
+            return gsd.generate_daily_arrays(num_days, start_date, rng=BENCHMARK_SEED)
+        return generate_population(num_users, num_days, start_date, BENCHMARK_SEED)
+
+    table, *measured = measure(generate, repeat)
+    results = []
+
+    def record(stage: str, items: int, elapsed: float, peak: int, children_peak: int) -> None:
+        results.append({'scale': scale, 'stage': stage, 'rows': items, 'wall_time_s': elapsed,
+                        'peak_memory_bytes': peak, 'worker_peak_rss_bytes': children_peak,
+                        'rows_per_second': items / elapsed if elapsed > 0 else None})
+        workers = f" (largest worker {children_peak / 2**20:.1f} MiB RSS)" if children_peak else ""
+        print(f"{scale:>11} {stage:<12} {elapsed * 1000:10.1f} ms {peak / 2**20:9.1f} MiB {items / max(elapsed, 1e-9):14,.0f} rows/s{workers}")
+
+    if 'generate' in stages:
+        record('generate', num_rows, *measured)
+    if 'validate' in stages:
+        _, *measured = measure(lambda: gsd.validate_metrics(table), repeat)
+        record('validate', num_rows, *measured)
+    if 'query' in stages:
+        # Queries are per user, so population scales query the first user's days
+        user_rows = slice(0, num_days)
+        columns = {name: np.asarray(table[name])[user_rows] for name in gsd.METRIC_COLUMNS}
+        dates = np.asarray(table['date'])[user_rows]
+        _, *measured = measure(lambda: run_queries(MetricStore.from_arrays(dates, columns), QUERIES_PER_RUN), repeat)
+        record('query', QUERIES_PER_RUN * 3, *measured)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if 'export_json' in stages:
+            _, *measured = measure(lambda: dataset_io.write_json(os.path.join(tmp_dir, 'data.json'), table), repeat)
+            record('export_json', num_rows, *measured)
+        if 'export_npy' in stages:
+            _, *measured = measure(lambda: dataset_io.write_npy_columns(os.path.join(tmp_dir, 'data'), table), repeat)
+            record('export_npy', num_rows, *measured)
+    return results
+
+STAGES = ['generate', 'validate', 'query', 'export_json', 'export_npy']
+
+def compare_to_baseline(results: list[dict], baseline: list[dict], threshold: float,
+                        min_regression_ms: float = DEFAULT_MIN_REGRESSION_MS) -> list[str]:
+    """
+    Returns one message per (scale, stage) whose wall time or peak memory exceeds baseline *
+    (1 + threshold) by at least min_regression_ms (wall time) or MIN_REGRESSION_BYTES (memory).
+    """
+    floors = {'wall_time_s': min_regression_ms / 1000, 'peak_memory_bytes': MIN_REGRESSION_BYTES,
+              'worker_peak_rss_bytes': MIN_REGRESSION_BYTES}
+    baseline_by_key = {(entry['scale'], entry['stage']): entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        reference = baseline_by_key.get((entry['scale'], entry['stage']))
+        if reference is None:
+            continue
+        for field, label in (('wall_time_s', 'wall time'), ('peak_memory_bytes', 'peak memory'),
+                             ('worker_peak_rss_bytes', 'worker peak RSS')):
+            if (reference.get(field) and entry[field] > reference[field] * (1 + threshold)
+                    and entry[field] - reference[field] >= floors[field]):
+                regressions.append(f"{entry['scale']}/{entry['stage']}: {label} {entry[field]:.4g} vs baseline {reference[field]:.4g} "
+                                   f"(+{(entry[field] / reference[field] - 1) * 100:.0f}%)")
+    return regressions
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark synthetic data generation, validation, queries and export.")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=DEFAULT_SCALES)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=None,
+                        help="Stages to run at every scale (default: all, except export_json at 100k_users)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per stage; the best wall time is kept (default: 3)")
+    parser.add_argument('--output', default='benchmark_results.json', help="Results file (default: benchmark_results.json)")
+    parser.add_argument('--baseline', default=None, help="Baseline results file to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help=f"Allowed slowdown / growth vs baseline before failing (default: {DEFAULT_REGRESSION_THRESHOLD})")
+    parser.add_argument('--min-regression-ms', type=float, default=DEFAULT_MIN_REGRESSION_MS,
+                        help=f"Ignore wall-time increases smaller than this (default: {DEFAULT_MIN_REGRESSION_MS:g} ms)")
+    parser.add_argument('--save-baseline', action='store_true', help="Also write the results to --baseline")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    results = []
+    for scale in args.scales:
+        stages = args.stages or [stage for stage in STAGES if stage not in DEFAULT_SKIPPED_STAGES.get(scale, ())]
+        results.extend(benchmark_scale(scale, args.repeat, stages))
+
+    report = {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare_to_baseline(results, baseline, args.threshold, args.min_regression_ms)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%} of baseline:")
+            for regression in regressions:
+                print(f"- {regression}")
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} of baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import dataset_io
+import generate_synthetic_data as gsd
+from metric_store import to_day
+
+# Population queries over a dense users x days x metrics float32 cube. The cube is stored
+# metric-major, (metrics, users, days), so each metric's (users, days) plane is contiguous and
+# a query reads only the metric it asks about; Cohort.cube exposes the users x days x metrics
+# view without copying. Every query reduces a plane with whole-array NumPy operations.
+CUBE_DTYPE = np.float32
+CUBE_FILENAME = 'values.npy'
+COHORT_FILENAME = 'cohort.json'
+USERS_DIRNAME = 'users'
+AGGREGATES = ['mean', 'sum', 'min', 'max', 'std', 'count']
+COMPARISONS = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal, '==': np.equal, '!=': np.not_equal}
+# Built-in groupings; any user attribute name also works as `by`
+GROUP_BY_DATE = 'date'
+GROUP_BY_WEEKDAY = 'weekday'
+GROUP_BY_USER = 'user'
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+class AttributeIndex:
+    """
+    Sorted index over one per-user attribute: equality, membership and range filters are
+    binary searches returning the matching users in O(log users + matches), and group-by uses
+    codes computed once from the same sort.
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.values = np.asarray(values)
+        self.order = np.argsort(self.values, kind='stable')
+        self.sorted = self.values[self.order]
+        boundaries = np.flatnonzero(self.sorted[1:] != self.sorted[:-1]) + 1
+        self.categories = self.sorted[np.concatenate([[0], boundaries])] if len(self.sorted) else self.sorted
+        self.codes = np.empty(len(self.values), dtype=np.int64)
+        self.codes[self.order] = np.repeat(np.arange(len(self.categories)), np.diff(np.concatenate([[0], boundaries, [len(self.sorted)]])))
+
+    def equal(self, value) -> np.ndarray:
+        return self.order[np.searchsorted(self.sorted, value, 'left'):np.searchsorted(self.sorted, value, 'right')]
+
+    def isin(self, values) -> np.ndarray:
+        return np.concatenate([self.equal(value) for value in values]) if len(values) else np.empty(0, dtype=np.int64)
+
+    def between(self, low=None, high=None) -> np.ndarray:
+        """Users with low <= value <= high (None = open-ended)."""
+        first = 0 if low is None else np.searchsorted(self.sorted, low, 'left')
+        last = len(self.sorted) if high is None else np.searchsorted(self.sorted, high, 'right')
+        return self.order[first:last]
+
+class Cohort:
+    """
+    A population's daily metrics as one dense cube plus an index per user attribute.
+
+    All users share the same date range (as generate_population() writes them). `users`
+    arguments take an array of user positions (from select(), or None for everyone); dates
+    are inclusive and accept anything metric_store.to_day() does.
+    """
+
+    def __init__(self, values: np.ndarray, metrics: list[str], start_date, user_ids: np.ndarray,
+                 attributes: dict[str, np.ndarray] | None = None):
+        """Wraps a (metrics, users, days) array, e.g. memory-mapped from write_cohort()."""
+        if values.ndim != 3 or values.shape[0] != len(metrics) or values.shape[1] != len(user_ids):
+            raise ValueError(f"Expected a ({len(metrics)}, {len(user_ids)}, days) array, got {values.shape}.")
+        self.values = values
+        self.metrics = list(metrics)
+        self.start_date = to_day(start_date)
+        self.user_ids = np.asarray(user_ids)
+        self._metric_positions = {name: position for position, name in enumerate(self.metrics)}
+        self.attributes = {}
+        self.indexes = {}
+        for name, column in (attributes or {}).items():
+            self.add_attribute(name, column)
+        self.weekday = (self.start_date.astype(np.int64) + 3 + np.arange(self.num_days)) % 7 # 1970-01-01 was a Thursday
+
+    @classmethod
+    def from_table(cls, table, metrics: list[str] | None = None, attributes: dict[str, np.ndarray] | None = None) -> "Cohort":
+        """
+        Builds the cube from a long-format population table (user-major, the same consecutive
+        dates for every user), e.g. generate_population() output or its .npy dataset.
+        """
+        metrics = [name for name in gsd.METRIC_COLUMNS if name in table.keys()] if metrics is None else metrics
+        user_id = np.asarray(table['user_id'])
+        dates = np.asarray(table['date'], dtype='datetime64[D]')
+        starts = np.concatenate([[0], np.flatnonzero(user_id[1:] != user_id[:-1]) + 1])
+        num_users, num_days = len(starts), len(dates) // max(len(starts), 1)
+        if num_users * num_days != len(dates) or not np.array_equal(np.diff(starts), np.full(num_users - 1, num_days)):
+            raise ValueError("Every user needs the same number of days to form a cube.")
+        day_dates = dates[:num_days]
+        if np.any(np.diff(day_dates) != np.timedelta64(1, 'D')) or not np.array_equal(dates.reshape(num_users, num_days)[:, 0], np.full(num_users, day_dates[0])):
+            raise ValueError("Every user needs the same consecutive dates to form a cube.")
+        values = np.empty((len(metrics), num_users, num_days), dtype=CUBE_DTYPE)
+        for position, name in enumerate(metrics):
+            values[position] = np.asarray(table[name]).reshape(num_users, num_days)
+        return cls(values, metrics, day_dates[0], user_id[starts], attributes)
+
+    @property
+    def num_users(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def num_days(self) -> int:
+        return self.values.shape[2]
+
+    @property
+    def cube(self) -> np.ndarray:
+        """The users x days x metrics view of the data (no copy)."""
+        return np.moveaxis(self.values, 0, -1)
+
+    def dates(self, start=None, end=None) -> np.ndarray:
+        first, last = self._day_range(start, end)
+        return self.start_date + np.arange(first, last)
+
+    def add_attribute(self, name: str, values: np.ndarray) -> None:
+        """Adds (or replaces) a per-user attribute, aligned with user_ids, and indexes it."""
+        values = np.asarray(values)
+        if values.shape != (self.num_users,):
+            raise ValueError(f"Attribute '{name}' needs one value per user ({self.num_users}), got shape {values.shape}.")
+        self.attributes[name] = values
+        self.indexes[name] = AttributeIndex(values)
+
+    def _day_range(self, start, end) -> tuple[int, int]:
+        """Inclusive dates (None = open-ended) to a clamped half-open day range."""
+        first = 0 if start is None else max(int((to_day(start) - self.start_date).astype(np.int64)), 0)
+        last = self.num_days if end is None else min(int((to_day(end) - self.start_date).astype(np.int64)) + 1, self.num_days)
+        return first, max(first, last)
+
+    def plane(self, metric_name: str, start=None, end=None, users: np.ndarray | None = None) -> np.ndarray:
+        """(users, days) values of one metric; a view unless `users` selects a subset."""
+        if metric_name not in self._metric_positions:
+            raise KeyError(f"Unknown metric '{metric_name}'; available: {', '.join(self.metrics)}.")
+        first, last = self._day_range(start, end)
+        values = self.values[self._metric_positions[metric_name], :, first:last]
+        return values if users is None else values[users]
+
+    # --- Filters ---
+    def select(self, users: np.ndarray | None = None, **filters) -> np.ndarray:
+        """
+        Sorted positions of the users matching every attribute filter, within `users` if given.
+        A filter value is matched exactly, a list or set matches any of its values and a
+        (low, high) tuple is an inclusive range (either end may be None).
+        """
+        selected = np.arange(self.num_users) if users is None else np.asarray(users)
+        for name, condition in filters.items():
+            if name not in self.indexes:
+                raise KeyError(f"Unknown attribute '{name}'; available: {', '.join(self.indexes)}.")
+            index = self.indexes[name]
+            if isinstance(condition, tuple):
+                matches = index.between(*condition)
+            elif isinstance(condition, (list, set, np.ndarray)):
+                matches = index.isin(list(condition))
+            else:
+                matches = index.equal(condition)
+            selected = np.intersect1d(selected, matches)
+        return selected
+
+    def where(self, metric_name: str, op: str, threshold, date, users: np.ndarray | None = None) -> np.ndarray:
+        """Positions of the users whose metric on `date` satisfies `op threshold`."""
+        values = self.plane(metric_name, date, date, users)
+        if values.shape[1] == 0:
+            raise ValueError(f"{date} is outside the cohort's dates.")
+        values = values[:, 0]
+        matches = np.flatnonzero(COMPARISONS[op](values, threshold))
+        return matches if users is None else np.asarray(users)[matches]
+
+    # --- Aggregation ---
+    def aggregate(self, metric_name: str, agg: str = 'mean', by: str | None = None, start=None, end=None,
+                  users: np.ndarray | None = None) -> dict[str, np.ndarray] | float | None:
+        """
+        Aggregates a metric over the selected users and dates, overall (by=None) or grouped by
+        'date', 'weekday', 'user' or a user attribute. Grouped results are dicts with the group
+        keys under 'group' and the values under `agg`.
+        """
+        return self._aggregate(self.plane(metric_name, start, end, users), agg, by, start, users)
+
+    def share(self, metric_name: str, op: str, threshold, by: str | None = None, start=None, end=None,
+              users: np.ndarray | None = None) -> dict[str, np.ndarray] | float | None:
+        """
+        Percentage of user-days where the metric satisfies `op threshold` (for a single date,
+        start=end=date, the percentage of users), overall or grouped like aggregate().
+        """
+        indicator = COMPARISONS[op](self.plane(metric_name, start, end, users), threshold)
+        result = self._aggregate(indicator, 'mean', by, start, users)
+        if isinstance(result, dict):
+            return {'group': result['group'], 'percent': result['mean'] * 100, 'count': result['count']}
+        return None if result is None else result * 100
+
+    def top_k(self, metric_name: str, k: int, agg: str = 'mean', start=None, end=None, largest: bool = True,
+              users: np.ndarray | None = None) -> dict[str, np.ndarray]:
+        """The k users with the largest (or smallest) per-user aggregate, best first."""
+        per_user = self._aggregate(self.plane(metric_name, start, end, users), agg, GROUP_BY_USER, start, users)
+        if per_user is None or k <= 0:
+            return {'user_id': self.user_ids[:0], agg: np.empty(0)}
+        scores = per_user[agg] if largest else -per_user[agg]
+        k = min(k, len(scores))
+        best = np.argpartition(scores, len(scores) - k)[len(scores) - k:]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return {'user_id': per_user['group'][best], agg: per_user[agg][best]}
+
+    def _aggregate(self, plane: np.ndarray, agg: str, by: str | None, start, users: np.ndarray | None):
+        if agg not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{agg}', expected one of {', '.join(AGGREGATES)}.")
+        if plane.size == 0:
+            return None
+        if by is None:
+            return float(_reduce(plane, agg, axis=None))
+        first = self._day_range(start, None)[0]
+        days = slice(first, first + plane.shape[1])
+        if by == GROUP_BY_DATE:
+            return {'group': self.start_date + np.arange(days.start, days.stop), agg: _reduce(plane, agg, axis=0),
+                    'count': np.full(plane.shape[1], plane.shape[0])}
+        if by == GROUP_BY_USER:
+            return {'group': self.user_ids if users is None else self.user_ids[users], agg: _reduce(plane, agg, axis=1),
+                    'count': np.full(plane.shape[0], plane.shape[1])}
+        if by == GROUP_BY_WEEKDAY:
+            # Reduce over users first, then combine the per-day partials by weekday
+            codes, names, axis = self.weekday[days], np.array(WEEKDAY_NAMES), 0
+        elif by in self.indexes:
+            index = self.indexes[by]
+            codes, names, axis = (index.codes if users is None else index.codes[users]), index.categories, 1
+        else:
+            raise KeyError(f"Unknown grouping '{by}'; use date, weekday, user or one of: {', '.join(self.indexes)}.")
+        values, counts = _grouped_reduce(plane, agg, axis, codes, len(names))
+        present = counts > 0
+        return {'group': names[present], agg: values[present], 'count': counts[present]}
+
+def _reduce(plane: np.ndarray, agg: str, axis):
+    if agg == 'mean':
+        return plane.mean(axis=axis, dtype=np.float64)
+    if agg == 'sum':
+        return plane.sum(axis=axis, dtype=np.float64)
+    if agg == 'std':
+        return plane.std(axis=axis, dtype=np.float64)
+    if agg == 'count':
+        return float(plane.size) if axis is None else np.full(plane.shape[1 - axis], float(plane.shape[axis]))
+    return (plane.min if agg == 'min' else plane.max)(axis=axis).astype(np.float64)
+
+def _grouped_reduce(plane: np.ndarray, agg: str, axis: int, codes: np.ndarray, num_groups: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reduces a (users, days) plane along `axis` into partials, then combines the partials of each
+    group (codes index the other axis): sums with bincount, min / max with reduceat over the
+    codes' sort order. Returns (values, user-days per group).
+    """
+    counts = np.bincount(codes, minlength=num_groups) * plane.shape[axis]
+    if agg in ('min', 'max'):
+        partials = (plane.min if agg == 'min' else plane.max)(axis=axis).astype(np.float64)
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.concatenate([[True], sorted_codes[1:] != sorted_codes[:-1]])) if len(codes) else np.empty(0, dtype=np.int64)
+        values = np.full(num_groups, np.nan)
+        if len(starts):
+            values[sorted_codes[starts]] = (np.minimum if agg == 'min' else np.maximum).reduceat(partials[order], starts)
+        return values, counts
+    if agg == 'count':
+        return counts.astype(np.float64), counts
+    sums = np.bincount(codes, weights=plane.sum(axis=axis, dtype=np.float64), minlength=num_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if agg == 'sum':
+            return sums, counts
+        means = sums / counts
+        if agg == 'mean':
+            return means, counts
+        squares = np.bincount(codes, weights=np.square(plane, dtype=np.float64).sum(axis=axis), minlength=num_groups)
+        return np.sqrt(np.maximum(squares / counts - means ** 2, 0)), counts
+
+# --- Storage: <directory>/values.npy (the metric-major cube), cohort.json and users/ (.npy layout) ---
+def write_cohort(directory: str, cohort: Cohort) -> None:
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, CUBE_FILENAME), np.ascontiguousarray(cohort.values, dtype=CUBE_DTYPE), allow_pickle=False)
+    dataset_io.write_npy_columns(os.path.join(directory, USERS_DIRNAME), {'user_id': cohort.user_ids, **cohort.attributes})
+    description = {'metrics': cohort.metrics, 'start_date': str(cohort.start_date), 'shape': list(cohort.values.shape),
+                   'sha256': dataset_io.column_sha256(cohort.values)}
+    with open(os.path.join(directory, COHORT_FILENAME), 'w') as f:
+        json.dump(description, f, indent=2)
+
+def load_cohort(directory: str, mmap: bool = True) -> Cohort:
+    """Opens a written cohort; with mmap=True the cube is memory-mapped and pages are read as queries touch them."""
+    with open(os.path.join(directory, COHORT_FILENAME)) as f:
+        description = json.load(f)
+    values = np.load(os.path.join(directory, CUBE_FILENAME), mmap_mode='r' if mmap else None, allow_pickle=False)
+    users = dataset_io.load_npy_columns(os.path.join(directory, USERS_DIRNAME), mmap=False)
+    user_ids = users.pop('user_id')
+    return Cohort(values, description['metrics'], description['start_date'], user_ids, users)
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build a population cohort cube and run example cohort queries.")
+    parser.add_argument('--data', default=None, help="Population .npy dataset (default: generate one)")
+    parser.add_argument('--cohort', default=None, metavar='DIR', help="Open a cohort written by --output instead")
+    parser.add_argument('--users', type=int, default=100_000, help="Users to generate without --data (default: 100000)")
+    parser.add_argument('--days', type=int, default=gsd.NUM_DAYS, help=f"Days to generate without --data (default: {gsd.NUM_DAYS})")
+    parser.add_argument('--seed', type=int, default=0, help="Seed when generating (default: 0)")
+    parser.add_argument('--output', default=None, metavar='DIR', help="Write the cohort here for memory-mapped reuse")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    from generate_population import generate_population
+    args = parse_args(argv)
+    started = time.perf_counter()
+    if args.cohort:
+        cohort = load_cohort(args.cohort)
+    else:
+        if args.data:
+            table = dataset_io.load_npy_columns(args.data)
+        else:
+            start_date = gsd.END_DATE - datetime.timedelta(days=args.days - 1)
+            table = generate_population(args.users, args.days, start_date, args.seed)
+        cohort = Cohort.from_table(table)
+        # An example attribute: each user's HRV band from their mean HRV
+        mean_hrv = cohort.aggregate('hrv', by=GROUP_BY_USER)['mean']
+        cohort.add_attribute('hrv_band', np.array(['low', 'typical', 'high'])[np.digitize(mean_hrv, [gsd.HRV_BASELINE_MIN, gsd.HRV_BASELINE_MAX])])
+        if args.output:
+            write_cohort(args.output, cohort)
+    print(f"Cohort of {cohort.num_users} users x {cohort.num_days} days x {len(cohort.metrics)} metrics "
+          f"ready in {time.perf_counter() - started:.2f}s")
+
+    last_date = cohort.start_date + np.timedelta64(cohort.num_days - 1, 'D')
+    queries = [
+        ("Mean recovery by weekday", lambda: cohort.aggregate('recovery_score_percent', by=GROUP_BY_WEEKDAY)),
+        (f"% of users with HRV < 40 on {last_date}", lambda: cohort.share('hrv', '<', 40, start=last_date, end=last_date)),
+        ("Top 5 users by 30-day strain", lambda: cohort.top_k('strain_score', 5, start=last_date - np.timedelta64(29, 'D'))),
+    ]
+    if 'hrv_band' in cohort.indexes:
+        queries.append(("Mean sleep by HRV band", lambda: cohort.aggregate('sleep_duration_hours', by='hrv_band')))
+    for label, query in queries:
+        query_started = time.perf_counter()
+        result = query()
+        elapsed_ms = (time.perf_counter() - query_started) * 1000
+        if isinstance(result, dict):
+            keys, values = list(result.values())[:2]
+            result = ', '.join(f"{key}: {value:.2f}" for key, value in zip(keys.tolist(), values.tolist()))
+        else:
+            result = f"{result:.2f}"
+        print(f"{label} ({elapsed_ms:.1f} ms): {result}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import argparse
+import datetime
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import dataset_io
+import generate_synthetic_data as gsd
+from event_calendar import EventCalendar
+from generate_population import generate_population
+
+# Content-addressed cache of generated datasets. An entry's key hashes everything that
+# determines the output: GENERATOR_VERSION, the source of the generator and of the .npy layout
+# it is stored in (dtypes and restored precision), the live module constants (Executive Alex's
+# persona, NUM_DAYS, recovery weights, ...), the date range, the resolved event calendar, the
+# user count and the seed. Entries are stored in the
+# checksummed .npy layout under <cache>/entries/<key>; <cache>/index.json records each
+# entry's size and last use, plus cumulative hit / miss / eviction counts.
+GENERATOR_VERSION = 1 # Bump when generation changes in a way the source hash would not catch
+GENERATOR_SOURCES = ['generate_synthetic_data.py', 'generate_population.py', 'event_calendar.py', 'dataset_io.py']
+# Constants that only affect where or how output is written, not its content
+NON_GENERATION_CONSTANTS = {'OUTPUT_DIR', 'OUTPUT_FILENAME', 'OUTPUT_FILE_PATH', 'DEFAULT_CHUNK_DAYS'}
+DEFAULT_CACHE_DIR = os.environ.get('WHOOP_DATASET_CACHE', os.path.join(gsd.OUTPUT_DIR, 'cache'))
+DEFAULT_MAX_BYTES = 1 << 30
+INDEX_FILENAME = 'index.json'
+LOCK_FILENAME = '.lock'
+
+_source_digest = None
+
+def generator_source_digest() -> str:
+    """SHA-256 over the generator's source files, computed once per process."""
+    global _source_digest
+    if _source_digest is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for name in GENERATOR_SOURCES:
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(name.encode() + b'\0' + f.read())
+        _source_digest = digest.hexdigest()
+    return _source_digest
+
+def generation_constants() -> dict:
+    """The generator module's upper-case constants as they are now (so patched values count)."""
+    return {name: value for name, value in vars(gsd).items()
+            if name.isupper() and not name.startswith('_') and name not in NON_GENERATION_CONSTANTS
+            and isinstance(value, (int, float, str, list, tuple, dict, datetime.date))}
+
+def cache_key(num_days: int, start_date: datetime.date, seed: int, num_users: int = 1,
+              calendar: EventCalendar | None = None) -> tuple[str, dict]:
+    """Returns (key, params): the hex key and the canonical parameters it hashes."""
+    params = {
+        'generator_version': GENERATOR_VERSION,
+        'generator_source': generator_source_digest(),
+        'constants': generation_constants(),
+        'num_days': int(num_days),
+        'start_date': start_date.isoformat(),
+        'num_users': int(num_users),
+        'events': (calendar or gsd.default_event_calendar()).to_config()['events'],
+        'seed': int(seed),
+    }
+    encoded = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest(), params
+
+def generate_dataset(num_days: int, start_date: datetime.date, seed: int, num_users: int = 1,
+                     calendar: EventCalendar | None = None) -> tuple[dict[str, np.ndarray], dict]:
+    """
+    Generates what the cache stores, as (table, .npy attributes). One user is generated as a
+    stream with a checkpoint (so a copy of the entry can be appended to); several users get a
+    'user_id' column, exactly as generate_population() produces them, and record the seed
+    (one user's checkpoint already holds the generator state).
+    """
+    attributes = {'start_date': start_date.isoformat()}
+    if calendar is not None:
+        attributes['events'] = calendar.to_config()['events']
+    if num_users == 1:
+        rng = np.random.default_rng(seed)
+        state = gsd.GenerationState(trend_days=num_days)
+        table = gsd.generate_chunk(rng, start_date, num_days, state, calendar)
+        attributes.update(contiguous=True, checkpoint=gsd.checkpoint_to_dict(state, rng))
+        return table, attributes
+    attributes.update(num_users=num_users, seed=str(seed))
+    return generate_population(num_users, num_days, start_date, seed, calendar=calendar), attributes
+
+def to_generated_dtypes(table) -> dict[str, np.ndarray]:
+    """
+    Converts cached compact columns back to the generator's dtypes (int64, and float64
+    rounded to EXPORT_DECIMALS), which reproduces the generated arrays exactly.
+    """
+    columns = {}
+    for name in table.keys():
+        values = np.asarray(table[name])
+        if name in dataset_io.EXPORT_DECIMALS:
+            columns[name] = np.round(values.astype(np.float64), dataset_io.EXPORT_DECIMALS[name])
+        elif np.issubdtype(values.dtype, np.integer):
+            columns[name] = values.astype(np.int64)
+        else:
+            columns[name] = np.array(values)
+    return columns
+
+def _directory_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+class DatasetCache:
+    """
+    Size-bounded LRU cache of generated datasets, safe to share between processes.
+
+    The index is only read and rewritten under an exclusive lock on <cache>/.lock, and a
+    per-key lock makes concurrent requests for the same missing entry generate it once: the
+    others wait and then load it. New entries are written to a temporary directory and
+    renamed into place, so a reader never sees a partial entry. After each insertion the
+    least recently used entries are evicted until the cache fits in max_bytes (the new entry
+    itself is always kept).
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive.")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries_dir = os.path.join(directory, 'entries')
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+    @contextmanager
+    def _locked(self, name: str = LOCK_FILENAME):
+        with open(os.path.join(self.directory, name), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, INDEX_FILENAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'entries': {}, 'stats': {'hits': 0, 'misses': 0, 'evictions': 0}}
+
+    def _write_index(self, index: dict) -> None:
+        tmp_path = os.path.join(self.directory, INDEX_FILENAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.directory, INDEX_FILENAME))
+
+    def _lookup(self, key: str, mmap: bool) -> tuple[dict[str, np.ndarray], dict] | None:
+        """
+        Opens a cached entry, counting the hit and refreshing its last use; None if it is not
+        cached. Opening under the index lock keeps another process from evicting it meanwhile.
+        """
+        with self._locked():
+            index = self._read_index()
+            entry = index['entries'].get(key)
+            path = os.path.join(self.entries_dir, key)
+            if entry is None or not os.path.isdir(path):
+                return None
+            entry['last_used'] = time.time()
+            index['stats']['hits'] += 1
+            self._write_index(index)
+            return dataset_io.load_npy_columns(path, mmap=mmap), dataset_io.read_manifest(path)['attributes']
+
+    def _insert(self, key: str, path: str, params: dict) -> None:
+        """Moves a written entry into place, counts the miss and evicts down to max_bytes."""
+        with self._locked():
+            index = self._read_index()
+            final_path = os.path.join(self.entries_dir, key)
+            if os.path.isdir(final_path):
+                shutil.rmtree(final_path)
+            os.rename(path, final_path)
+            index['entries'][key] = {'bytes': _directory_size(final_path), 'last_used': time.time(),
+                                     'num_days': params['num_days'], 'start_date': params['start_date'],
+                                     'num_users': params['num_users'], 'seed': params['seed']}
+            index['stats']['misses'] += 1
+            total = sum(entry['bytes'] for entry in index['entries'].values())
+            for old_key in sorted(index['entries'], key=lambda name: index['entries'][name]['last_used']):
+                if total <= self.max_bytes:
+                    break
+                if old_key == key:
+                    continue
+                # Open memory maps of an evicted entry stay valid: unlinked files live until unmapped
+                shutil.rmtree(os.path.join(self.entries_dir, old_key), ignore_errors=True)
+                total -= index['entries'].pop(old_key)['bytes']
+                index['stats']['evictions'] += 1
+            self._write_index(index)
+
+    def get_or_generate(self, num_days: int, start_date: datetime.date, seed: int, num_users: int = 1,
+                        calendar: EventCalendar | None = None, mmap: bool = True) -> tuple[dict[str, np.ndarray], dict]:
+        """
+        Returns (table, attributes) for these parameters, loading the cached entry when there is
+        one and generating and storing it otherwise. Cached columns come back in the compact
+        .npy dtypes, memory-mapped read-only unless mmap=False.
+        """
+        if seed is None:
+            raise ValueError("Only seeded datasets can be cached.")
+        key, params = cache_key(num_days, start_date, seed, num_users, calendar)
+        cached = self._lookup(key, mmap)
+        if cached is not None:
+            return cached
+        with self._locked(f".{key}.lock"):
+            # Another process may have generated it while this one waited for the key lock
+            cached = self._lookup(key, mmap)
+            if cached is not None:
+                return cached
+            table, attributes = generate_dataset(num_days, start_date, seed, num_users, calendar)
+            tmp_path = os.path.join(self.entries_dir, f".{key}.{os.getpid()}.tmp")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            dataset_io.write_npy_columns(tmp_path, table, attributes)
+            # Opened before the rename (maps follow the files), so a concurrent eviction cannot race it
+            loaded = dataset_io.load_npy_columns(tmp_path, mmap=mmap), attributes
+            self._insert(key, tmp_path, params)
+        # A process still waiting on the removed lock file may generate the entry a second
+        # time; _insert replaces it, so that only costs work
+        try:
+            os.remove(os.path.join(self.directory, f".{key}.lock"))
+        except FileNotFoundError:
+            pass
+        return loaded
+
+    def stats(self) -> dict:
+        """Cumulative hits, misses and evictions across all processes, plus the current entries and bytes."""
+        with self._locked():
+            index = self._read_index()
+        requests = index['stats']['hits'] + index['stats']['misses']
+        return {**index['stats'], 'hit_rate': index['stats']['hits'] / requests if requests else None,
+                'entries': len(index['entries']), 'bytes': sum(entry['bytes'] for entry in index['entries'].values()),
+                'max_bytes': self.max_bytes}
+
+    def clear(self) -> int:
+        """Removes every entry (statistics are kept); returns how many were removed."""
+        with self._locked():
+            index = self._read_index()
+            for key in index['entries']:
+                shutil.rmtree(os.path.join(self.entries_dir, key), ignore_errors=True)
+            removed = len(index['entries'])
+            index['entries'] = {}
+            self._write_index(index)
+        return removed
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect or clear the generated dataset cache.")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help=f"Cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--clear', action='store_true', help="Remove every cached dataset")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    cache = DatasetCache(args.cache_dir)
+    if args.clear:
+        print(f"Removed {cache.clear()} cached dataset(s) from {args.cache_dir}")
+    print(json.dumps(cache.stats(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
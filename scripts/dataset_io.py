@@ -0,0 +1,244 @@
+import csv
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+
+from metric_store import MetricStore
+from stage_profiler import stage as profile_stage
+
+# Compact on-disk dtypes for the columnar outputs. Floats are stored as float32; rounding
+# back to EXPORT_DECIMALS when converting to text restores the generated precision.
+COLUMN_DTYPES = {
+    'user_id': np.int32,
+    'date': 'datetime64[D]',
+    'hrv': np.int16,
+    'rhr': np.int16,
+    'sleep_duration_hours': np.float32,
+    'sleep_efficiency_percent': np.float32,
+    'sleep_rem_hours': np.float32,
+    'sleep_deep_hours': np.float32,
+    'sleep_light_hours': np.float32,
+    'strain_score': np.float32,
+    'recovery_score_percent': np.int16,
+}
+EXPORT_DECIMALS = {
+    'sleep_duration_hours': 2,
+    'sleep_efficiency_percent': 1,
+    'sleep_rem_hours': 2,
+    'sleep_deep_hours': 2,
+    'sleep_light_hours': 2,
+    'strain_score': 1,
+}
+MANIFEST_FILENAME = "manifest.json"
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def column_sha256(values: np.ndarray) -> str:
+    """SHA-256 of a column's raw bytes (datetime64 has no buffer interface, so hash a uint8 view)."""
+    return hashlib.sha256(np.ascontiguousarray(values).view(np.uint8)).hexdigest()
+
+def to_compact_columns(table) -> dict[str, np.ndarray]:
+    """Casts a DataFrame or dict of arrays to the compact COLUMN_DTYPES (unknown columns keep their dtype)."""
+    with profile_stage('export_cast'):
+        columns = {}
+        for name in table.keys():
+            values = np.asarray(table[name])
+            columns[name] = np.ascontiguousarray(values.astype(COLUMN_DTYPES.get(name, values.dtype), copy=False))
+        return columns
+
+def to_export_frame(table):
+    """Builds a DataFrame with float columns rounded to EXPORT_DECIMALS and dates as datetime64."""
+    import pandas as pd
+    with profile_stage('export_copy_round'):
+        df = pd.DataFrame({name: np.asarray(table[name]) for name in table.keys()})
+        for name, decimals in EXPORT_DECIMALS.items():
+            if name in df:
+                df[name] = df[name].astype(np.float64).round(decimals)
+        return df
+
+# --- .npy-per-column layout ---
+def write_npy_columns(directory: str, table, attributes: dict | None = None) -> dict:
+    """
+    Writes each column as `<directory>/<column>.npy` (compact dtypes) plus a manifest with
+    row count, dtypes and a SHA-256 per written segment of each column. Returns the manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    columns = to_compact_columns(table)
+    num_rows = len(next(iter(columns.values())))
+    manifest = {'num_rows': num_rows, 'columns': {}, 'attributes': attributes or {}}
+    with profile_stage('write_npy'):
+        for name, values in columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), values, allow_pickle=False)
+            manifest['columns'][name] = {'dtype': values.dtype.str, 'segments': [{'rows': num_rows, 'sha256': column_sha256(values)}]}
+        _write_manifest(directory, manifest)
+    return manifest
+
+def _write_manifest(directory: str, manifest: dict) -> None:
+    # Replace atomically so readers never see a half-written manifest
+    tmp_path = os.path.join(directory, MANIFEST_FILENAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILENAME))
+
+def _append_npy(path: str, values: np.ndarray) -> None:
+    """
+    Appends rows to a 1-D .npy file in place. np.save leaves spare room in the header for the
+    shape to grow, so only the new bytes and the header are written.
+    """
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        data_offset = f.tell()
+        if len(shape) != 1 or dtype != values.dtype:
+            raise ValueError(f"Cannot append {values.dtype} rows to {path} ({dtype}, shape {shape}).")
+        f.seek(data_offset + shape[0] * dtype.itemsize)
+        f.write(values.tobytes())
+        f.seek(0)
+        write_header = np.lib.format.write_array_header_1_0 if version == (1, 0) else np.lib.format.write_array_header_2_0
+        write_header(f, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': fortran_order, 'shape': (shape[0] + len(values),)})
+        if f.tell() != data_offset:
+            raise ValueError(f"Header of {path} has no room to grow; rewrite the dataset instead of appending.")
+
+def append_npy_columns(directory: str, table, attributes: dict | None = None) -> dict:
+    """
+    Appends rows to an existing .npy layout without rewriting existing rows: each column gets
+    the new bytes and one more checksummed segment. `attributes` replaces the manifest's
+    attributes. Returns the updated manifest.
+    """
+    manifest = read_manifest(directory)
+    columns = to_compact_columns(table)
+    if set(columns) != set(manifest['columns']):
+        raise ValueError(f"Columns {sorted(columns)} do not match dataset columns {sorted(manifest['columns'])}.")
+    num_rows = len(next(iter(columns.values())))
+    for name, values in columns.items():
+        _append_npy(os.path.join(directory, f"{name}.npy"), values)
+        manifest['columns'][name]['segments'].append({'rows': num_rows, 'sha256': column_sha256(values)})
+    manifest['num_rows'] += num_rows
+    if attributes is not None:
+        manifest['attributes'] = attributes
+    _write_manifest(directory, manifest)
+    return manifest
+
+def read_manifest(directory: str) -> dict:
+    with open(os.path.join(directory, MANIFEST_FILENAME)) as f:
+        return json.load(f)
+
+def load_npy_columns(directory: str, columns: list[str] | None = None, mmap: bool = True) -> dict[str, np.ndarray]:
+    """Opens the .npy layout; with mmap=True columns are memory-mapped read-only rather than read into RAM."""
+    names = list(read_manifest(directory)['columns']) if columns is None else columns
+    mmap_mode = 'r' if mmap else None
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False) for name in names}
+
+def verify_npy_columns(directory: str) -> list[str]:
+    """Re-hashes every column segment against the manifest; returns the names of columns that do not match."""
+    manifest = read_manifest(directory)
+    columns = load_npy_columns(directory)
+    mismatched = []
+    for name, info in manifest['columns'].items():
+        values = columns[name]
+        ok = len(values) == manifest['num_rows']
+        first = 0
+        for segment in info['segments']:
+            ok = ok and column_sha256(values[first:first + segment['rows']]) == segment['sha256']
+            first += segment['rows']
+        if not ok:
+            mismatched.append(name)
+    return mismatched
+
+def load_metric_store(directory: str) -> MetricStore:
+    """Opens a single-user .npy layout as a MetricStore over memory-mapped columns."""
+    attributes = read_manifest(directory)['attributes']
+    columns = load_npy_columns(directory)
+    dates = columns.pop('date')
+    columns.pop('user_id', None)
+    if attributes.get('contiguous'):
+        # Written by the generator: one row per day from start_date, so the dates need not be scanned
+        return MetricStore(attributes['start_date'], columns)
+    return MetricStore.from_arrays(dates, columns)
+
+# --- Parquet ---
+def write_parquet(path: str, table) -> str:
+    """
+    Writes the table as Parquet with the compact COLUMN_DTYPES (requires pyarrow) and returns
+    the SHA-256 of the bytes written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+    columns = to_compact_columns(table)
+    with profile_stage('write_parquet'):
+        sink = pa.BufferOutputStream()
+        pq.write_table(pa.table({name: pa.array(values) for name, values in columns.items()}), sink, compression='zstd')
+        payload = sink.getvalue().to_pybytes()
+        with open(path, 'wb') as f:
+            f.write(payload)
+        return sha256_hex(payload)
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# --- Text formats (CSV, JSON) ---
+# Below this many rows JSON is serialized with the json module, which writes the same bytes
+# as pandas' writer without paying for importing pandas; above it pandas' C writer is faster.
+JSON_PANDAS_MIN_ROWS = 20_000
+
+def to_text_columns(table) -> dict[str, list]:
+    """Columns as Python lists for the text writers: dates as YYYY-MM-DD, floats rounded to EXPORT_DECIMALS."""
+    columns = {}
+    for name in table.keys():
+        values = np.asarray(table[name])
+        if name == 'date':
+            columns[name] = np.datetime_as_string(values.astype('datetime64[D]'), unit='D').tolist()
+        elif name in EXPORT_DECIMALS:
+            columns[name] = np.round(values.astype(np.float64), EXPORT_DECIMALS[name]).tolist()
+        else:
+            columns[name] = values.tolist()
+    return columns
+
+def write_csv(path: str, table) -> str:
+    """Writes the table as CSV with a header row and returns the SHA-256 of the bytes written."""
+    with profile_stage('write_csv'):
+        columns = to_text_columns(table)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows(zip(*columns.values()))
+        payload = buffer.getvalue().encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(payload)
+        return sha256_hex(payload)
+
+def write_json(path: str, table) -> str:
+    """Writes records-oriented JSON (dates as YYYY-MM-DD) and returns the SHA-256 of the bytes written."""
+    if len(table['date']) < JSON_PANDAS_MIN_ROWS:
+        with profile_stage('write_json'):
+            columns = to_text_columns(table)
+            records = [dict(zip(columns, row)) for row in zip(*columns.values())]
+            # Same layout as pandas' to_json(orient="records", indent=2)
+            payload = json.dumps(records, indent=2, separators=(',', ':')).encode('utf-8')
+    else:
+        df = to_export_frame(table)
+        with profile_stage('write_json'):
+            df['date'] = np.datetime_as_string(np.asarray(df['date'], dtype='datetime64[D]'), unit='D')
+            payload = df.to_json(orient="records", indent=2).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(payload)
+    return sha256_hex(payload)
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,138 @@
+import datetime
+import json
+
+import numpy as np
+
+# Events act on one of two channels. Stress events subtract from HRV, sleep duration and
+# efficiency (and pull the HRV baseline down); sleep events either reduce sleep duration and
+# efficiency or override them with their own distribution. Within a channel the event with the
+# highest precedence wins a day; ties go to the event listed later.
+STRESS_CHANNEL = 'stress'
+SLEEP_CHANNEL = 'sleep'
+SLEEP_MODE_NONE = 0
+SLEEP_MODE_REDUCE = 1
+SLEEP_MODE_OVERRIDE = 2
+SLEEP_MODES = {'reduce': SLEEP_MODE_REDUCE, 'override': SLEEP_MODE_OVERRIDE}
+
+STRESS_EFFECTS = [
+    'hrv_reduction_mean',
+    'hrv_reduction_std',
+    'sleep_duration_reduction_mean',
+    'sleep_duration_reduction_std',
+    'sleep_efficiency_reduction_mean',
+    'sleep_efficiency_reduction_std',
+    'hrv_baseline_pull',
+]
+SLEEP_EFFECTS = [
+    'sleep_duration_mean',
+    'sleep_duration_std',
+    'sleep_efficiency_mean',
+    'sleep_efficiency_std',
+]
+
+class EventCalendar:
+    """
+    Interval-based life events compiled once into per-day effect arrays.
+
+    `events` are dicts with a 'type', an inclusive range given either as day offsets
+    ('start_day', 'end_day') or as dates ('start', 'end', resolved against `start_date`),
+    an optional 'precedence' (default from the type) and optional 'effects' overriding the
+    type's effect sizes. `event_types` maps each type name to its 'channel', 'precedence',
+    'effects' and, for sleep events, 'mode' ('reduce' or 'override'); an event may also
+    define a new type inline with those keys.
+
+    Compiling visits events from the winner down and paints only the days of their range no
+    earlier event claimed, skipping claimed runs through a next-unclaimed-day pointer per
+    channel, so each day is painted once however much events overlap: O(days + events)
+    amortized. Afterwards effects_for() is a single gather and the same calendar can be
+    shared by every user with this schedule.
+    """
+
+    def __init__(self, events: list[dict], event_types: dict[str, dict], start_date: datetime.date | None = None):
+        self.events = [self._resolve(event, event_types, start_date) for event in events]
+        self.num_days = max((event['end_day'] + 1 for event in self.events), default=0)
+        self._compile()
+
+    @staticmethod
+    def _resolve(event: dict, event_types: dict[str, dict], start_date: datetime.date | None) -> dict:
+        """Fills an event in from its type defaults and converts dates to day offsets."""
+        defaults = event_types.get(event['type'], {})
+        channel = event.get('channel', defaults.get('channel'))
+        if channel not in (STRESS_CHANNEL, SLEEP_CHANNEL):
+            raise ValueError(f"Event type '{event['type']}' needs a channel ('{STRESS_CHANNEL}' or '{SLEEP_CHANNEL}').")
+        effects = {**defaults.get('effects', {}), **event.get('effects', {})}
+        required = STRESS_EFFECTS if channel == STRESS_CHANNEL else SLEEP_EFFECTS
+        missing = [name for name in required if name not in effects]
+        if missing:
+            raise ValueError(f"Event type '{event['type']}' is missing effects: {', '.join(missing)}.")
+
+        if 'start_day' in event:
+            start_day, end_day = int(event['start_day']), int(event.get('end_day', event['start_day']))
+        else:
+            if start_date is None:
+                raise ValueError("Date-based events need the dataset start_date.")
+            start_day = (datetime.date.fromisoformat(event['start']) - start_date).days
+            end_day = (datetime.date.fromisoformat(event.get('end', event['start'])) - start_date).days
+        if start_day < 0 or end_day < start_day:
+            raise ValueError(f"Invalid range for '{event['type']}' event: days {start_day} to {end_day}.")
+
+        resolved = {'type': event['type'], 'channel': channel, 'start_day': start_day, 'end_day': end_day,
+                    'precedence': event.get('precedence', defaults.get('precedence', 0)),
+                    'effects': {name: float(effects[name]) for name in required}}
+        if channel == SLEEP_CHANNEL:
+            resolved['mode'] = event.get('mode', defaults.get('mode'))
+            if resolved['mode'] not in SLEEP_MODES:
+                raise ValueError(f"Sleep event '{event['type']}' needs a mode ('reduce' or 'override').")
+        return resolved
+
+    def _compile(self) -> None:
+        self.arrays = {'stress': np.zeros(self.num_days, dtype=bool), 'sleep_mode': np.zeros(self.num_days, dtype=np.int8)}
+        for name in STRESS_EFFECTS + SLEEP_EFFECTS:
+            self.arrays[name] = np.zeros(self.num_days)
+        # Per channel, next_free[day] leads (through find()) to the first unclaimed day >= day
+        next_free = {STRESS_CHANNEL: list(range(self.num_days + 1)), SLEEP_CHANNEL: list(range(self.num_days + 1))}
+
+        def find(pointers: list[int], day: int) -> int:
+            while pointers[day] != day:
+                pointers[day] = pointers[pointers[day]] # Path halving
+                day = pointers[day]
+            return day
+
+        # Highest precedence first; among equal precedence the later event wins, so it claims first
+        order = sorted(range(len(self.events)), key=lambda index: (self.events[index]['precedence'], index), reverse=True)
+        for index in order:
+            event = self.events[index]
+            pointers = next_free[event['channel']]
+            day, end = find(pointers, event['start_day']), event['end_day']
+            while day <= end:
+                run_end = day
+                while run_end < end and pointers[run_end + 1] == run_end + 1:
+                    run_end += 1
+                self._paint(event, slice(day, run_end + 1))
+                pointers[day:run_end + 1] = [run_end + 1] * (run_end + 1 - day)
+                day = find(pointers, run_end + 1)
+
+    def _paint(self, event: dict, days: slice) -> None:
+        if event['channel'] == STRESS_CHANNEL:
+            self.arrays['stress'][days] = True
+        else:
+            self.arrays['sleep_mode'][days] = SLEEP_MODES[event['mode']]
+        for name, value in event['effects'].items():
+            self.arrays[name][days] = value
+
+    def effects_for(self, day_index: np.ndarray) -> dict[str, np.ndarray]:
+        """Per-day effect arrays for the given day offsets; days outside every event get zeros."""
+        if self.num_days == 0:
+            return {name: np.zeros(day_index.shape, dtype=values.dtype) for name, values in self.arrays.items()}
+        inside = (day_index >= 0) & (day_index < self.num_days)
+        positions = np.clip(day_index, 0, self.num_days - 1)
+        return {name: np.where(inside, values[positions], np.zeros((), dtype=values.dtype)) for name, values in self.arrays.items()}
+
+    def to_config(self) -> dict:
+        """Resolved events as a self-contained config (every effect and range explicit)."""
+        return {'events': [dict(event) for event in self.events]}
+
+def load_event_config(path: str) -> list[dict]:
+    """Reads the 'events' list from a JSON calendar config file."""
+    with open(path) as f:
+        return json.load(f)['events']
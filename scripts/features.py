@@ -0,0 +1,218 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+import dataset_io
+from stage_profiler import stage as profile_stage
+
+# Derived coaching features, computed for every row (user-day) in one pass over a daily
+# metrics table. Rows must be user-major and date-ordered with no missing days, as the
+# generators write them; every rolling window stops at the user's first row.
+FEATURE_WINDOWS = (7, 30) # Days
+BASELINE_METRICS = ['hrv', 'rhr', 'sleep_duration_hours', 'sleep_efficiency_percent',
+                    'strain_score', 'recovery_score_percent']
+# Baselines cover the `window` days before each day (not the day itself) and need at least
+# this many of them, like WHOOP's initial calibration period; earlier days get NaN.
+MIN_BASELINE_DAYS = 4
+SLEEP_NEED_HOURS = 7.25 # Executive Alex's sleep_duration_hours_avg baseline
+# Recovery below this counts as this when dividing by it, so near-zero recovery stays finite
+RATIO_MIN_RECOVERY_PERCENT = 1.0
+# Prefix-sum differences leave rounding noise where a window is constant; spreads below this
+# are zero (metrics have at most two decimals, so any real spread is far larger)
+MIN_STD = 1e-4
+FEATURE_DTYPE = np.float32
+FEATURES_SUFFIX = '_features'
+
+def group_starts(num_rows: int, user_id: np.ndarray | None = None) -> np.ndarray:
+    """Index of the first row of each row's user (all zeros for a single-user table)."""
+    if user_id is None:
+        return np.zeros(num_rows, dtype=np.int64)
+    user_id = np.asarray(user_id)
+    starts = np.concatenate([[0], np.flatnonzero(user_id[1:] != user_id[:-1]) + 1])
+    return np.repeat(starts, np.diff(np.append(starts, num_rows)))
+
+def _prefix(values: np.ndarray) -> np.ndarray:
+    return np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+
+def window_layout(row_start: np.ndarray, window: int, include_current: bool) -> tuple:
+    """
+    Where each row's trailing window starts, clipped to the row's user, shared by every prefix
+    sum taken over that window. Away from a user's first `window` rows the start is a fixed lag
+    behind the row, so only the rows near a user's start are listed (with their user's start).
+    Returns (offset, lag, clipped rows, their starts, days in each row's window).
+    """
+    offset = 1 if include_current else 0
+    available = np.arange(len(row_start)) - row_start + offset # Days of the user's data up to the window end
+    rows = np.flatnonzero(available < window)
+    return offset, window - offset, rows, row_start[rows], np.minimum(available, window)
+
+def window_sum(prefix: np.ndarray, layout: tuple) -> np.ndarray:
+    """Sum over each row's trailing window from a prefix sum: two shifted slices plus a small fix-up."""
+    offset, lag, rows, starts, count = layout
+    num_rows = len(count)
+    lagged = np.empty(num_rows)
+    lagged[:min(lag, num_rows)] = prefix[0]
+    lagged[lag:] = prefix[:max(num_rows - lag, 0)]
+    lagged[rows] = prefix[starts]
+    return np.subtract(prefix[offset:num_rows + offset], lagged, out=lagged)
+
+def rolling_mean_std(values: np.ndarray, layouts: dict[int, tuple],
+                     min_days: int = MIN_BASELINE_DAYS) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    """
+    Trailing mean and sample standard deviation over the days before each row, for every
+    window in `layouts` (window -> window_layout(..., include_current=False)), from one pair of
+    prefix sums: each window then costs a few O(rows) array operations, whatever its length.
+    Rows with fewer than min_days prior days get NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    # Centred, so the running sums of squares stay small relative to the variance
+    centre = values.mean() if values.size else 0.0
+    centred = values - centre
+    sums = _prefix(centred)
+    squares = _prefix(np.square(centred, out=centred))
+    result = {}
+    for window, layout in layouts.items():
+        count = layout[-1]
+        total, variance = window_sum(sums, layout), window_sum(squares, layout)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.divide(total, count, out=total)
+            # Sum of squared deviations: sum of squares minus count * mean**2
+            variance -= np.square(mean) * count
+            variance /= count - 1
+        variance[variance < MIN_STD ** 2] = 0
+        too_few = count < max(min(min_days, window), 2)
+        mean += centre
+        mean[too_few] = np.nan
+        std = np.sqrt(variance, out=variance)
+        std[too_few] = np.nan
+        result[window] = (mean, std)
+    return result
+
+def rolling_sum(values: np.ndarray, layouts: dict[int, tuple]) -> dict[int, np.ndarray]:
+    """
+    Sum over each row's trailing window including the row itself (shorter at a user's start),
+    for every window in `layouts` (window -> window_layout(..., include_current=True)).
+    """
+    prefix = _prefix(np.asarray(values, dtype=np.float64))
+    return {window: window_sum(prefix, layout) for window, layout in layouts.items()}
+
+def compute_features(table, windows=FEATURE_WINDOWS) -> dict[str, np.ndarray]:
+    """
+    Returns the feature columns for every row, plus the table's 'date' (and 'user_id') so the
+    result is a dataset of its own:
+      <metric>_baseline_<w>d, <metric>_std_<w>d, <metric>_z_<w>d  trailing baseline, spread and
+                                                                  today's z-score against them
+      hrv_deviation_percent_<w>d   today's HRV relative to its baseline
+      sleep_debt_hours_<w>d        hours short of SLEEP_NEED_HOURS over the window (surplus repays, floor 0)
+      strain_recovery_ratio        today's strain per unit of recovery (recovery as a fraction)
+      strain_recovery_ratio_<w>d   the same over the window's mean strain and mean recovery
+    Costs O(rows) per window and metric: one pair of prefix sums per metric serves every window.
+    """
+    windows = sorted(set(windows))
+    if not windows or windows[0] <= 0:
+        raise ValueError("Feature windows must be positive.")
+    num_rows = len(table['date'])
+    user_id = np.asarray(table['user_id']) if 'user_id' in table.keys() else None
+    row_start = group_starts(num_rows, user_id)
+    # Window starts are shared by every metric
+    before = {window: window_layout(row_start, window, include_current=False) for window in windows}
+    through = {window: window_layout(row_start, window, include_current=True) for window in windows}
+    features = {'date': np.asarray(table['date'], dtype='datetime64[D]')}
+    if user_id is not None:
+        features['user_id'] = user_id
+
+    with profile_stage('features_baselines'):
+        for metric in BASELINE_METRICS:
+            values = np.asarray(table[metric], dtype=np.float64)
+            for window, (mean, std) in rolling_mean_std(values, before).items():
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    z = np.where(std > 0, (values - mean) / std, np.nan)
+                features[f"{metric}_baseline_{window}d"] = mean
+                features[f"{metric}_std_{window}d"] = std
+                features[f"{metric}_z_{window}d"] = z
+                if metric == 'hrv':
+                    features[f"hrv_deviation_percent_{window}d"] = (values - mean) / mean * 100
+
+    with profile_stage('features_load'):
+        shortfall = SLEEP_NEED_HOURS - np.asarray(table['sleep_duration_hours'], dtype=np.float64)
+        for window, debt in rolling_sum(shortfall, through).items():
+            features[f"sleep_debt_hours_{window}d"] = np.maximum(debt, 0)
+        strain = np.asarray(table['strain_score'], dtype=np.float64)
+        recovery = np.maximum(np.asarray(table['recovery_score_percent'], dtype=np.float64), RATIO_MIN_RECOVERY_PERCENT)
+        features['strain_recovery_ratio'] = strain / (recovery / 100)
+        strain_sums, recovery_sums = rolling_sum(strain, through), rolling_sum(recovery, through)
+        for window in windows:
+            features[f"strain_recovery_ratio_{window}d"] = strain_sums[window] / (recovery_sums[window] / 100)
+
+    return {name: values if name in ('date', 'user_id') else values.astype(FEATURE_DTYPE)
+            for name, values in features.items()}
+
+# --- Storage: an .npy layout next to the dataset, at <dataset path minus extension>_features ---
+def features_path(dataset_path: str) -> str:
+    return os.path.splitext(os.path.normpath(dataset_path))[0] + FEATURES_SUFFIX
+
+def write_features(dataset_path: str, table=None, windows=FEATURE_WINDOWS) -> str:
+    """
+    Computes features for a dataset and writes them next to it. `table` defaults to the .npy
+    dataset at dataset_path (memory-mapped). The manifest records the source row count, so
+    load_features() can tell when the dataset has since been appended to. Returns the path.
+    """
+    if table is None:
+        table = dataset_io.load_npy_columns(dataset_path)
+    path = features_path(dataset_path)
+    with profile_stage('features'):
+        features = compute_features(table, windows)
+    attributes = {'source': os.path.basename(os.path.normpath(dataset_path)), 'source_rows': len(features['date']),
+                  'windows': sorted(set(windows)), 'min_baseline_days': MIN_BASELINE_DAYS, 'sleep_need_hours': SLEEP_NEED_HOURS}
+    dataset_io.write_npy_columns(path, features, attributes)
+    return path
+
+def append_features(dataset_path: str) -> int:
+    """
+    Extends a .npy dataset's stored features after rows were appended to the dataset, with the
+    windows they were written with. Every window ends at its row, so the new rows' features
+    need only the max(windows) rows before them as context: only that tail is read and only
+    the new rows are written, keeping the cost proportional to the rows added. Returns the
+    number of rows appended.
+    """
+    path = features_path(dataset_path)
+    attributes = dataset_io.read_manifest(path)['attributes']
+    windows, old_rows = attributes['windows'], attributes['source_rows']
+    num_rows = dataset_io.read_manifest(dataset_path)['num_rows']
+    if num_rows < old_rows:
+        raise ValueError(f"{dataset_path} has fewer rows than its features; rerun write_features({dataset_path!r}).")
+    if num_rows == old_rows:
+        return 0
+    context = max(old_rows - max(windows), 0)
+    tail = {name: values[context:] for name, values in dataset_io.load_npy_columns(dataset_path).items()}
+    with profile_stage('features'):
+        new_rows = {name: values[old_rows - context:] for name, values in compute_features(tail, windows).items()}
+    attributes['source_rows'] = num_rows
+    dataset_io.append_npy_columns(path, new_rows, attributes)
+    return num_rows - old_rows
+
+def load_features(dataset_path: str, columns: list[str] | None = None, mmap: bool = True) -> dict[str, np.ndarray]:
+    """Opens a dataset's stored features; raises ValueError if they no longer cover the dataset's rows."""
+    path = features_path(dataset_path)
+    source_rows = dataset_io.read_manifest(path)['attributes']['source_rows']
+    if os.path.isdir(dataset_path) and dataset_io.read_manifest(dataset_path)['num_rows'] != source_rows:
+        raise ValueError(f"Features in {path} are stale ({source_rows} rows); run append_features({dataset_path!r}).")
+    return dataset_io.load_npy_columns(path, columns, mmap=mmap)
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compute rolling baselines and anomaly features for a .npy dataset.")
+    parser.add_argument('--data', required=True, help="Directory of the .npy daily metrics dataset")
+    parser.add_argument('--windows', type=int, nargs='+', default=list(FEATURE_WINDOWS),
+                        help=f"Trailing windows in days (default: {' '.join(map(str, FEATURE_WINDOWS))})")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    path = write_features(args.data, windows=args.windows)
+    print(f"Wrote {len(dataset_io.read_manifest(path)['columns'])} feature columns to {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+import generate_synthetic_data as gsd
+from event_calendar import EventCalendar
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Users generated together in one worker task are sized from a memory budget, since a
+# shard's working set grows with users x days: its (users, days, NOISE_COLUMNS) float64 draw
+# matrix plus simulate_days' intermediates peak at about SHARD_BYTES_PER_USER_DAY. The default
+# gives ~1,800 users per shard at 90 days and ~45 at 10 years, each far above the per-task
+# overhead; every worker holds one shard, so peak worker memory is about workers x the budget.
+SHARD_BYTES_PER_USER_DAY = 400 # Measured with tracemalloc
+DEFAULT_SHARD_MEMORY_BYTES = 64 << 20
+
+def shard_size_for(num_days: int, memory_bytes: int = DEFAULT_SHARD_MEMORY_BYTES) -> int:
+    """Users per shard so that one shard of num_days stays within memory_bytes (at least one user)."""
+    return max(1, memory_bytes // (num_days * SHARD_BYTES_PER_USER_DAY))
+
+def user_seed_sequence(root_seed: int, user_id: int) -> np.random.SeedSequence:
+    """
+    Returns the seed sequence for one user: the `user_id`-th child of SeedSequence(root_seed).spawn().
+    Built directly from the spawn key so workers never need the full list of children.
+    """
+    return np.random.SeedSequence(root_seed, spawn_key=(user_id,))
+
+def _generate_shard(root_seed: int, first_user: int, last_user: int, num_days: int, start_date: datetime.date,
+                    calendar: EventCalendar | None = None) -> tuple[int, dict[str, np.ndarray]]:
+    """Generates users [first_user, last_user) with the vectorized engine; arrays are shaped (users, days)."""
+    num_users = last_user - first_user
+    noise = np.empty((num_users, num_days, gsd.NOISE_COLUMNS))
+    for offset in range(num_users):
+        rng = np.random.default_rng(user_seed_sequence(root_seed, first_user + offset))
+        noise[offset] = gsd.draw_daily_noise(rng, num_days)
+    day_index = np.arange(num_days)
+    weekday = (start_date.weekday() + day_index) % 7
+    metrics, _, _ = gsd.simulate_days(noise, day_index, weekday, num_days,
+                                      np.full(num_users, float(gsd.HRV_BASELINE_MEAN)),
+                                      np.full(num_users, gsd.ASSUMED_PREV_DAY_STRAIN_FOR_DAY_0), calendar)
+    return first_user, metrics
+
+def generate_population(num_users: int, num_days: int, start_date: datetime.date, seed: int,
+                        workers: int | None = None, shard_size: int | None = None,
+                        calendar: EventCalendar | None = None) -> dict[str, np.ndarray]:
+    """
+    Generates num_users x num_days of Executive Alex-style data as one long-format table
+    (dict of 1-D arrays, user-major, with 'user_id' and 'date' columns).
+
+    Each user draws from its own SeedSequence child of `seed`, and shards only decide which
+    process does the work, so the output is bit-identical for any `workers` / `shard_size`.
+    workers=None uses every core; workers=1 generates in-process. shard_size=None sizes shards
+    with shard_size_for(num_days). Every user shares one compiled `calendar` (default:
+    default_event_calendar()).
+    """
+    if num_users <= 0 or num_days <= 0:
+        raise ValueError("num_users and num_days must be positive.")
+    workers = workers or os.cpu_count() or 1
+    shard_size = shard_size or shard_size_for(num_days)
+    shards = [(first, min(first + shard_size, num_users)) for first in range(0, num_users, shard_size)]
+
+    table = {
+        'user_id': np.repeat(np.arange(num_users, dtype=np.int64), num_days),
+        'date': np.tile(np.datetime64(start_date, 'D') + np.arange(num_days), num_users),
+    }
+    per_user = {}
+
+    def place(first_user: int, metrics: dict[str, np.ndarray]) -> None:
+        for name, values in metrics.items():
+            if name not in per_user:
+                per_user[name] = np.empty((num_users, num_days), dtype=values.dtype)
+            per_user[name][first_user:first_user + values.shape[0]] = values
+
+    if workers == 1 or len(shards) == 1:
+        for first, last in shards:
+            place(*_generate_shard(seed, first, last, num_days, start_date, calendar))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+            futures = [pool.submit(_generate_shard, seed, first, last, num_days, start_date, calendar) for first, last in shards]
+            for future in futures:
+                place(*future.result())
+
+    for name in gsd.METRIC_COLUMNS:
+        table[name] = per_user[name].reshape(-1)
+    return table
+
+def generate_population_frame(num_users: int, num_days: int, start_date: datetime.date, seed: int,
+                              workers: int | None = None, shard_size: int | None = None,
+                              calendar: EventCalendar | None = None) -> pd.DataFrame:
+    """DataFrame wrapper around generate_population."""
+    import pandas as pd
+    return pd.DataFrame(generate_population(num_users, num_days, start_date, seed, workers, shard_size, calendar))
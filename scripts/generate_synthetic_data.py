@@ -1,7 +1,26 @@
-import pandas as pd
+from __future__ import annotations
+
 import numpy as np
 import os
+import sys
+import argparse
+import cProfile
+import csv
+import json
+import tracemalloc
 import datetime
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import dataset_io
+import features
+from stage_profiler import StageProfiler, stage as profile_stage
+from event_calendar import (EventCalendar, SLEEP_CHANNEL, SLEEP_MODE_OVERRIDE, SLEEP_MODE_REDUCE,
+                            STRESS_CHANNEL, load_event_config)
+from metric_store import MetricStore
+
+if TYPE_CHECKING:
+    import pandas as pd # Imported where used, so generation and the .npy path never load pandas
 
 # Constants for Executive Alex persona
 NUM_DAYS = 90
@@ -107,12 +126,518 @@ OUTPUT_DIR = "data"
 OUTPUT_FILENAME = "synthetic_user_data.json"
 OUTPUT_FILE_PATH = os.path.join(OUTPUT_DIR, OUTPUT_FILENAME)
 
-def generate_daily_metrics(num_days: int, start_date: datetime.date) -> pd.DataFrame:
+METRIC_COLUMNS = [
+    'hrv',
+    'rhr',
+    'sleep_duration_hours',
+    'sleep_efficiency_percent',
+    'sleep_rem_hours',
+    'sleep_deep_hours',
+    'sleep_light_hours',
+    'strain_score',
+    'recovery_score_percent',
+]
+
+# --- Vectorized Engine ---
+# Column layout of the per-day standard normal draws used by the vectorized engine.
+# Every day consumes one full row, whether or not the matching effect applies, so the
+# random stream is read in the same order however the days are batched.
+_NOISE_HRV = 0
+_NOISE_STRESS_HRV = 1
+_NOISE_BASELINE_DRIFT = 2
+_NOISE_RHR = 3
+_NOISE_SLEEP_DURATION = 4
+_NOISE_SLEEP_EFFICIENCY = 5
+_NOISE_STRESS_SLEEP_DURATION = 6
+_NOISE_STRESS_SLEEP_EFFICIENCY = 7
+_NOISE_EVENT_SLEEP_DURATION = 8 # Shared by sleep events (travel, red-eye, ...): at most one applies per day
+_NOISE_EVENT_SLEEP_EFFICIENCY = 9
+_NOISE_REM = 10
+_NOISE_DEEP = 11
+_NOISE_STRAIN = 12
+NOISE_COLUMNS = 13
+
+def draw_daily_noise(rng: np.random.Generator, num_days: int) -> np.ndarray:
+    """Draws the (num_days, NOISE_COLUMNS) standard normal matrix consumed by the vectorized engine."""
+    with profile_stage('draw_noise'):
+        return rng.standard_normal((num_days, NOISE_COLUMNS))
+
+# --- Event Calendar ---
+# Default effect sizes and precedence per event type; a calendar config may override any of them per event.
+EVENT_TYPES = {
+    'stress': {
+        'channel': STRESS_CHANNEL,
+        'precedence': 0,
+        'effects': {
+            'hrv_reduction_mean': STRESS_IMPACT_HRV_REDUCTION_MEAN,
+            'hrv_reduction_std': STRESS_IMPACT_HRV_REDUCTION_STD,
+            'sleep_duration_reduction_mean': STRESS_IMPACT_SLEEP_DURATION_REDUCTION_HOURS_MEAN,
+            'sleep_duration_reduction_std': STRESS_IMPACT_SLEEP_DURATION_REDUCTION_HOURS_STD,
+            'sleep_efficiency_reduction_mean': STRESS_IMPACT_SLEEP_EFFICIENCY_REDUCTION_PERCENT_MEAN,
+            'sleep_efficiency_reduction_std': STRESS_IMPACT_SLEEP_EFFICIENCY_REDUCTION_PERCENT_STD,
+            'hrv_baseline_pull': HRV_BASELINE_DRIFT_STD_DEV * 0.5, # Stress also slightly pulls down the baseline itself
+        },
+    },
+    'travel': {
+        'channel': SLEEP_CHANNEL,
+        'mode': 'reduce',
+        'precedence': 1,
+        'effects': {
+            'sleep_duration_mean': TRAVEL_SLEEP_DURATION_REDUCTION_HOURS_MEAN,
+            'sleep_duration_std': TRAVEL_SLEEP_DURATION_REDUCTION_HOURS_STD,
+            'sleep_efficiency_mean': TRAVEL_SLEEP_EFFICIENCY_REDUCTION_PERCENT_MEAN,
+            'sleep_efficiency_std': TRAVEL_SLEEP_EFFICIENCY_REDUCTION_PERCENT_STD,
+        },
+    },
+    'post_red_eye': {
+        'channel': SLEEP_CHANNEL,
+        'mode': 'override',
+        'precedence': 2,
+        'effects': {
+            'sleep_duration_mean': POST_RED_EYE_SLEEP_DURATION_HOURS_MEAN,
+            'sleep_duration_std': POST_RED_EYE_SLEEP_DURATION_HOURS_STD,
+            'sleep_efficiency_mean': POST_RED_EYE_SLEEP_EFFICIENCY_PERCENT_MEAN,
+            'sleep_efficiency_std': POST_RED_EYE_SLEEP_EFFICIENCY_PERCENT_STD,
+        },
+    },
+    'red_eye': {
+        'channel': SLEEP_CHANNEL,
+        'mode': 'override',
+        'precedence': 3,
+        'effects': {
+            'sleep_duration_mean': RED_EYE_SLEEP_DURATION_HOURS_MEAN,
+            'sleep_duration_std': RED_EYE_SLEEP_DURATION_HOURS_STD,
+            'sleep_efficiency_mean': RED_EYE_SLEEP_EFFICIENCY_PERCENT_MEAN,
+            'sleep_efficiency_std': RED_EYE_SLEEP_EFFICIENCY_PERCENT_STD,
+        },
+    },
+}
+
+def default_event_config() -> list[dict]:
+    """Executive Alex's calendar from the STRESS_*, TRAVEL_*, RED_EYE_* and POST_RED_EYE_* constants."""
+    events = [{'type': 'stress', 'start_day': start_day, 'end_day': start_day + STRESS_WEEK_DURATION_DAYS - 1}
+              for start_day in STRESS_WEEKS_START_DAYS]
+    # Red-eye and post-red-eye days are also travel days; their higher precedence wins
+    events += [{'type': 'travel', 'start_day': day} for day in TRAVEL_DAYS_INDICES]
+    events.append({'type': 'red_eye', 'start_day': RED_EYE_DAY_INDEX})
+    events.append({'type': 'post_red_eye', 'start_day': POST_RED_EYE_DAY_INDEX})
+    return events
+
+_default_event_calendar = None
+
+def default_event_calendar() -> EventCalendar:
+    """The compiled default calendar, built once and shared."""
+    global _default_event_calendar
+    if _default_event_calendar is None:
+        _default_event_calendar = EventCalendar(default_event_config(), EVENT_TYPES)
+    return _default_event_calendar
+
+def load_event_calendar(path: str, start_date: datetime.date | None = None) -> EventCalendar:
+    """Compiles the calendar config at `path` (see EventCalendar for the event format)."""
+    return EventCalendar(load_event_config(path), EVENT_TYPES, start_date)
+
+def _hrv_baseline_walk(initial_baseline: np.ndarray, steps: np.ndarray) -> np.ndarray:
+    """
+    Runs the clipped HRV baseline random walk, the only sequential part of the engine.
+    Returns the baseline in effect on each day, shape (users, days + 1); the last column
+    is the baseline carried into the following day.
+    """
+    num_users, num_days = steps.shape
+    baselines = np.empty((num_users, num_days + 1))
+    if num_users == 1:
+        # Plain floats are much faster than size-1 array operations for a single user.
+        current = float(initial_baseline[0])
+        walk = [current]
+        for step in steps[0].tolist():
+            current = min(max(current + step, HRV_BASELINE_MIN), HRV_BASELINE_MAX)
+            walk.append(current)
+        baselines[0] = walk
+        return baselines
+    current = np.asarray(initial_baseline, dtype=float)
+    baselines[:, 0] = current
+    for i in range(num_days):
+        current = np.clip(current + steps[:, i], HRV_BASELINE_MIN, HRV_BASELINE_MAX)
+        baselines[:, i + 1] = current
+    return baselines
+
+# Recovery scoring, split into normalization and weighting so the weights can be re-scored
+# against fixed components (see recovery_sweep.py)
+RECOVERY_WEIGHTS = {
+    'hrv': RECOVERY_HRV_WEIGHT,
+    'rhr': RECOVERY_RHR_WEIGHT,
+    'sleep_quality': RECOVERY_SLEEP_QUALITY_WEIGHT,
+    'prev_strain': RECOVERY_PREV_STRAIN_WEIGHT,
+    'sleep_duration_in_quality': SLEEP_DURATION_WEIGHT_IN_QUALITY,
+    'sleep_efficiency_in_quality': SLEEP_EFFICIENCY_WEIGHT_IN_QUALITY,
+}
+RECOVERY_NORMALIZATION_BOUNDS = {
+    'hrv': (HRV_MIN, HRV_MAX),
+    'rhr': (RHR_MIN, RHR_MAX),
+    'sleep_duration': (SLEEP_DURATION_MIN_HOURS, SLEEP_DURATION_MAX_HOURS),
+    'sleep_efficiency': (SLEEP_EFFICIENCY_MIN_PERCENT, SLEEP_EFFICIENCY_MAX_PERCENT),
+    'prev_strain': (OVERALL_STRAIN_MIN_FOR_RECOVERY_NORMALIZATION, OVERALL_STRAIN_MAX_FOR_RECOVERY_NORMALIZATION),
+}
+# Components where a higher raw value means worse recovery
+INVERTED_RECOVERY_COMPONENTS = ('rhr', 'prev_strain')
+
+def normalize_recovery_component(name: str, values: np.ndarray, low, high) -> np.ndarray:
+    """Scales one recovery input to 0-1 between `low` and `high` (inverted for RHR and previous strain)."""
+    scaled = (values - low) / (high - low)
+    if name in INVERTED_RECOVERY_COMPONENTS:
+        scaled = 1 - scaled
+    return np.clip(scaled, 0, 1)
+
+def normalize_recovery_components(hrv: np.ndarray, rhr: np.ndarray, sleep_duration_hours: np.ndarray,
+                                  sleep_efficiency_percent: np.ndarray, prev_strain: np.ndarray,
+                                  bounds: dict[str, tuple] | None = None) -> dict[str, np.ndarray]:
+    """Normalized recovery components, keyed like RECOVERY_NORMALIZATION_BOUNDS (missing bounds use the defaults)."""
+    bounds = {**RECOVERY_NORMALIZATION_BOUNDS, **(bounds or {})}
+    raw = {'hrv': hrv, 'rhr': rhr, 'sleep_duration': sleep_duration_hours,
+           'sleep_efficiency': sleep_efficiency_percent, 'prev_strain': prev_strain}
+    return {name: normalize_recovery_component(name, values, *bounds[name]) for name, values in raw.items()}
+
+def score_recovery_components(components: dict[str, np.ndarray], weights: dict | None = None) -> np.ndarray:
+    """
+    Weights normalized components into recovery scores (0-100, unrounded). Weights may be
+    arrays that broadcast against the components, to score many weight sets at once.
+    """
+    weights = {**RECOVERY_WEIGHTS, **(weights or {})}
+    sleep_quality_score = np.clip(weights['sleep_duration_in_quality'] * components['sleep_duration'] +
+                                  weights['sleep_efficiency_in_quality'] * components['sleep_efficiency'], 0, 1)
+    recovery_score = (
+        weights['hrv'] * components['hrv'] +
+        weights['rhr'] * components['rhr'] +
+        weights['sleep_quality'] * sleep_quality_score +
+        weights['prev_strain'] * components['prev_strain']
+    ) * 100
+    return np.clip(recovery_score, 0, 100)
+
+def compute_recovery_scores(hrv: np.ndarray, rhr: np.ndarray, sleep_duration_hours: np.ndarray,
+                            sleep_efficiency_percent: np.ndarray, prev_strain: np.ndarray) -> np.ndarray:
+    """Computes recovery scores (0-100, unrounded) from the day's metrics and the previous day's strain."""
+    return score_recovery_components(normalize_recovery_components(hrv, rhr, sleep_duration_hours,
+                                                                   sleep_efficiency_percent, prev_strain))
+
+def previous_day_strain(strain: np.ndarray, user_id: np.ndarray | None = None,
+                        carry: float = ASSUMED_PREV_DAY_STRAIN_FOR_DAY_0) -> np.ndarray:
+    """
+    Previous day's strain for each row of a user-major, date-ordered table: the row above, or
+    `carry` for the first row and ASSUMED_PREV_DAY_STRAIN_FOR_DAY_0 where a new user starts.
+    """
+    strain = np.asarray(strain, dtype=float)
+    prev_strain = np.empty_like(strain)
+    prev_strain[:1] = carry
+    prev_strain[1:] = strain[:-1]
+    if user_id is not None:
+        user_id = np.asarray(user_id)
+        prev_strain[1:][user_id[1:] != user_id[:-1]] = ASSUMED_PREV_DAY_STRAIN_FOR_DAY_0
+    return prev_strain
+
+def simulate_days(noise: np.ndarray, day_index: np.ndarray, weekday: np.ndarray, trend_days: int,
+                  hrv_baseline: np.ndarray, prev_strain: np.ndarray,
+                  calendar: EventCalendar | None = None) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray]:
+    """
+    Turns standard normal draws into daily metrics with whole-array operations.
+
+    `noise` has shape (users, days, NOISE_COLUMNS); `day_index` (offsets from the start date)
+    and `weekday` have shape (days,); `hrv_baseline` and `prev_strain` hold each user's state
+    going into the first day. Life events come from `calendar` (default: default_event_calendar()).
+    The seasonal trends run over the first trend_days days and hold their last level after that,
+    so streams appended far past the original horizon do not drift without bound.
+    Returns the rounded metric arrays, shape (users, days), and the HRV baseline and strain to
+    carry into the next day.
+    """
+    trend_days = max(trend_days, 1) # Zero only when there are no days (num_days=0) to spread the trends over
+    trend_day_index = np.minimum(day_index, trend_days - 1)
+    with profile_stage('events'):
+        effects = (calendar or default_event_calendar()).effects_for(day_index)
+        stress = effects['stress'].astype(float)
+
+    with profile_stage('hrv'):
+
+        # HRV: baseline walk (sequential), then daily noise and stress effects (vectorized)
+        baseline_steps = (noise[..., _NOISE_BASELINE_DRIFT] * HRV_BASELINE_DRIFT_STD_DEV
+                          + HRV_BASELINE_TOTAL_TREND_MS / trend_days * (day_index < trend_days)
+                          - stress * effects['hrv_baseline_pull'])
+        baselines = _hrv_baseline_walk(hrv_baseline, baseline_steps)
+        daily_hrv = baselines[:, :-1] + noise[..., _NOISE_HRV] * HRV_DAILY_STD_DEV
+        daily_hrv -= stress * (effects['hrv_reduction_mean'] + noise[..., _NOISE_STRESS_HRV] * effects['hrv_reduction_std'])
+        daily_hrv = np.clip(daily_hrv, HRV_MIN, HRV_MAX)
+
+    with profile_stage('rhr'):
+        # RHR, correlated with the final daily HRV
+        rhr_target_from_hrv = RHR_BASELINE_MEAN + (daily_hrv - HRV_BASELINE_MEAN) * RHR_HRV_CORRELATION_FACTOR
+        daily_rhr = np.clip(rhr_target_from_hrv + noise[..., _NOISE_RHR] * RHR_DAILY_STD_DEV, RHR_MIN, RHR_MAX)
+
+    with profile_stage('sleep'):
+        # Sleep duration and efficiency, with seasonal trend, stress and travel effects
+        sleep_trend = (SLEEP_DURATION_TOTAL_TREND_HOURS / trend_days) * trend_day_index
+        daily_sleep_duration = SLEEP_DURATION_MEAN_HOURS + sleep_trend + noise[..., _NOISE_SLEEP_DURATION] * SLEEP_DURATION_STD_DEV_HOURS
+        daily_sleep_efficiency = SLEEP_EFFICIENCY_MEAN_PERCENT + noise[..., _NOISE_SLEEP_EFFICIENCY] * SLEEP_EFFICIENCY_STD_DEV_PERCENT
+        daily_sleep_duration -= stress * (effects['sleep_duration_reduction_mean'] +
+                                          noise[..., _NOISE_STRESS_SLEEP_DURATION] * effects['sleep_duration_reduction_std'])
+        daily_sleep_efficiency -= stress * (effects['sleep_efficiency_reduction_mean'] +
+                                            noise[..., _NOISE_STRESS_SLEEP_EFFICIENCY] * effects['sleep_efficiency_reduction_std'])
+
+        # Sleep events (travel, red-eye, ...) reduce or replace the values, on top of any stress effects
+        event_sleep_duration = effects['sleep_duration_mean'] + noise[..., _NOISE_EVENT_SLEEP_DURATION] * effects['sleep_duration_std']
+        event_sleep_efficiency = effects['sleep_efficiency_mean'] + noise[..., _NOISE_EVENT_SLEEP_EFFICIENCY] * effects['sleep_efficiency_std']
+        is_override_day = effects['sleep_mode'] == SLEEP_MODE_OVERRIDE
+        daily_sleep_duration = np.where(is_override_day, event_sleep_duration, daily_sleep_duration)
+        daily_sleep_efficiency = np.where(is_override_day, event_sleep_efficiency, daily_sleep_efficiency)
+        reduce = (effects['sleep_mode'] == SLEEP_MODE_REDUCE).astype(float)
+        daily_sleep_duration -= reduce * event_sleep_duration
+        daily_sleep_efficiency -= reduce * event_sleep_efficiency
+
+        daily_sleep_duration = np.clip(daily_sleep_duration, SLEEP_DURATION_MIN_HOURS, SLEEP_DURATION_MAX_HOURS)
+        daily_sleep_efficiency = np.clip(daily_sleep_efficiency, SLEEP_EFFICIENCY_MIN_PERCENT, SLEEP_EFFICIENCY_MAX_PERCENT)
+
+    with profile_stage('sleep_stages'):
+        # Sleep stages: cap REM + Deep at MAX_REM_DEEP_PERCENT_SUM, shrinking the larger share proportionally
+        effective_sleep_hours = daily_sleep_duration * (daily_sleep_efficiency / 100.0)
+        rem_p = np.clip(SLEEP_REM_PERCENT_MEAN + noise[..., _NOISE_REM] * SLEEP_STAGE_PERCENT_STD_DEV, 15.0, 30.0)
+        deep_p = np.clip(SLEEP_DEEP_PERCENT_MEAN + noise[..., _NOISE_DEEP] * SLEEP_STAGE_PERCENT_STD_DEV, 10.0, 25.0)
+        rem_deep_sum = rem_p + deep_p
+        over_cap = rem_deep_sum > MAX_REM_DEEP_PERCENT_SUM
+        rem_is_larger = rem_p > deep_p
+        cap_factor = MAX_REM_DEEP_PERCENT_SUM / rem_deep_sum
+        scaled_rem_p = np.where(rem_is_larger, rem_p * cap_factor, MAX_REM_DEEP_PERCENT_SUM - deep_p * cap_factor)
+        scaled_deep_p = np.where(rem_is_larger, MAX_REM_DEEP_PERCENT_SUM - rem_p * cap_factor, deep_p * cap_factor)
+        rem_p = np.where(over_cap, scaled_rem_p, rem_p)
+        deep_p = np.where(over_cap, scaled_deep_p, deep_p)
+        sleep_rem_hours = effective_sleep_hours * (rem_p / 100.0)
+        sleep_deep_hours = effective_sleep_hours * (deep_p / 100.0)
+        # REM + Deep never exceeds MAX_REM_DEEP_PERCENT_SUM, so Light sleep is the non-negative remainder
+        sleep_light_hours = np.maximum(effective_sleep_hours - sleep_rem_hours - sleep_deep_hours, 0)
+
+    with profile_stage('strain'):
+        # Strain, by workout vs non-workout weekday
+        is_workout_day = np.isin(weekday, WORKOUT_DAY_INDICES)
+        daily_strain = np.where(
+            is_workout_day,
+            np.clip(WORKOUT_DAYS_STRAIN_MEAN + noise[..., _NOISE_STRAIN] * WORKOUT_DAYS_STRAIN_STD_DEV, WORKOUT_DAYS_STRAIN_MIN, WORKOUT_DAYS_STRAIN_MAX),
+            np.clip(NON_WORKOUT_DAYS_STRAIN_MEAN + noise[..., _NOISE_STRAIN] * NON_WORKOUT_DAYS_STRAIN_STD_DEV, NON_WORKOUT_DAYS_STRAIN_MIN, NON_WORKOUT_DAYS_STRAIN_MAX),
+        )
+
+    with profile_stage('rounding'):
+        metrics = {
+            'hrv': np.round(daily_hrv).astype(np.int64),
+            'rhr': np.round(daily_rhr).astype(np.int64),
+            'sleep_duration_hours': np.round(daily_sleep_duration, 2),
+            'sleep_efficiency_percent': np.round(daily_sleep_efficiency, 1),
+            'sleep_rem_hours': np.round(sleep_rem_hours, 2),
+            'sleep_deep_hours': np.round(sleep_deep_hours, 2),
+            'sleep_light_hours': np.round(sleep_light_hours, 2),
+            'strain_score': np.round(daily_strain, 1),
+        }
+
+    with profile_stage('recovery'):
+        # Recovery is scored from the rounded values, with the previous day's strain shifted in
+        prev_strain_values = np.concatenate([np.reshape(prev_strain, (-1, 1)), metrics['strain_score'][:, :-1]], axis=1)
+        recovery_score = compute_recovery_scores(metrics['hrv'], metrics['rhr'], metrics['sleep_duration_hours'],
+                                                 metrics['sleep_efficiency_percent'], prev_strain_values)
+        metrics['recovery_score_percent'] = np.round(recovery_score).astype(np.int64)
+    # With no days generated the strain carried in is carried on
+    last_strain = metrics['strain_score'][:, -1] if day_index.size else np.asarray(prev_strain, dtype=float)
+    return metrics, baselines[:, -1], last_strain
+
+# --- Streaming Generation ---
+DEFAULT_CHUNK_DAYS = 365
+
+@dataclass
+class GenerationState:
+    """
+    Cross-day state of one user's stream: the trend horizon, how many days have been
+    generated, the HRV baseline going into the next day and the last day's strain (used by
+    the next day's recovery). Together with the Generator it fully determines what follows.
+    """
+    trend_days: int
+    day_offset: int = 0
+    hrv_baseline: float = HRV_BASELINE_MEAN
+    prev_strain: float = ASSUMED_PREV_DAY_STRAIN_FOR_DAY_0
+
+def generate_chunk(rng: np.random.Generator, start_date: datetime.date, num_days: int,
+                   state: GenerationState, calendar: EventCalendar | None = None) -> dict[str, np.ndarray]:
+    """Generates the next num_days after `state` (a 'date' column plus metrics) and advances `state` in place."""
+    day_index = state.day_offset + np.arange(num_days)
+    weekday = (start_date.weekday() + day_index) % 7
+    noise = draw_daily_noise(rng, num_days)[np.newaxis]
+    metrics, hrv_baseline, prev_strain = simulate_days(noise, day_index, weekday, state.trend_days,
+                                                       np.array([state.hrv_baseline], dtype=float),
+                                                       np.array([state.prev_strain], dtype=float), calendar)
+    state.day_offset += num_days
+    state.hrv_baseline = float(hrv_baseline[0])
+    state.prev_strain = float(prev_strain[0])
+    return {'date': np.datetime64(start_date, 'D') + day_index, **{name: values[0] for name, values in metrics.items()}}
+
+def iter_daily_chunks(num_days: int, start_date: datetime.date, chunk_days: int = DEFAULT_CHUNK_DAYS,
+                      rng: np.random.Generator | int | None = None, trend_days: int | None = None,
+                      state: GenerationState | None = None, as_frame: bool = False,
+                      calendar: EventCalendar | None = None):
+    """
+    Yields num_days of generated data in chunks of at most chunk_days, as dicts of arrays
+    (or DataFrames with as_frame=True), so memory stays bounded by the chunk size.
+
+    Every day reads one fixed-size row of draws and the cross-day state is carried in
+    `state`, so concatenated chunks are identical to a single-shot generate_daily_arrays()
+    call with the same seed. Pass an existing `state` (and its Generator) to continue a stream.
+    trend_days sets the horizon the seasonal trends are spread over (defaults to num_days;
+    later days keep the trends' final level);
+    `calendar` supplies the life events (default: default_event_calendar()).
+    """
+    if chunk_days <= 0:
+        raise ValueError("chunk_days must be positive.")
+    rng = np.random.default_rng(rng)
+    if state is None:
+        state = GenerationState(trend_days=trend_days or num_days)
+    if as_frame:
+        import pandas as pd
+    remaining = num_days
+    while remaining > 0:
+        chunk = generate_chunk(rng, start_date, min(chunk_days, remaining), state, calendar)
+        remaining -= len(chunk['date'])
+        yield pd.DataFrame(chunk) if as_frame else chunk
+
+def write_csv_stream(path: str, chunks) -> int:
+    """Writes chunks from iter_daily_chunks() to a CSV file as they arrive; returns the number of rows written."""
+    rows_written = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['date'] + METRIC_COLUMNS)
+        for chunk in chunks:
+            columns = [np.datetime_as_string(chunk['date'], unit='D').tolist()] + [chunk[name].tolist() for name in METRIC_COLUMNS]
+            writer.writerows(zip(*columns))
+            rows_written += len(chunk['date'])
+    return rows_written
+
+def checkpoint_to_dict(state: GenerationState, rng: np.random.Generator) -> dict:
+    """Serializes the stream state and the Generator's bit-generator state to JSON-friendly values."""
+    return {
+        'trend_days': state.trend_days,
+        'day_offset': state.day_offset,
+        'hrv_baseline': state.hrv_baseline,
+        'prev_strain': state.prev_strain,
+        'bit_generator': rng.bit_generator.state,
+    }
+
+def checkpoint_from_dict(checkpoint: dict) -> tuple[GenerationState, np.random.Generator]:
+    """Restores the (state, Generator) pair saved by checkpoint_to_dict."""
+    bit_generator_state = checkpoint['bit_generator']
+    bit_generator = getattr(np.random, bit_generator_state['bit_generator'])()
+    bit_generator.state = bit_generator_state
+    state = GenerationState(trend_days=checkpoint['trend_days'], day_offset=checkpoint['day_offset'],
+                            hrv_baseline=checkpoint['hrv_baseline'], prev_strain=checkpoint['prev_strain'])
+    return state, np.random.Generator(bit_generator)
+
+def append_to_dataset(directory: str, end_date: datetime.date, chunk_days: int = DEFAULT_CHUNK_DAYS) -> int:
     """
-    Generates 90 days of correlated HRV, RHR, Sleep, Strain, and Recovery data for Executive Alex.
+    Extends an .npy dataset written by this script with the days after its last date up to
+    end_date, resuming from the checkpoint in its manifest. Existing rows are not rewritten,
+    so the cost is proportional to the days added, and the result is identical to a full
+    regeneration with the same seed and trend horizon. Returns the number of days appended.
     """
+    attributes = dataset_io.read_manifest(directory)['attributes']
+    if 'checkpoint' not in attributes:
+        raise ValueError(f"{directory} has no generation checkpoint; regenerate it before appending.")
+    state, rng = checkpoint_from_dict(attributes['checkpoint'])
+    start_date = datetime.date.fromisoformat(attributes['start_date'])
+    calendar = EventCalendar(attributes['events'], EVENT_TYPES) if 'events' in attributes else None
+    last_date = start_date + datetime.timedelta(days=state.day_offset - 1)
+
+    # The stored tail must agree with the checkpoint, otherwise the data was modified since
+    tail = dataset_io.load_npy_columns(directory, ['date', 'strain_score'])
+    if (len(tail['date']) != state.day_offset or tail['date'][-1] != np.datetime64(last_date, 'D')
+            or not np.isclose(tail['strain_score'][-1], state.prev_strain, atol=1e-4)):
+        raise ValueError(f"The tail of {directory} does not match its checkpoint; regenerate it before appending.")
+
+    missing_days = (end_date - last_date).days
+    for chunk in iter_daily_chunks(missing_days, start_date, chunk_days, rng=rng, state=state, calendar=calendar):
+        # Checkpoint and rows are committed together, chunk by chunk
+        attributes['checkpoint'] = checkpoint_to_dict(state, rng)
+        dataset_io.append_npy_columns(directory, chunk, attributes)
+    return max(missing_days, 0)
+
+def generate_daily_arrays(num_days: int, start_date: datetime.date,
+                          rng: np.random.Generator | int | None = None,
+                          trend_days: int | None = None,
+                          calendar: EventCalendar | None = None) -> dict[str, np.ndarray]:
+    """Generates one user's daily metrics with the vectorized engine, as a dict of 1-D arrays."""
+    state = GenerationState(trend_days=trend_days or num_days)
+    return generate_chunk(np.random.default_rng(rng), start_date, num_days, state, calendar)
+
+def generate_daily_metrics(num_days: int, start_date: datetime.date, engine: str = "vectorized",
+                           rng: np.random.Generator | int | None = None,
+                           trend_days: int | None = None,
+                           calendar: EventCalendar | None = None) -> pd.DataFrame:
+    """
+    Generates num_days of correlated HRV, RHR, Sleep, Strain, and Recovery data for Executive Alex.
+
+    engine="vectorized" (default) draws each day's noise in one batched Generator call and computes
+    everything except the HRV baseline walk as whole-array operations. engine="loop" runs the
+    original day-by-day implementation, kept as a reference; with rng=None it uses NumPy's
+    global random state as it always has. trend_days (vectorized only) spreads the seasonal
+    trends over a horizon other than num_days, and `calendar` (vectorized only) replaces the
+    default life events; the loop engine always uses the module constants.
+    """
+    if engine == "loop":
+        return _generate_daily_metrics_loop(num_days, start_date, rng)
+    if engine != "vectorized":
+        raise ValueError(f"Unknown engine '{engine}', expected 'vectorized' or 'loop'.")
+    import pandas as pd
+    arrays = generate_daily_arrays(num_days, start_date, rng, trend_days, calendar)
+    arrays['date'] = pd.date_range(start=start_date, periods=num_days, freq='D')
+    return pd.DataFrame(arrays)
+
+# --check-engines tolerances, for the default 3650 days: independent samples of that size
+# leave mean gaps of about 0.025 std and std gaps of about 2% by chance
+ENGINE_CHECK_MEAN_TOLERANCE = 0.1 # Loop-engine standard deviations
+ENGINE_CHECK_STD_TOLERANCE = 0.1 # Relative difference of standard deviations
+# Metrics that follow the autocorrelated HRV baseline walk: one 10-year run holds only a few
+# independent baseline excursions, so their means differ between the engines by up to ~0.4 std
+# depending on the seed. They are reported but not checked.
+ENGINE_CHECK_WALK_METRICS = ('hrv', 'rhr', 'recovery_score_percent')
+
+def compare_engine_distributions(num_days: int = 3650, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates the same horizon with both engines and summarizes each metric's distribution.
+    The returned frame has one row per metric with both means and standard deviations, the
+    mean difference expressed in loop-engine standard deviations (`mean_diff_in_std`) and the
+    relative difference of the standard deviations (`std_rel_diff`).
+    """
+    start_date = END_DATE - datetime.timedelta(days=num_days - 1)
+    loop_df = generate_daily_metrics(num_days, start_date, engine="loop", rng=seed)
+    vectorized_df = generate_daily_metrics(num_days, start_date, engine="vectorized", rng=seed + 1)
+    import pandas as pd
+    summary = pd.DataFrame({
+        'loop_mean': loop_df[METRIC_COLUMNS].mean(),
+        'vectorized_mean': vectorized_df[METRIC_COLUMNS].mean(),
+        'loop_std': loop_df[METRIC_COLUMNS].std(),
+        'vectorized_std': vectorized_df[METRIC_COLUMNS].std(),
+    })
+    summary['mean_diff_in_std'] = (summary['vectorized_mean'] - summary['loop_mean']).abs() / summary['loop_std']
+    summary['std_rel_diff'] = (summary['vectorized_std'] - summary['loop_std']).abs() / summary['loop_std']
+    return summary
+
+def check_engine_distributions(summary: pd.DataFrame) -> list[str]:
+    """
+    Checks a compare_engine_distributions() summary against the ENGINE_CHECK_* tolerances for
+    every metric outside ENGINE_CHECK_WALK_METRICS. Returns one message per failure.
+    """
+    failures = []
+    for metric, row in summary.drop(index=list(ENGINE_CHECK_WALK_METRICS)).iterrows():
+        if not row['mean_diff_in_std'] <= ENGINE_CHECK_MEAN_TOLERANCE:
+            failures.append(f"{metric}: means differ by {row['mean_diff_in_std']:.3f} std (tolerance {ENGINE_CHECK_MEAN_TOLERANCE})")
+        if not row['std_rel_diff'] <= ENGINE_CHECK_STD_TOLERANCE:
+            failures.append(f"{metric}: standard deviations differ by {row['std_rel_diff']:.1%} (tolerance {ENGINE_CHECK_STD_TOLERANCE:.0%})")
+    return failures
+
+def _generate_daily_metrics_loop(num_days: int, start_date: datetime.date,
+                                 rng: np.random.Generator | int | None = None) -> pd.DataFrame:
+    """Reference day-by-day implementation of generate_daily_metrics."""
+    import pandas as pd
+    normal = np.random.normal if rng is None else np.random.default_rng(rng).normal
     dates = pd.date_range(start=start_date, periods=num_days, freq='D')
-    
+
     hrv_values = []
     rhr_values = []
     sleep_duration_hours_values = []
@@ -134,15 +659,15 @@ def generate_daily_metrics(num_days: int, start_date: datetime.date) -> pd.DataF
                 break
 
         # Simulate daily HRV
-        daily_hrv = np.random.normal(current_hrv_baseline, HRV_DAILY_STD_DEV)
+        daily_hrv = normal(current_hrv_baseline, HRV_DAILY_STD_DEV)
         if is_stress_day:
-            hrv_reduction = np.random.normal(STRESS_IMPACT_HRV_REDUCTION_MEAN, STRESS_IMPACT_HRV_REDUCTION_STD)
+            hrv_reduction = normal(STRESS_IMPACT_HRV_REDUCTION_MEAN, STRESS_IMPACT_HRV_REDUCTION_STD)
             daily_hrv -= hrv_reduction
         daily_hrv = np.clip(daily_hrv, HRV_MIN, HRV_MAX)
         hrv_values.append(round(daily_hrv))
         
         # Update HRV baseline with a slow drift AND seasonal trend for next day
-        baseline_drift = np.random.normal(0, HRV_BASELINE_DRIFT_STD_DEV)
+        baseline_drift = normal(0, HRV_BASELINE_DRIFT_STD_DEV)
         # Apply a portion of the total seasonal trend each day
         daily_hrv_trend_increment = HRV_BASELINE_TOTAL_TREND_MS / num_days
         current_hrv_baseline_for_next_day = current_hrv_baseline + baseline_drift + daily_hrv_trend_increment
@@ -156,7 +681,7 @@ def generate_daily_metrics(num_days: int, start_date: datetime.date) -> pd.DataF
         # For simplicity, we'll keep it against the initial mean, but acknowledge this could be refined
         hrv_deviation_from_mean = daily_hrv - HRV_BASELINE_MEAN # Compare to original mean for correlation logic
         rhr_target_from_hrv = RHR_BASELINE_MEAN + (hrv_deviation_from_mean * RHR_HRV_CORRELATION_FACTOR)
-        daily_rhr = np.random.normal(rhr_target_from_hrv, RHR_DAILY_STD_DEV)
+        daily_rhr = normal(rhr_target_from_hrv, RHR_DAILY_STD_DEV)
         daily_rhr = np.clip(daily_rhr, RHR_MIN, RHR_MAX)
         rhr_values.append(round(daily_rhr))
 
@@ -164,31 +689,31 @@ def generate_daily_metrics(num_days: int, start_date: datetime.date) -> pd.DataF
         # Simulate Sleep Duration (initial generation, with seasonal trend)
         daily_sleep_trend_adjustment = (SLEEP_DURATION_TOTAL_TREND_HOURS / num_days) * i
         current_target_sleep_duration = SLEEP_DURATION_MEAN_HOURS + daily_sleep_trend_adjustment
-        daily_sleep_duration = np.random.normal(current_target_sleep_duration, SLEEP_DURATION_STD_DEV_HOURS)
+        daily_sleep_duration = normal(current_target_sleep_duration, SLEEP_DURATION_STD_DEV_HOURS)
         
         # Simulate Sleep Efficiency (initial generation - no specific seasonal trend applied here directly)
-        daily_sleep_efficiency = np.random.normal(SLEEP_EFFICIENCY_MEAN_PERCENT, SLEEP_EFFICIENCY_STD_DEV_PERCENT)
+        daily_sleep_efficiency = normal(SLEEP_EFFICIENCY_MEAN_PERCENT, SLEEP_EFFICIENCY_STD_DEV_PERCENT)
 
         # Apply Stress Effects (if applicable, these modify the initial values)
         if is_stress_day:
-            stress_sleep_duration_reduction = np.random.normal(STRESS_IMPACT_SLEEP_DURATION_REDUCTION_HOURS_MEAN, STRESS_IMPACT_SLEEP_DURATION_REDUCTION_HOURS_STD)
+            stress_sleep_duration_reduction = normal(STRESS_IMPACT_SLEEP_DURATION_REDUCTION_HOURS_MEAN, STRESS_IMPACT_SLEEP_DURATION_REDUCTION_HOURS_STD)
             daily_sleep_duration -= stress_sleep_duration_reduction
-            stress_sleep_efficiency_reduction = np.random.normal(STRESS_IMPACT_SLEEP_EFFICIENCY_REDUCTION_PERCENT_MEAN, STRESS_IMPACT_SLEEP_EFFICIENCY_REDUCTION_PERCENT_STD)
+            stress_sleep_efficiency_reduction = normal(STRESS_IMPACT_SLEEP_EFFICIENCY_REDUCTION_PERCENT_MEAN, STRESS_IMPACT_SLEEP_EFFICIENCY_REDUCTION_PERCENT_STD)
             daily_sleep_efficiency -= stress_sleep_efficiency_reduction
 
         # Apply Travel Effects (if applicable, these can further modify or override stress effects for sleep)
         is_travel_day_generic = i in TRAVEL_DAYS_INDICES and i != RED_EYE_DAY_INDEX and i != POST_RED_EYE_DAY_INDEX
         
         if i == RED_EYE_DAY_INDEX:
-            daily_sleep_duration = np.random.normal(RED_EYE_SLEEP_DURATION_HOURS_MEAN, RED_EYE_SLEEP_DURATION_HOURS_STD)
-            daily_sleep_efficiency = np.random.normal(RED_EYE_SLEEP_EFFICIENCY_PERCENT_MEAN, RED_EYE_SLEEP_EFFICIENCY_PERCENT_STD)
+            daily_sleep_duration = normal(RED_EYE_SLEEP_DURATION_HOURS_MEAN, RED_EYE_SLEEP_DURATION_HOURS_STD)
+            daily_sleep_efficiency = normal(RED_EYE_SLEEP_EFFICIENCY_PERCENT_MEAN, RED_EYE_SLEEP_EFFICIENCY_PERCENT_STD)
         elif i == POST_RED_EYE_DAY_INDEX:
-            daily_sleep_duration = np.random.normal(POST_RED_EYE_SLEEP_DURATION_HOURS_MEAN, POST_RED_EYE_SLEEP_DURATION_HOURS_STD)
-            daily_sleep_efficiency = np.random.normal(POST_RED_EYE_SLEEP_EFFICIENCY_PERCENT_MEAN, POST_RED_EYE_SLEEP_EFFICIENCY_PERCENT_STD)
+            daily_sleep_duration = normal(POST_RED_EYE_SLEEP_DURATION_HOURS_MEAN, POST_RED_EYE_SLEEP_DURATION_HOURS_STD)
+            daily_sleep_efficiency = normal(POST_RED_EYE_SLEEP_EFFICIENCY_PERCENT_MEAN, POST_RED_EYE_SLEEP_EFFICIENCY_PERCENT_STD)
         elif is_travel_day_generic: # General travel day (not red-eye or post-red-eye)
-            travel_sleep_duration_reduction = np.random.normal(TRAVEL_SLEEP_DURATION_REDUCTION_HOURS_MEAN, TRAVEL_SLEEP_DURATION_REDUCTION_HOURS_STD)
+            travel_sleep_duration_reduction = normal(TRAVEL_SLEEP_DURATION_REDUCTION_HOURS_MEAN, TRAVEL_SLEEP_DURATION_REDUCTION_HOURS_STD)
             daily_sleep_duration -= travel_sleep_duration_reduction # Assumes travel reduces from the potentially stress-adjusted value
-            travel_sleep_efficiency_reduction = np.random.normal(TRAVEL_SLEEP_EFFICIENCY_REDUCTION_PERCENT_MEAN, TRAVEL_SLEEP_EFFICIENCY_REDUCTION_PERCENT_STD)
+            travel_sleep_efficiency_reduction = normal(TRAVEL_SLEEP_EFFICIENCY_REDUCTION_PERCENT_MEAN, TRAVEL_SLEEP_EFFICIENCY_REDUCTION_PERCENT_STD)
             daily_sleep_efficiency -= travel_sleep_efficiency_reduction
 
         # Final clipping for sleep duration and efficiency
@@ -201,10 +726,10 @@ def generate_daily_metrics(num_days: int, start_date: datetime.date) -> pd.DataF
         # Simulate Sleep Stages
         effective_sleep_hours = daily_sleep_duration * (daily_sleep_efficiency / 100.0)
         
-        rem_p = np.random.normal(SLEEP_REM_PERCENT_MEAN, SLEEP_STAGE_PERCENT_STD_DEV)
+        rem_p = normal(SLEEP_REM_PERCENT_MEAN, SLEEP_STAGE_PERCENT_STD_DEV)
         rem_p = np.clip(rem_p, 15.0, 30.0) # Realistic bounds for REM % 
 
-        deep_p = np.random.normal(SLEEP_DEEP_PERCENT_MEAN, SLEEP_STAGE_PERCENT_STD_DEV)
+        deep_p = normal(SLEEP_DEEP_PERCENT_MEAN, SLEEP_STAGE_PERCENT_STD_DEV)
         deep_p = np.clip(deep_p, 10.0, 25.0) # Realistic bounds for Deep %
 
         # Ensure REM + Deep doesn't take up too much, cap if necessary
@@ -265,10 +790,10 @@ def generate_daily_metrics(num_days: int, start_date: datetime.date) -> pd.DataF
         # Simulate Strain Score
         day_of_week = dates[i].dayofweek # Monday=0, Sunday=6
         if day_of_week in WORKOUT_DAY_INDICES:
-            daily_strain = np.random.normal(WORKOUT_DAYS_STRAIN_MEAN, WORKOUT_DAYS_STRAIN_STD_DEV)
+            daily_strain = normal(WORKOUT_DAYS_STRAIN_MEAN, WORKOUT_DAYS_STRAIN_STD_DEV)
             daily_strain = np.clip(daily_strain, WORKOUT_DAYS_STRAIN_MIN, WORKOUT_DAYS_STRAIN_MAX)
         else:
-            daily_strain = np.random.normal(NON_WORKOUT_DAYS_STRAIN_MEAN, NON_WORKOUT_DAYS_STRAIN_STD_DEV)
+            daily_strain = normal(NON_WORKOUT_DAYS_STRAIN_MEAN, NON_WORKOUT_DAYS_STRAIN_STD_DEV)
             daily_strain = np.clip(daily_strain, NON_WORKOUT_DAYS_STRAIN_MIN, NON_WORKOUT_DAYS_STRAIN_MAX)
         strain_score_values.append(round(daily_strain, 1))
 
@@ -331,81 +856,235 @@ def generate_daily_metrics(num_days: int, start_date: datetime.date) -> pd.DataF
     return df
 
 # --- Validation Function ---
+# (rule name, column, low, high, message template) for the inclusive range checks
+VALIDATION_RANGE_RULES = [
+    ('hrv_range', 'hrv', HRV_MIN, HRV_MAX, "HRV {value} out of range [{low}-{high}]"),
+    ('rhr_range', 'rhr', RHR_MIN, RHR_MAX, "RHR {value} out of range [{low}-{high}]"),
+    ('sleep_duration_range', 'sleep_duration_hours', 1, 14, "Sleep duration {value} out of range [{low}-{high}] hours"), # Generous range for sleep
+    ('sleep_efficiency_range', 'sleep_efficiency_percent', 0, 100, "Sleep efficiency {value} out of range [{low}-{high}]%"),
+    ('recovery_score_range', 'recovery_score_percent', 0, 100, "Recovery score {value} out of range [{low}-{high}]%"),
+    ('strain_score_range', 'strain_score', 0, 21, "Strain score {value} out of range [{low}-{high}]"),
+]
+SLEEP_STAGES_SUM_RULE = 'sleep_stages_sum'
+# Tolerance of 0.03 accounts for compounded rounding errors from multiple sources
+# (duration, efficiency, and 3 sleep stages all being rounded independently)
+SLEEP_STAGES_SUM_ATOL = 0.03
+DEFAULT_VALIDATION_SAMPLE_SIZE = 20
+
+@dataclass
+class ValidationReport:
+    """
+    Result of validate_metrics: offending-row counts per rule plus, for each failing rule,
+    a capped sample of offending row positions with their dates and values. Messages are
+    only formatted when messages() is called.
+    """
+    num_rows: int
+    counts: dict[str, int]
+    samples: dict[str, dict[str, np.ndarray]] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not any(self.counts.values())
+
+    @property
+    def total_violations(self) -> int:
+        return sum(self.counts.values())
+
+    def messages(self) -> list[str]:
+        """Formats one human-readable line per sampled violation, grouped by rule."""
+        templates = {name: (low, high, template) for name, _, low, high, template in VALIDATION_RANGE_RULES}
+        messages = []
+        for rule, sample in self.samples.items():
+            dates = np.datetime_as_string(sample['date'], unit='D')
+            if rule == SLEEP_STAGES_SUM_RULE:
+                for date, stages_sum, expected in zip(dates, sample['value'].tolist(), sample['expected'].tolist()):
+                    messages.append(f"Day {date}: Sum of sleep stages ({stages_sum:.2f}) does not match effective sleep duration ({expected:.2f}), diff: {abs(stages_sum - expected):.3f}")
+                continue
+            low, high, template = templates[rule]
+            for date, value in zip(dates, sample['value'].tolist()):
+                messages.append(f"Day {date}: " + template.format(value=value, low=low, high=high))
+        return messages
+
+def validate_metrics(data, max_samples: int | None = DEFAULT_VALIDATION_SAMPLE_SIZE) -> ValidationReport:
+    """
+    Validates generated data (a DataFrame or a dict of 1-D arrays, e.g. a population table)
+    with one column-wide boolean mask per rule. At most `max_samples` offending rows are kept
+    per rule (None keeps all).
+    """
+    dates = np.asarray(data['date'])
+    counts = {}
+    samples = {}
+
+    def record(rule: str, failing: np.ndarray, **columns: np.ndarray) -> None:
+        positions = np.flatnonzero(failing)
+        counts[rule] = int(positions.size)
+        if positions.size:
+            positions = positions[:max_samples]
+            samples[rule] = {'row': positions, 'date': dates[positions],
+                             **{name: values[positions] for name, values in columns.items()}}
+
+    for rule, column, low, high, _ in VALIDATION_RANGE_RULES:
+        values = np.asarray(data[column])
+        # Written as a negated in-range check so NaNs are reported as violations
+        record(rule, ~((values >= low) & (values <= high)), value=values)
+
+    # Sleep stages sum check
+    effective_sleep_hours = np.round(np.asarray(data['sleep_duration_hours']) * (np.asarray(data['sleep_efficiency_percent']) / 100.0), 2)
+    sleep_stages_sum = np.asarray(data['sleep_rem_hours']) + np.asarray(data['sleep_deep_hours']) + np.asarray(data['sleep_light_hours'])
+    record(SLEEP_STAGES_SUM_RULE, ~np.isclose(sleep_stages_sum, effective_sleep_hours, atol=SLEEP_STAGES_SUM_ATOL),
+           value=sleep_stages_sum, expected=effective_sleep_hours)
+    return ValidationReport(num_rows=len(dates), counts=counts, samples=samples)
+
 def validate_generated_data(df: pd.DataFrame) -> list[str]:
-    """Validates the generated data for plausible ranges and consistency."""
-    warnings = []
-    for index, row in df.iterrows():
-        # Range checks
-        if not (HRV_MIN <= row['hrv'] <= HRV_MAX):
-            warnings.append(f"Day {row['date'].strftime('%Y-%m-%d')}: HRV {row['hrv']} out of range [{HRV_MIN}-{HRV_MAX}]")
-        if not (RHR_MIN <= row['rhr'] <= RHR_MAX):
-            warnings.append(f"Day {row['date'].strftime('%Y-%m-%d')}: RHR {row['rhr']} out of range [{RHR_MIN}-{RHR_MAX}]")
-        if not (1 <= row['sleep_duration_hours'] <= 14): # Generous range for sleep
-            warnings.append(f"Day {row['date'].strftime('%Y-%m-%d')}: Sleep duration {row['sleep_duration_hours']} out of range [1-14] hours")
-        if not (0 <= row['sleep_efficiency_percent'] <= 100):
-            warnings.append(f"Day {row['date'].strftime('%Y-%m-%d')}: Sleep efficiency {row['sleep_efficiency_percent']} out of range [0-100]%")
-        if not (0 <= row['recovery_score_percent'] <= 100):
-            warnings.append(f"Day {row['date'].strftime('%Y-%m-%d')}: Recovery score {row['recovery_score_percent']} out of range [0-100]%")
-        if not (0 <= row['strain_score'] <= 21):
-            warnings.append(f"Day {row['date'].strftime('%Y-%m-%d')}: Strain score {row['strain_score']} out of range [0-21]")
-
-        # Sleep stages sum check
-        effective_sleep_hours_for_row = round(row['sleep_duration_hours'] * (row['sleep_efficiency_percent'] / 100.0), 2)
-        sleep_stages_sum = row['sleep_rem_hours'] + row['sleep_deep_hours'] + row['sleep_light_hours']
-        # Increased atol to 0.03 to account for potential compounded rounding errors from multiple sources
-        # (duration, efficiency, and 3 sleep stages all being rounded independently)
-        if not np.isclose(sleep_stages_sum, effective_sleep_hours_for_row, atol=0.03):
-            warnings.append(f"Day {row['date'].strftime('%Y-%m-%d')}: Sum of sleep stages ({sleep_stages_sum:.2f}) does not match effective sleep duration ({effective_sleep_hours_for_row:.2f}), diff: {abs(sleep_stages_sum - effective_sleep_hours_for_row):.3f}")
-    return warnings
+    """Validates the generated data for plausible ranges and consistency, returning every violation as a message."""
+    return validate_metrics(df, max_samples=None).messages()
 
 # --- Query Utility Functions ---
-def get_metric_for_date(df: pd.DataFrame, date_str: str, metric_name: str) -> float | None:
-    """Retrieves a specific metric for a given date string (YYYY-MM-DD)."""
-    if metric_name not in df.columns:
+# Each helper accepts a MetricStore (built once with MetricStore.from_frame, constant-time queries)
+# or a DataFrame, in which case a single-metric store is built for the call.
+def _as_store(data: pd.DataFrame | MetricStore, metric_name: str) -> MetricStore | None:
+    if isinstance(data, MetricStore):
+        if metric_name not in data:
+            print(f"Error: Metric '{metric_name}' not found in MetricStore metrics.")
+            return None
+        return data
+    if metric_name not in data.columns:
         print(f"Error: Metric '{metric_name}' not found in DataFrame columns.")
         return None
-    # Ensure the 'date' column is in datetime objects if it's not already
-    # This check is important if the function is called with a df where 'date' might not be converted yet
-    if not pd.api.types.is_datetime64_any_dtype(df['date']):
-        # It's generally better to ensure conversion happens before calling this function,
-        # but this provides a fallback. Modifying df in place might be unexpected for caller.
-        # Consider df = df.copy() if modification is needed and df might be reused.
-        # For this script's flow, direct conversion in __main__ is preferred.
-        pass # Assume date is pre-converted as per __main__ block's logic
-
-    target_date = pd.to_datetime(date_str).date()
-    # Use .dt.date for comparison if df['date'] contains datetime objects
-    metric_value = df[df['date'].dt.date == target_date][metric_name]
-    if not metric_value.empty:
-        return metric_value.iloc[0]
-    return None
-
-def get_last_n_days_average(df: pd.DataFrame, metric_name: str, n_days: int) -> float | None:
-    """Calculates the average of a specific metric over the last n_days available."""
-    if metric_name not in df.columns:
-        print(f"Error: Metric '{metric_name}' not found in DataFrame columns.")
+    if data.empty:
+        return None
+    return MetricStore.from_frame(data, [metric_name])
+
+def get_metric_for_date(df: pd.DataFrame | MetricStore, date_str: str, metric_name: str) -> float | None:
+    """Retrieves a specific metric for a given date string (YYYY-MM-DD)."""
+    store = _as_store(df, metric_name)
+    if store is None:
+        return None
+    return store.get(date_str, metric_name)
+
+def get_last_n_days_average(df: pd.DataFrame | MetricStore, metric_name: str, n_days: int) -> float | None:
+    """Calculates the average of a specific metric over the last n_days available (all days if fewer exist)."""
+    store = _as_store(df, metric_name)
+    if store is None:
         return None
     if n_days <= 0:
         print("Error: n_days must be positive.")
         return None
-    if len(df) < n_days:
-        # print(f"Warning: DataFrame has less than {n_days} days. Averaging over available {len(df)} days.")
-        return df[metric_name].mean() # Average over all available if less than n_days
-    return df[metric_name].tail(n_days).mean()
-
-def get_yesterdays_metric(df: pd.DataFrame, metric_name: str) -> float | None:
-    """Retrieves a specific metric for the most recent day in the DataFrame."""
-    if metric_name not in df.columns:
-        print(f"Error: Metric '{metric_name}' not found in DataFrame columns.")
-        return None
-    if df.empty:
+    return store.trailing_mean(metric_name, n_days)
+
+def get_yesterdays_metric(df: pd.DataFrame | MetricStore, metric_name: str) -> float | None:
+    """Retrieves a specific metric for the most recent day in the data."""
+    store = _as_store(df, metric_name)
+    if store is None:
         return None
-    return df[metric_name].iloc[-1]
+    return store.latest(metric_name)
 
-if __name__ == "__main__":
-    daily_metrics_data = generate_daily_metrics(NUM_DAYS, START_DATE)
-    # Ensure the 'date' column is converted to datetime objects for consistent use
-    daily_metrics_data['date'] = pd.to_datetime(daily_metrics_data['date'])
+EXPORT_FORMATS = ['npy', 'parquet', 'json']
+
+def export_dataset(daily_metrics_data: pd.DataFrame, output_dir: str, formats: list[str],
+                   checkpoint: dict | None = None,
+                   calendar: EventCalendar | None = None) -> dict[str, tuple[str, str | None]]:
+    """
+    Writes the requested formats into output_dir and returns {format: (path, sha256 of what was written)}.
+    The .npy layout records its checksums in its manifest, so its entry carries None; a
+    generation `checkpoint` (and the custom `calendar`, if any) stored there enables appending
+    later with --append.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"Created directory: {output_dir}")
+    stem = os.path.splitext(OUTPUT_FILENAME)[0]
+    start_date = np.datetime_as_string(np.asarray(daily_metrics_data['date'], dtype='datetime64[D]')[0], unit='D')
+    written = {}
+    if 'npy' in formats:
+        path = os.path.join(output_dir, stem)
+        attributes = {'start_date': str(start_date), 'contiguous': True}
+        if checkpoint is not None:
+            attributes['checkpoint'] = checkpoint
+        if calendar is not None:
+            attributes['events'] = calendar.to_config()['events']
+        dataset_io.write_npy_columns(path, daily_metrics_data, attributes)
+        written['npy'] = (path, None)
+    if 'parquet' in formats:
+        path = os.path.join(output_dir, stem + '.parquet')
+        written['parquet'] = (path, dataset_io.write_parquet(path, daily_metrics_data))
+    if 'json' in formats:
+        path = os.path.join(output_dir, OUTPUT_FILENAME)
+        written['json'] = (path, dataset_io.write_json(path, daily_metrics_data))
+    for fmt, (path, _) in written.items():
+        print(f"Synthetic data ({fmt}) successfully saved to: {path}")
+    return written
+
+def verify_exports(written: dict[str, tuple[str, str | None]]) -> bool:
+    """Round-trip check by checksum: re-hashes each written output instead of re-parsing it."""
+    all_ok = True
+    for fmt, (path, expected_sha256) in written.items():
+        if fmt == 'npy':
+            mismatched = dataset_io.verify_npy_columns(path)
+            ok = not mismatched
+            detail = "all column checksums match" if ok else f"checksum mismatch in {', '.join(mismatched)}"
+        else:
+            ok = dataset_io.file_sha256(path) == expected_sha256
+            detail = "file checksum matches" if ok else "file checksum mismatch"
+        print(f"{fmt}: {detail} ({path})")
+        all_ok &= ok
+    return all_ok
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate synthetic WHOOP-like data for Executive Alex.")
+    parser.add_argument('--format', dest='formats', nargs='+', choices=EXPORT_FORMATS, default=None,
+                        help="Output formats (default: npy, plus parquet when pyarrow is installed). JSON is only written when requested.")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help=f"Output directory (default: {OUTPUT_DIR})")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible output (default: fresh entropy)")
+    parser.add_argument('--append', action='store_true',
+                        help="Extend the existing .npy dataset in --output-dir with the missing days up to --end-date instead of regenerating")
+    parser.add_argument('--end-date', type=datetime.date.fromisoformat, default=None,
+                        help="Last day to append, YYYY-MM-DD (default: yesterday)")
+    parser.add_argument('--events', default=None, metavar='PATH',
+                        help="JSON event calendar config replacing the default stress/travel/red-eye schedule")
+    parser.add_argument('--profile', action='store_true', help="Print a per-stage timing / allocation report as JSON")
+    parser.add_argument('--profile-output', default=None, help="Also write the --profile report to this file")
+    parser.add_argument('--cprofile', default=None, metavar='PATH', help="Dump cProfile stats for the whole run to PATH")
+    parser.add_argument('--tracemalloc', default=None, metavar='PATH', help="Dump a tracemalloc snapshot at the end of the run to PATH")
+    parser.add_argument('--check-engines', action='store_true',
+                        help="Instead of generating, compare the loop and vectorized engines' distributions over "
+                             "--days and exit non-zero if a stationary metric differs beyond tolerance")
+    parser.add_argument('--days', type=int, default=3650, help="Horizon for --check-engines (default: 3650)")
+    return parser.parse_args(argv)
+
+def run_engine_check(args: argparse.Namespace) -> int:
+    """Prints the engines' distribution summary and any tolerance failures; returns the exit status."""
+    summary = compare_engine_distributions(args.days, 0 if args.seed is None else args.seed)
+    print(summary.round(3).to_string())
+    print(f"Not checked (HRV baseline walk): {', '.join(ENGINE_CHECK_WALK_METRICS)}")
+    failures = check_engine_distributions(summary)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("Engine distributions match." if not failures else f"{len(failures)} engine distribution check(s) failed.")
+    return 1 if failures else 0
+
+def run_pipeline(args: argparse.Namespace) -> None:
+    """Generates, queries, validates, exports and verifies one dataset as configured by the CLI arguments."""
+    import pandas as pd
+    formats = args.formats
+    if formats is None:
+        formats = ['npy'] + (['parquet'] if dataset_io.parquet_available() else [])
+
+    if args.append:
+        directory = os.path.join(args.output_dir, os.path.splitext(OUTPUT_FILENAME)[0])
+        end_date = args.end_date or datetime.date.today() - datetime.timedelta(days=1)
+        with profile_stage('append'):
+            appended_days = append_to_dataset(directory, end_date)
+        if os.path.isdir(features.features_path(directory)):
+            features.append_features(directory)
+        print(f"Appended {appended_days} day(s) to {directory} through {end_date}.")
+        return
+
+    with profile_stage('generate'):
+        rng = np.random.default_rng(args.seed)
+        state = GenerationState(trend_days=NUM_DAYS)
+        calendar = load_event_calendar(args.events, START_DATE) if args.events else None
+        daily_metrics_data = pd.DataFrame(generate_chunk(rng, START_DATE, NUM_DAYS, state, calendar))
     print("\nGenerated Daily Metrics Data (first 5 and last 5 days):")
     pd.set_option('display.max_columns', None)
     pd.set_option('display.width', 1000)
@@ -413,72 +1092,89 @@ if __name__ == "__main__":
     print("...")
     print(daily_metrics_data.tail())
 
-    # Example usage of query utilities
+    # Example usage of query utilities, all answered from one store built up front
     print("\n--- Query Utilities Examples ---")
-    yesterday_hrv = get_yesterdays_metric(daily_metrics_data, 'hrv')
-    print(f"Yesterday's HRV: {yesterday_hrv}")
+    with profile_stage('queries'):
+        metric_store = MetricStore.from_frame(daily_metrics_data)
+        yesterday_hrv = get_yesterdays_metric(metric_store, 'hrv')
+        print(f"Yesterday's HRV: {yesterday_hrv}")
 
-    last_7_days_avg_recovery = get_last_n_days_average(daily_metrics_data, 'recovery_score_percent', 7)
-    print(f"Last 7 days average recovery: {last_7_days_avg_recovery:.2f}%")
+        last_7_days_avg_recovery = get_last_n_days_average(metric_store, 'recovery_score_percent', 7)
+        print(f"Last 7 days average recovery: {last_7_days_avg_recovery:.2f}%")
 
-    # Example: Get sleep duration for a specific date (e.g., 10 days before the end date)
-    specific_date_to_query = (END_DATE - datetime.timedelta(days=10)).strftime('%Y-%m-%d')
-    sleep_on_specific_date = get_metric_for_date(daily_metrics_data, specific_date_to_query, 'sleep_duration_hours')
-    print(f"Sleep duration on {specific_date_to_query}: {sleep_on_specific_date} hours")
+        # Example: Get sleep duration for a specific date (e.g., 10 days before the end date)
+        specific_date_to_query = (END_DATE - datetime.timedelta(days=10)).strftime('%Y-%m-%d')
+        sleep_on_specific_date = get_metric_for_date(metric_store, specific_date_to_query, 'sleep_duration_hours')
+        print(f"Sleep duration on {specific_date_to_query}: {sleep_on_specific_date} hours")
 
-    # Example: Get a metric for a date that might not exist
-    non_existent_date = (END_DATE + datetime.timedelta(days=5)).strftime('%Y-%m-%d')
-    metric_non_existent = get_metric_for_date(daily_metrics_data, non_existent_date, 'hrv')
-    print(f"HRV on {non_existent_date}: {metric_non_existent}")
+        # Example: Get a metric for a date that might not exist
+        non_existent_date = (END_DATE + datetime.timedelta(days=5)).strftime('%Y-%m-%d')
+        metric_non_existent = get_metric_for_date(metric_store, non_existent_date, 'hrv')
+        print(f"HRV on {non_existent_date}: {metric_non_existent}")
 
     # Validate the generated data
     print("\n--- Data Validation --- ")
-    validation_warnings = validate_generated_data(daily_metrics_data)
-    if validation_warnings:
-        print("Validation Warnings Found:")
-        for warning in validation_warnings:
-            print(f"- {warning}")
-    else:
-        print("All data validation checks passed.")
-
-    # --- Save to JSON ---
-    print(f"\n--- Saving Data to JSON ---")
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        print(f"Created directory: {OUTPUT_DIR}")
-
-    df_to_export = daily_metrics_data.copy()
-
-    # Ensure date is in 'YYYY-MM-DD' string format for JSON
-    if pd.api.types.is_datetime64_any_dtype(df_to_export['date']):
-        df_to_export['date'] = df_to_export['date'].dt.strftime('%Y-%m-%d')
-
-    # Explicitly round float columns to desired precision for consistent JSON output
-    # (though they are already rounded when added to lists, this is a safeguard)
-    df_to_export['sleep_duration_hours'] = df_to_export['sleep_duration_hours'].round(2)
-    df_to_export['sleep_efficiency_percent'] = df_to_export['sleep_efficiency_percent'].round(1)
-    df_to_export['sleep_rem_hours'] = df_to_export['sleep_rem_hours'].round(2)
-    df_to_export['sleep_deep_hours'] = df_to_export['sleep_deep_hours'].round(2)
-    df_to_export['sleep_light_hours'] = df_to_export['sleep_light_hours'].round(2)
-    df_to_export['strain_score'] = df_to_export['strain_score'].round(1)
-    # Integer columns (hrv, rhr, recovery_score_percent) are already integers.
+    with profile_stage('validation'):
+        validation_report = validate_metrics(daily_metrics_data)
+        if not validation_report.ok:
+            print(f"Validation Warnings Found ({validation_report.total_violations} across {validation_report.num_rows} rows):")
+            for rule, count in validation_report.counts.items():
+                if count:
+                    print(f"- {rule}: {count}")
+            for warning in validation_report.messages():
+                print(f"- {warning}")
+        else:
+            print("All data validation checks passed.")
 
-    try:
-        df_to_export.to_json(OUTPUT_FILE_PATH, orient="records", indent=2)
-        print(f"Synthetic data successfully saved to: {OUTPUT_FILE_PATH}")
-    except Exception as e:
-        print(f"Error saving data to JSON: {e}")
+    # --- Save columnar (and optionally JSON) outputs ---
+    print(f"\n--- Saving Data ({', '.join(formats)}) ---")
+    with profile_stage('export'):
+        written = export_dataset(daily_metrics_data, args.output_dir, formats, checkpoint_to_dict(state, rng), calendar)
+    if 'npy' in written:
+        features_dir = features.write_features(written['npy'][0], daily_metrics_data)
+        print(f"Rolling baseline features saved to: {features_dir}")
 
-    # --- Test Loading JSON Data ---
-    print(f"\n--- Testing Loading Saved JSON Data ---")
+    # --- Round-trip check ---
+    print(f"\n--- Verifying Saved Data ---")
+    with profile_stage('read_back'):
+        if not verify_exports(written):
+            print("Error: saved data does not match what was generated.")
+        if 'npy' in written:
+            # Memory-mapped, so only the rows printed here are actually read from disk
+            loaded_store = dataset_io.load_metric_store(written['npy'][0])
+            print(f"Opened {written['npy'][0]} ({loaded_store.num_days} days, {loaded_store.start_date} to {loaded_store.end_date})")
+            print("First 5 rows of loaded data:")
+            first_rows = {'date': loaded_store.start_date + np.arange(5)}
+            first_rows.update({name: values[:5] for name, values in loaded_store.values.items()})
+            print(dataset_io.to_export_frame(first_rows))
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    if args.check_engines:
+        sys.exit(run_engine_check(args))
+    profiler = StageProfiler().start() if args.profile else None
+    cprofiler = cProfile.Profile() if args.cprofile else None
+    if cprofiler is not None:
+        cprofiler.enable()
+    if args.tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
     try:
-        loaded_df = pd.read_json(OUTPUT_FILE_PATH)
-        # Convert date column back to datetime objects if needed for further processing/display
-        # loaded_df['date'] = pd.to_datetime(loaded_df['date'])
-        print(f"Successfully loaded data from {OUTPUT_FILE_PATH}")
-        print("First 5 rows of loaded data:")
-        print(loaded_df.head())
-    except Exception as e:
-        print(f"Error loading data from JSON: {e}")
-
-    # print(f"Sleep Efficiency stats: Mean={daily_metrics_data['sleep_efficiency_percent'].mean():.1f}%, Min={daily_metrics_data['sleep_efficiency_percent'].min()}%, Max={daily_metrics_data['sleep_efficiency_percent'].max()}%" )
+        run_pipeline(args)
+    finally:
+        if cprofiler is not None:
+            cprofiler.disable()
+            cprofiler.dump_stats(args.cprofile)
+            print(f"cProfile stats written to {args.cprofile}")
+        if args.tracemalloc:
+            tracemalloc.take_snapshot().dump(args.tracemalloc)
+            print(f"tracemalloc snapshot written to {args.tracemalloc}")
+        if profiler is not None:
+            profiler.stop()
+            print("\n--- Stage Timing Report ---")
+            print(json.dumps(profiler.report(), indent=2))
+            if args.profile_output:
+                profiler.write_report(args.profile_output)
+                print(f"Timing report written to {args.profile_output}")
+
+if __name__ == "__main__":
+    main()
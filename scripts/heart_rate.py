@@ -0,0 +1,146 @@
+import numpy as np
+
+import dataset_io
+import generate_synthetic_data as gsd
+
+# Minute-level heart rate over one day cycle. A cycle starts at sleep onset (like WHOOP's
+# sleep-to-sleep days): the night's sleep first, then the waking day, with one workout
+# session on workout days.
+MINUTES_PER_DAY = 1440
+MAX_HEART_RATE = 180 # bpm, age-predicted maximum for Executive Alex
+SLEEP_HR_OFFSET = 2 # bpm above RHR while asleep
+SLEEP_HR_STD_DEV = 2
+AWAKE_HR_OFFSET = 18 # bpm above RHR at rest while awake
+AWAKE_HR_STD_DEV = 4
+NOISE_SMOOTHING_MINUTES = 5
+# Everyday activity: a slow-varying level; minutes where it exceeds the threshold add heart rate
+ACTIVITY_SMOOTHING_MINUTES = 15
+ACTIVITY_THRESHOLD = 0.5
+ACTIVITY_HR_GAIN = 20 # bpm per unit of activity above the threshold
+WORKOUT_START_MINUTES_AFTER_WAKE_MEAN = 600
+WORKOUT_START_MINUTES_AFTER_WAKE_STD_DEV = 180
+WORKOUT_DURATION_MINUTES_MEAN = 60
+WORKOUT_DURATION_MINUTES_STD_DEV = 10
+WORKOUT_INTENSITY_MEAN = 0.75 # Fraction of heart-rate reserve
+WORKOUT_INTENSITY_STD_DEV = 0.05
+WORKOUT_HR_STD_DEV = 5
+
+# Strain from cumulative cardiovascular load: each minute adds a Banister TRIMP weight of its
+# heart-rate reserve fraction (minutes below LOAD_HRR_THRESHOLD add nothing), and the day's
+# load saturates towards MAX_STRAIN. The activity, workout and load constants are calibrated so
+# derived strain matches the persona's sampled strain (about 13.5 +/- 1.5 on workout days and
+# 6.5 +/- 1.5 otherwise).
+LOAD_HRR_THRESHOLD = 0.25
+MAX_STRAIN = 21.0
+LOAD_SCALE = 180.0
+
+# Per-day standard normal draws: one per minute, then the workout's start, duration and intensity
+_DRAW_WORKOUT_START = MINUTES_PER_DAY
+_DRAW_WORKOUT_DURATION = MINUTES_PER_DAY + 1
+_DRAW_WORKOUT_INTENSITY = MINUTES_PER_DAY + 2
+HEART_RATE_DRAW_COLUMNS = MINUTES_PER_DAY + 3
+
+DEFAULT_CHUNK_DAYS = 2048 # About 12 MB per (days, minutes) float32 array
+# A two-element spawn key, so the heart-rate stream never coincides with a per-user (user_id,) stream
+HEART_RATE_SPAWN_KEY = (2**32 - 1, 0)
+
+def heart_rate_seed_sequence(seed: int | None) -> np.random.SeedSequence:
+    """Seed sequence for the heart-rate draws of a dataset generated from `seed`."""
+    return np.random.SeedSequence(seed, spawn_key=HEART_RATE_SPAWN_KEY)
+
+def draw_heart_rate_noise(rng: np.random.Generator, num_days: int) -> np.ndarray:
+    """Standard normal draws, one fixed-size row per day, so chunked generation reads the stream identically."""
+    return rng.standard_normal((num_days, HEART_RATE_DRAW_COLUMNS), dtype=np.float32)
+
+def _moving_sum(cumulative: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing moving sum along the minutes axis from the noise's cumulative sum, scaled back to
+    unit variance (white noise summed over n minutes has variance n).
+    """
+    summed = cumulative.copy()
+    summed[:, window:] -= cumulative[:, :-window]
+    return summed / np.sqrt(np.minimum(np.arange(1, cumulative.shape[1] + 1), window), dtype=np.float32)
+
+def simulate_heart_rate(rhr: np.ndarray, sleep_duration_hours: np.ndarray, is_workout_day: np.ndarray,
+                        noise: np.ndarray) -> np.ndarray:
+    """
+    Minute-level heart rate, shape (days, MINUTES_PER_DAY), anchored on each day's RHR:
+    sleep near RHR, then waking rest plus everyday activity, plus a workout on workout days.
+    """
+    rhr = np.asarray(rhr, dtype=np.float32)[:, np.newaxis]
+    minute = np.arange(MINUTES_PER_DAY)
+    wake_minute = np.round(np.asarray(sleep_duration_hours, dtype=np.float64) * 60)[:, np.newaxis]
+    asleep = minute < wake_minute
+
+    cumulative = np.cumsum(noise[:, :MINUTES_PER_DAY], axis=1)
+    jitter = _moving_sum(cumulative, NOISE_SMOOTHING_MINUTES)
+    activity = np.maximum(_moving_sum(cumulative, ACTIVITY_SMOOTHING_MINUTES) - ACTIVITY_THRESHOLD, 0)
+    heart_rate = np.where(asleep,
+                          rhr + SLEEP_HR_OFFSET + SLEEP_HR_STD_DEV * jitter,
+                          rhr + AWAKE_HR_OFFSET + AWAKE_HR_STD_DEV * jitter + ACTIVITY_HR_GAIN * activity)
+
+    start = wake_minute[:, 0] + WORKOUT_START_MINUTES_AFTER_WAKE_MEAN + noise[:, _DRAW_WORKOUT_START] * WORKOUT_START_MINUTES_AFTER_WAKE_STD_DEV
+    duration = np.maximum(WORKOUT_DURATION_MINUTES_MEAN + noise[:, _DRAW_WORKOUT_DURATION] * WORKOUT_DURATION_MINUTES_STD_DEV, 10)
+    start = np.clip(np.round(start), wake_minute[:, 0], MINUTES_PER_DAY - duration)
+    intensity = np.clip(WORKOUT_INTENSITY_MEAN + noise[:, _DRAW_WORKOUT_INTENSITY] * WORKOUT_INTENSITY_STD_DEV, 0.4, 0.95)
+    in_workout = (np.asarray(is_workout_day)[:, np.newaxis] & (minute >= start[:, np.newaxis])
+                  & (minute < (start + duration)[:, np.newaxis]))
+    workout_hr = rhr + intensity[:, np.newaxis].astype(np.float32) * (MAX_HEART_RATE - rhr) + WORKOUT_HR_STD_DEV * jitter
+    heart_rate = np.where(in_workout, workout_hr, heart_rate)
+    return np.clip(heart_rate, rhr - 5, MAX_HEART_RATE)
+
+def cardio_load(heart_rate: np.ndarray, rhr: np.ndarray) -> np.ndarray:
+    """Each day's summed TRIMP load, shape (days,)."""
+    rhr = np.asarray(rhr, dtype=np.float32)[:, np.newaxis]
+    reserve = np.clip((heart_rate - rhr) / (MAX_HEART_RATE - rhr), 0, 1)
+    weight = np.where(reserve > LOAD_HRR_THRESHOLD, reserve * 0.64 * np.exp(1.92 * reserve), 0)
+    return weight.sum(axis=1, dtype=np.float64)
+
+def strain_from_load(load: np.ndarray) -> np.ndarray:
+    return MAX_STRAIN * (1 - np.exp(-np.asarray(load) / LOAD_SCALE))
+
+def weekday_of(dates: np.ndarray) -> np.ndarray:
+    """Monday=0 weekday of datetime64 dates (1970-01-01 was a Thursday)."""
+    return (np.asarray(dates, dtype='datetime64[D]').astype(np.int64) + 3) % 7
+
+def apply_heart_rate_strain(table, rng: np.random.Generator | int | None = None,
+                            chunk_days: int = DEFAULT_CHUNK_DAYS, heart_rate_output: str | None = None) -> dict[str, np.ndarray]:
+    """
+    Replaces a generated table's sampled strain with strain derived from simulated minute-level
+    heart rate, and re-scores recovery against the new previous-day strain. Rows must be
+    user-major and date-ordered, as the generators write them.
+
+    Days are simulated chunk_days at a time, so memory stays bounded however large the table;
+    the result does not depend on chunk_days. With `heart_rate_output` the raw stream is also
+    written as a uint8 'heart_rate' column (MINUTES_PER_DAY values per row) in the .npy layout.
+    Returns a new dict of arrays.
+    """
+    if chunk_days <= 0:
+        raise ValueError("chunk_days must be positive.")
+    rng = np.random.default_rng(rng)
+    result = {name: np.array(table[name]) for name in table.keys()}
+    num_days = len(result['date'])
+    is_workout_day = np.isin(weekday_of(result['date']), gsd.WORKOUT_DAY_INDICES)
+    strain = np.empty(num_days)
+    for first in range(0, num_days, chunk_days):
+        rows = slice(first, min(first + chunk_days, num_days))
+        heart_rate = simulate_heart_rate(result['rhr'][rows], result['sleep_duration_hours'][rows], is_workout_day[rows],
+                                         draw_heart_rate_noise(rng, rows.stop - rows.start))
+        strain[rows] = strain_from_load(cardio_load(heart_rate, result['rhr'][rows]))
+        if heart_rate_output is not None:
+            column = {'heart_rate': np.round(heart_rate).astype(np.uint8).ravel()}
+            if first == 0:
+                dataset_io.write_npy_columns(heart_rate_output, column, {'minutes_per_day': MINUTES_PER_DAY})
+            else:
+                dataset_io.append_npy_columns(heart_rate_output, column)
+
+    result['strain_score'] = np.round(strain, 1)
+    prev_strain = gsd.previous_day_strain(result['strain_score'], result.get('user_id'))
+    recovery = gsd.compute_recovery_scores(result['hrv'], result['rhr'], result['sleep_duration_hours'],
+                                           result['sleep_efficiency_percent'], prev_strain)
+    result['recovery_score_percent'] = np.round(recovery).astype(result['recovery_score_percent'].dtype)
+    return result
+
+def load_heart_rate(directory: str, mmap: bool = True) -> np.ndarray:
+    """Opens a stored stream as (days, MINUTES_PER_DAY) uint8; memory-mapped rows are read on access."""
+    return dataset_io.load_npy_columns(directory, ['heart_rate'], mmap=mmap)['heart_rate'].reshape(-1, MINUTES_PER_DAY)
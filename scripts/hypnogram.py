@@ -0,0 +1,184 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+import dataset_io
+
+# Stage codes, stored as int8 (one byte per 30-second epoch)
+WAKE = 0
+LIGHT = 1
+DEEP = 2
+REM = 3
+STAGE_NAMES = {WAKE: 'wake', LIGHT: 'light', DEEP: 'deep', REM: 'rem'}
+STAGE_DTYPE = np.int8
+
+EPOCH_SECONDS = 30
+EPOCHS_PER_HOUR = 3600 // EPOCH_SECONDS
+
+# Night structure. Sleep runs in cycles of CYCLE_MINUTES_MIN-MAX minutes; each cycle is light sleep,
+# deep, light again, REM and then a (possibly empty) awakening. Deep sleep is front-loaded and
+# REM back-loaded across the night; part of the night's wake time is sleep-onset latency.
+MAX_CYCLES = 8
+CYCLE_MINUTES_MIN = 80
+CYCLE_MINUTES_MAX = 110
+DEEP_DECAY_CYCLES = 1.2 # Deep share falls by 1/e every this many cycles
+SLEEP_ONSET_WAKE_SHARE_MIN = 0.2
+SLEEP_ONSET_WAKE_SHARE_MAX = 0.5
+# Bouts per cycle in order, and the matching stage codes for the whole night's segment layout
+_CYCLE_BOUTS = [LIGHT, DEEP, LIGHT, REM, WAKE]
+_SEGMENT_STAGES = np.array([WAKE] + _CYCLE_BOUTS * MAX_CYCLES, dtype=STAGE_DTYPE)
+
+# Uniform draws per night: cycle length, onset-wake share, then five per cycle
+# (deep, REM and light weights, light split, awakening weight)
+_DRAW_CYCLE_LENGTH = 0
+_DRAW_ONSET_SHARE = 1
+_DRAWS_PER_CYCLE = 5
+HYPNOGRAM_DRAW_COLUMNS = 2 + _DRAWS_PER_CYCLE * MAX_CYCLES
+
+DEFAULT_NIGHTS_PER_CHUNK = 10_000 # About 10 MB of epochs per chunk
+
+def draw_night_noise(rng: np.random.Generator, num_nights: int) -> np.ndarray:
+    """
+    Uniform draws for num_nights, shape (nights, HYPNOGRAM_DRAW_COLUMNS). Each night reads one
+    fixed-size row from the stream, so generating in chunks gives the same nights as one call.
+    """
+    return rng.random((num_nights, HYPNOGRAM_DRAW_COLUMNS))
+
+def to_epochs(hours) -> np.ndarray:
+    return np.round(np.asarray(hours, dtype=np.float64) * EPOCHS_PER_HOUR).astype(np.int64)
+
+def _allocate(totals: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Splits integer totals (nights,) across columns in proportion to weights (nights, k), exactly preserving each total."""
+    cumulative = np.cumsum(weights, axis=1)
+    scale = np.where(cumulative[:, -1:] > 0, cumulative[:, -1:], 1)
+    boundaries = np.round(totals[:, np.newaxis] * cumulative / scale).astype(np.int64)
+    return np.diff(boundaries, axis=1, prepend=0)
+
+def night_segments(sleep_duration_hours, sleep_rem_hours, sleep_deep_hours, sleep_light_hours,
+                   draws: np.ndarray) -> np.ndarray:
+    """
+    Bout lengths in epochs, shape (nights, 1 + 5 * MAX_CYCLES), laid out like _SEGMENT_STAGES.
+
+    Each night's REM, deep and light epochs equal its rounded stage hours exactly and the wake
+    epochs make up the rest of the time in bed, so efficiency matches the daily metrics.
+    """
+    rem, deep, light = to_epochs(sleep_rem_hours), to_epochs(sleep_deep_hours), to_epochs(sleep_light_hours)
+    asleep = rem + deep + light
+    wake = np.maximum(to_epochs(sleep_duration_hours) - asleep, 0)
+
+    cycle_epochs = (CYCLE_MINUTES_MIN + draws[:, _DRAW_CYCLE_LENGTH] * (CYCLE_MINUTES_MAX - CYCLE_MINUTES_MIN)) * 60 // EPOCH_SECONDS
+    num_cycles = np.clip(np.round(asleep / cycle_epochs), 1, MAX_CYCLES).astype(np.int64)
+    cycle = np.arange(MAX_CYCLES)
+    active = cycle < num_cycles[:, np.newaxis]
+    per_cycle = draws[:, 2:].reshape(-1, MAX_CYCLES, _DRAWS_PER_CYCLE)
+
+    jitter = 0.7 + 0.6 * per_cycle[..., :3]
+    deep_cycles = _allocate(deep, active * np.exp(-cycle / DEEP_DECAY_CYCLES) * jitter[..., 0])
+    rem_cycles = _allocate(rem, active * (cycle + 1) * jitter[..., 1])
+    light_cycles = _allocate(light, active * jitter[..., 2])
+    light_first = np.round(light_cycles * (0.3 + 0.4 * per_cycle[..., 3])).astype(np.int64)
+
+    onset_share = SLEEP_ONSET_WAKE_SHARE_MIN + draws[:, _DRAW_ONSET_SHARE] * (SLEEP_ONSET_WAKE_SHARE_MAX - SLEEP_ONSET_WAKE_SHARE_MIN)
+    onset_wake = np.round(wake * onset_share).astype(np.int64)
+    awakenings = _allocate(wake - onset_wake, active * per_cycle[..., 4])
+
+    bouts = np.stack([light_first, deep_cycles, light_cycles - light_first, rem_cycles, awakenings], axis=2)
+    return np.concatenate([onset_wake[:, np.newaxis], bouts.reshape(len(rem), -1)], axis=1)
+
+def generate_hypnograms(table, rng: np.random.Generator | int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Generates 30-second hypnograms for every row (night) of a daily metrics table.
+    Returns (stages, num_epochs): all nights' stage codes concatenated as one int8 array, and
+    each night's epoch count.
+    """
+    rng = np.random.default_rng(rng)
+    segments = night_segments(table['sleep_duration_hours'], table['sleep_rem_hours'],
+                              table['sleep_deep_hours'], table['sleep_light_hours'],
+                              draw_night_noise(rng, len(table['date'])))
+    # One repeat over the flattened bouts builds every night at once
+    stages = np.repeat(np.tile(_SEGMENT_STAGES, len(segments)), segments.ravel())
+    return stages, segments.sum(axis=1)
+
+def iter_hypnogram_chunks(table, rng: np.random.Generator | int | None = None,
+                          nights_per_chunk: int = DEFAULT_NIGHTS_PER_CHUNK):
+    """
+    Yields (nights, stages) per chunk of at most nights_per_chunk nights: `nights` is a dict of
+    arrays (date, user_id when present, num_epochs) and `stages` that chunk's epochs. The result
+    does not depend on nights_per_chunk.
+    """
+    if nights_per_chunk <= 0:
+        raise ValueError("nights_per_chunk must be positive.")
+    rng = np.random.default_rng(rng)
+    num_nights = len(table['date'])
+    for first in range(0, num_nights, nights_per_chunk):
+        rows = slice(first, min(first + nights_per_chunk, num_nights))
+        chunk = {name: np.asarray(table[name])[rows] for name in
+                 ('date', 'user_id', 'sleep_duration_hours', 'sleep_rem_hours', 'sleep_deep_hours', 'sleep_light_hours')
+                 if name in table.keys()}
+        stages, num_epochs = generate_hypnograms(chunk, rng)
+        nights = {name: chunk[name] for name in ('user_id', 'date') if name in chunk}
+        nights['num_epochs'] = num_epochs
+        yield nights, stages
+
+# --- Storage: <directory>/epochs (one int8 'stage' column) and <directory>/nights (one row per night) ---
+def write_hypnograms(directory: str, table, rng: np.random.Generator | int | None = None,
+                     nights_per_chunk: int = DEFAULT_NIGHTS_PER_CHUNK) -> int:
+    """
+    Generates and writes hypnograms chunk by chunk, so memory stays bounded by the chunk size.
+    Both parts use the checksummed .npy layout; each night's 'first_epoch' locates its epochs.
+    Returns the number of epochs written.
+    """
+    epochs_dir, nights_dir = os.path.join(directory, 'epochs'), os.path.join(directory, 'nights')
+    attributes = {'epoch_seconds': EPOCH_SECONDS, 'stages': {str(code): name for code, name in STAGE_NAMES.items()}}
+    total_epochs = 0
+    for index, (nights, stages) in enumerate(iter_hypnogram_chunks(table, rng, nights_per_chunk)):
+        nights['first_epoch'] = total_epochs + np.cumsum(nights['num_epochs']) - nights['num_epochs']
+        if index == 0:
+            dataset_io.write_npy_columns(epochs_dir, {'stage': stages}, attributes)
+            dataset_io.write_npy_columns(nights_dir, nights, attributes)
+        else:
+            dataset_io.append_npy_columns(epochs_dir, {'stage': stages})
+            dataset_io.append_npy_columns(nights_dir, nights)
+        total_epochs += len(stages)
+    return total_epochs
+
+def load_hypnograms(directory: str, mmap: bool = True) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """Opens written hypnograms as (stages, nights); with mmap=True nothing is read until indexed."""
+    stages = dataset_io.load_npy_columns(os.path.join(directory, 'epochs'), mmap=mmap)['stage']
+    return stages, dataset_io.load_npy_columns(os.path.join(directory, 'nights'), mmap=mmap)
+
+def iter_nights(directory: str, user_id: int | None = None):
+    """Streams (date, stages) one night at a time from memory-mapped storage, optionally for one user."""
+    stages, nights = load_hypnograms(directory)
+    rows = np.arange(len(nights['date'])) if user_id is None else np.flatnonzero(nights['user_id'] == user_id)
+    for row in rows.tolist():
+        first = int(nights['first_epoch'][row])
+        yield nights['date'][row], stages[first:first + int(nights['num_epochs'][row])]
+
+def stage_hours(stages: np.ndarray, num_epochs: np.ndarray) -> dict[str, np.ndarray]:
+    """Per-night hours in each stage, counted from the epochs (for checking against the daily totals)."""
+    night = np.repeat(np.arange(len(num_epochs)), num_epochs)
+    counts = np.bincount(night * len(STAGE_NAMES) + stages, minlength=len(num_epochs) * len(STAGE_NAMES))
+    counts = counts.reshape(-1, len(STAGE_NAMES))
+    return {name: counts[:, code] / EPOCHS_PER_HOUR for code, name in STAGE_NAMES.items()}
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate 30-second hypnograms consistent with a dataset's nightly sleep totals.")
+    parser.add_argument('--data', required=True, help="Directory of the .npy daily metrics dataset")
+    parser.add_argument('--output', required=True, help="Directory to write the hypnograms to")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible output (default: fresh entropy)")
+    parser.add_argument('--nights-per-chunk', type=int, default=DEFAULT_NIGHTS_PER_CHUNK,
+                        help=f"Nights generated per chunk (default: {DEFAULT_NIGHTS_PER_CHUNK})")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    table = dataset_io.load_npy_columns(args.data)
+    total_epochs = write_hypnograms(args.output, table, args.seed, args.nights_per_chunk)
+    print(f"Wrote {total_epochs} epochs for {len(table['date'])} nights to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
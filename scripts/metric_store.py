@@ -0,0 +1,158 @@
+import datetime
+
+import numpy as np
+
+def to_day(date) -> np.datetime64:
+    """Converts a 'YYYY-MM-DD' string, date, datetime, pandas Timestamp or datetime64 to datetime64[D]."""
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    elif hasattr(date, 'to_datetime64'): # pandas Timestamp
+        date = date.to_datetime64()
+    return np.datetime64(date, 'D')
+
+class MetricStore:
+    """
+    Day-indexed, read-only view of one user's daily metrics, built once from a generated frame.
+
+    Each metric is a contiguous array indexed by day offset from `start_date` (days missing from
+    the source are NaN), with prefix sums of values and of present-day counts. Point lookups,
+    the latest value and the mean over any date range are O(1); min/max over a range are O(1)
+    after a one-off O(n log n) sparse table built on first use per metric.
+    """
+
+    def __init__(self, start_date, values: dict[str, np.ndarray], present: np.ndarray | None = None):
+        """
+        Wraps per-metric arrays already aligned by day offset from `start_date` (e.g. memory-mapped
+        columns). `present` marks days with data; None means every day is present.
+        """
+        self.start_date = to_day(start_date)
+        self.values = dict(values)
+        num_days = len(next(iter(self.values.values())))
+        if num_days == 0:
+            raise ValueError("MetricStore needs at least one day of data.")
+        self.present = np.ones(num_days, dtype=bool) if present is None else present
+        self.end_date = self.start_date + np.timedelta64(int(np.flatnonzero(self.present)[-1]), 'D')
+        self._count_prefix = np.concatenate([[0], np.cumsum(self.present, dtype=np.int64)])
+        # Built on first use per metric so opening a memory-mapped store stays cheap
+        self._sum_prefixes = {}
+        self._sparse_tables = {}
+
+    @classmethod
+    def from_arrays(cls, dates, columns: dict[str, np.ndarray]) -> "MetricStore":
+        """Builds a store from per-row dates and columns in any order; missing days become NaN."""
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if dates.size == 0:
+            raise ValueError("MetricStore needs at least one day of data.")
+        start_date = dates.min()
+        offsets = (dates - start_date).astype(np.int64)
+        num_days = int(offsets.max()) + 1
+        if num_days == dates.size and bool(np.all(offsets == np.arange(num_days))):
+            return cls(start_date, {name: np.ascontiguousarray(column) for name, column in columns.items()})
+
+        present = np.zeros(num_days, dtype=bool)
+        present[offsets] = True
+        values = {}
+        for name, column in columns.items():
+            column = np.asarray(column)
+            # Gaps need NaN, so missing days promote integer columns to float
+            values[name] = np.full(num_days, np.nan, dtype=np.result_type(column.dtype, np.float64))
+            values[name][offsets] = column
+        return cls(start_date, values, present)
+
+    @classmethod
+    def from_frame(cls, df, metrics: list[str] | None = None) -> "MetricStore":
+        """Builds a store from a DataFrame with a 'date' column; `metrics` defaults to every other column."""
+        metrics = [column for column in df.columns if column != 'date'] if metrics is None else metrics
+        dates = np.asarray(df['date'].to_numpy(), dtype='datetime64[D]')
+        return cls.from_arrays(dates, {name: df[name].to_numpy() for name in metrics})
+
+    @property
+    def metrics(self) -> list[str]:
+        return list(self.values)
+
+    @property
+    def num_days(self) -> int:
+        return len(self.present)
+
+    def __contains__(self, metric_name: str) -> bool:
+        return metric_name in self.values
+
+    def _offset(self, date) -> int:
+        return int((to_day(date) - self.start_date).astype(np.int64))
+
+    def _offset_range(self, start, end) -> tuple[int, int]:
+        """Converts inclusive dates (None = open-ended) to a clamped half-open [first, last) offset range."""
+        first = 0 if start is None else min(max(self._offset(start), 0), self.num_days)
+        last = self.num_days if end is None else min(self._offset(end) + 1, self.num_days)
+        return first, max(first, last)
+
+    def get(self, date, metric_name: str):
+        """Returns the metric on `date`, or None if the day is outside the store or missing."""
+        values = self.values[metric_name]
+        offset = self._offset(date)
+        if 0 <= offset < self.num_days and self.present[offset]:
+            return values[offset]
+        return None
+
+    def latest(self, metric_name: str):
+        """Returns the metric on the most recent day in the store."""
+        return self.values[metric_name][-1]
+
+    def _sum_prefix(self, metric_name: str) -> np.ndarray:
+        prefix = self._sum_prefixes.get(metric_name)
+        if prefix is None:
+            values = self.values[metric_name]
+            if not self.present.all():
+                values = np.where(self.present, values, 0)
+            prefix = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+            self._sum_prefixes[metric_name] = prefix
+        return prefix
+
+    def count(self, start=None, end=None) -> int:
+        """Number of days with data between the inclusive dates."""
+        first, last = self._offset_range(start, end)
+        return int(self._count_prefix[last] - self._count_prefix[first])
+
+    def mean(self, metric_name: str, start=None, end=None) -> float | None:
+        """Mean of the metric between the inclusive dates, or None if there is no data in range."""
+        first, last = self._offset_range(start, end)
+        days = self._count_prefix[last] - self._count_prefix[first]
+        if days == 0:
+            return None
+        prefix = self._sum_prefix(metric_name)
+        return float((prefix[last] - prefix[first]) / days)
+
+    def trailing_mean(self, metric_name: str, n_days: int) -> float | None:
+        """Mean over the last n_days ending at the store's end date (all data if fewer days exist)."""
+        return self.mean(metric_name, self.end_date - np.timedelta64(n_days - 1, 'D'), None)
+
+    def _sparse_table(self, metric_name: str, reducer) -> list[np.ndarray]:
+        key = (metric_name, reducer.__name__)
+        table = self._sparse_tables.get(key)
+        if table is None:
+            fill = np.inf if reducer is np.minimum else -np.inf
+            level = np.where(self.present, self.values[metric_name], fill).astype(np.float64)
+            table = [level]
+            width = 1
+            while 2 * width <= len(level):
+                level = reducer(level[:-width], level[width:])
+                table.append(level)
+                width *= 2
+            self._sparse_tables[key] = table
+        return table
+
+    def _range_reduce(self, metric_name: str, start, end, reducer) -> float | None:
+        first, last = self._offset_range(start, end)
+        if self._count_prefix[last] == self._count_prefix[first]:
+            return None
+        table = self._sparse_table(metric_name, reducer)
+        level = (last - first).bit_length() - 1
+        return float(reducer(table[level][first], table[level][last - (1 << level)]))
+
+    def min(self, metric_name: str, start=None, end=None) -> float | None:
+        """Minimum of the metric between the inclusive dates."""
+        return self._range_reduce(metric_name, start, end, np.minimum)
+
+    def max(self, metric_name: str, start=None, end=None) -> float | None:
+        """Maximum of the metric between the inclusive dates."""
+        return self._range_reduce(metric_name, start, end, np.maximum)
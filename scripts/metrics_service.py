@@ -0,0 +1,357 @@
+import argparse
+import json
+import math
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+import dataset_io
+import generate_synthetic_data as gsd
+from metric_store import MetricStore
+
+# Local read-only query service over generated datasets. Each dataset is loaded once into a
+# MetricStore (memory-mapped for the .npy layout), reloaded when its file changes, and queried
+# through the get_* helpers; rendered responses are cached per dataset version.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_ENTRIES = 4096
+DEFAULT_SUMMARY_DAYS = 14
+
+class QueryError(Exception):
+    """A request the service cannot answer; carries the HTTP status to reply with."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def _source_version(path: str) -> int:
+    """Modification time (ns) of what a dataset is loaded from; the .npy layout changes via its manifest."""
+    if os.path.isdir(path):
+        path = os.path.join(path, dataset_io.MANIFEST_FILENAME)
+    return os.stat(path).st_mtime_ns
+
+def _load_columns(path: str) -> dict[str, np.ndarray]:
+    """Columns of a .npy layout (memory-mapped), a records JSON file or a Parquet file."""
+    if os.path.isdir(path):
+        return dataset_io.load_npy_columns(path)
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    with open(path) as f:
+        records = json.load(f)
+    if not records:
+        raise ValueError(f"{path} has no rows.")
+    return {name: np.array([record[name] for record in records]) for name in records[0]}
+
+class Dataset:
+    """
+    One source file or directory. Single-user data becomes one MetricStore; a population
+    (with a 'user_id' column, rows grouped by user) gets a store per user, built on first query.
+    """
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self._lock = threading.Lock()
+        self.version = None
+        self._load()
+
+    def _load(self) -> None:
+        version = _source_version(self.path)
+        columns = _load_columns(self.path)
+        dates = np.asarray(columns.pop('date'), dtype='datetime64[D]')
+        user_id = columns.pop('user_id', None)
+        stores, user_rows = {}, {}
+        if user_id is None:
+            attributes = dataset_io.read_manifest(self.path)['attributes'] if os.path.isdir(self.path) else {}
+            if attributes.get('contiguous'):
+                stores[None] = MetricStore(attributes['start_date'], columns)
+            else:
+                stores[None] = MetricStore.from_arrays(dates, columns)
+        else:
+            user_id = np.asarray(user_id)
+            starts = np.flatnonzero(np.concatenate([[True], user_id[1:] != user_id[:-1]]))
+            ends = np.append(starts[1:], len(user_id))
+            user_rows = {str(user_id[start]): (start, end) for start, end in zip(starts.tolist(), ends.tolist())}
+        # One tuple swapped in at once, so concurrent readers see either the old or the new data
+        self._state = (columns, dates, user_rows, stores)
+        self.version = version
+
+    def refresh(self) -> bool:
+        """Reloads the data if its source changed since it was loaded; returns True if it did."""
+        try:
+            changed = _source_version(self.path) != self.version
+        except FileNotFoundError:
+            return False # Mid-rewrite or removed: keep serving what is loaded
+        if not changed:
+            return False
+        with self._lock:
+            if _source_version(self.path) != self.version:
+                self._load()
+        return True
+
+    @property
+    def users(self) -> list[str]:
+        user_rows = self._state[2]
+        return [self.name] if not user_rows else [f"{self.name}/{user}" for user in user_rows]
+
+    def store(self, user: str | None) -> MetricStore:
+        columns, dates, user_rows, stores = self._state
+        if not user_rows:
+            if user is not None:
+                raise QueryError(404, f"Dataset '{self.name}' has a single user.")
+            return stores[None]
+        if user is None:
+            raise QueryError(404, f"Dataset '{self.name}' has several users; query '{self.name}/<user_id>'.")
+        store = stores.get(user)
+        if store is None:
+            if user not in user_rows:
+                raise QueryError(404, f"Unknown user '{user}' in dataset '{self.name}'.")
+            start, end = user_rows[user]
+            store = MetricStore.from_arrays(dates[start:end], {name: values[start:end] for name, values in columns.items()})
+            stores[user] = store
+        return store
+
+def _json_value(value):
+    """Plain JSON value for a NumPy scalar; NaN (a missing day) becomes null."""
+    if value is None:
+        return None
+    if isinstance(value, np.datetime64):
+        return str(value)
+    value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def _metric_value(metric: str, value):
+    """
+    A stored metric value as JSON in its generated type: integer metrics come back as ints (range
+    reductions and gap-filled stores work in float) and float metrics are rounded back to their
+    generated precision (float32 columns carry noise digits).
+    """
+    value = _json_value(value)
+    if isinstance(value, float):
+        if np.issubdtype(dataset_io.COLUMN_DTYPES.get(metric, np.float64), np.integer):
+            return int(value)
+        if metric in dataset_io.EXPORT_DECIMALS:
+            return round(value, dataset_io.EXPORT_DECIMALS[metric])
+    return value
+
+class MetricsService:
+    """Answers queries against registered datasets, with an LRU cache of rendered responses."""
+
+    def __init__(self, datasets: dict[str, str], cache_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.datasets = {name: Dataset(name, path) for name, path in datasets.items()}
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _resolve(self, user_key: str) -> tuple[Dataset, str | None]:
+        name, _, user = user_key.partition('/')
+        dataset = self.datasets.get(name)
+        if dataset is None:
+            raise QueryError(404, f"Unknown dataset '{name}'.")
+        return dataset, user or None
+
+    def handle(self, path: str, query: dict[str, str]) -> bytes:
+        """Returns the JSON response body for a request path and its query parameters."""
+        parts = [unquote(part) for part in path.strip('/').split('/') if part]
+        if parts == ['health']:
+            return self._render(self.health())
+        if parts == ['users']:
+            return self._render({'users': [user for dataset in self.datasets.values() for user in dataset.users]})
+        if len(parts) < 3 or parts[0] != 'users':
+            raise QueryError(404, f"Unknown path '{path}'.")
+        # Dataset names cannot contain '/', so a population user is users/<dataset>/<user_id>/<query>
+        user_key, action = '/'.join(parts[1:-1]), parts[-1]
+        dataset, user = self._resolve(user_key)
+        dataset.refresh()
+        key = (user_key, dataset.version, action, tuple(sorted(query.items())))
+        with self._cache_lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return body
+            self.cache_misses += 1
+        body = self._render(self._answer(dataset.store(user), action, query))
+        with self._cache_lock:
+            self._cache[key] = body
+            if len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return body
+
+    @staticmethod
+    def _render(payload: dict) -> bytes:
+        return json.dumps(payload).encode('utf-8')
+
+    @staticmethod
+    def _metric(store: MetricStore, query: dict[str, str]) -> str:
+        metric = query.get('metric')
+        if metric is None:
+            raise QueryError(400, "Missing 'metric' parameter.")
+        if metric not in store:
+            raise QueryError(404, f"Unknown metric '{metric}'.")
+        return metric
+
+    @staticmethod
+    def _days(query: dict[str, str], default: int | None = None) -> int:
+        try:
+            days = int(query['days']) if 'days' in query else default
+        except ValueError:
+            raise QueryError(400, "'days' must be an integer.") from None
+        if days is None or days <= 0:
+            raise QueryError(400, "'days' must be a positive integer.")
+        return days
+
+    def _answer(self, store: MetricStore, action: str, query: dict[str, str]) -> dict:
+        try:
+            if action == 'point':
+                metric, date = self._metric(store, query), query.get('date')
+                if date is None:
+                    raise QueryError(400, "Missing 'date' parameter.")
+                return {'metric': metric, 'date': date, 'value': _metric_value(metric, gsd.get_metric_for_date(store, date, metric))}
+            if action == 'latest':
+                date = str(store.end_date)
+                return {'date': date, 'metrics': {name: _metric_value(name, store.get(date, name)) for name in store.metrics}}
+            if action == 'window':
+                metric = self._metric(store, query)
+                if 'start' in query or 'end' in query:
+                    start, end = query.get('start'), query.get('end')
+                    mean = store.mean(metric, start, end)
+                else:
+                    days = self._days(query)
+                    start, end = str(store.end_date - np.timedelta64(days - 1, 'D')), None
+                    mean = gsd.get_last_n_days_average(store, metric, days)
+                return {'metric': metric, 'start': start or str(store.start_date), 'end': end or str(store.end_date),
+                        'days': store.count(start, end), 'mean': _json_value(mean),
+                        'min': _metric_value(metric, store.min(metric, start, end)), 'max': _metric_value(metric, store.max(metric, start, end))}
+            if action == 'summary':
+                days = self._days(query, DEFAULT_SUMMARY_DAYS)
+                first = max(store.num_days - days, 0)
+                recent = [{'date': str(store.start_date + np.timedelta64(offset, 'D')),
+                           **{name: _metric_value(name, values[offset]) for name, values in store.values.items()}}
+                          for offset in range(store.num_days - 1, first - 1, -1) if store.present[offset]]
+                return {'latest': recent[0] if recent else None,
+                        'averages': {name: _json_value(gsd.get_last_n_days_average(store, name, days)) for name in store.metrics},
+                        'days': recent}
+        except ValueError as e: # Unparseable dates
+            raise QueryError(400, str(e)) from None
+        raise QueryError(404, f"Unknown query '{action}'; expected point, latest, window or summary.")
+
+    def health(self) -> dict:
+        return {'datasets': {name: {'path': dataset.path, 'version': dataset.version} for name, dataset in self.datasets.items()},
+                'cache': {'entries': len(self._cache), 'hits': self.cache_hits, 'misses': self.cache_misses}}
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    server_version = "MetricsService/1.0"
+    quiet = True
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            status, body = 200, self.server.service.handle(url.path, query)
+        except QueryError as e:
+            status, body = e.status, json.dumps({'error': str(e)}).encode('utf-8')
+        except Exception as e: # A bug answering one query still gets a reply
+            traceback.print_exc()
+            status, body = 500, json.dumps({'error': f"Internal error: {type(e).__name__}: {e}"}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Unix-socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format: str, *args) -> None:
+        if not self.quiet:
+            super().log_message(format, *args)
+
+class UnixThreadingHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self) -> None:
+        socketserver.TCPServer.server_bind(self) # HTTPServer.server_bind expects a (host, port) address
+        self.server_name, self.server_port = 'localhost', 0
+
+def make_server(service: MetricsService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                unix_socket: str | None = None) -> ThreadingHTTPServer:
+    """Builds a threaded HTTP server for `service` on host:port, or on a Unix socket path."""
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = UnixThreadingHTTPServer(unix_socket, MetricsRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+def discover_datasets(directory: str) -> dict[str, str]:
+    """Datasets in a directory: every .npy layout subdirectory and every .json / .parquet file, named by stem."""
+    datasets = {}
+    for entry in sorted(os.listdir(directory)):
+        path = os.path.join(directory, entry)
+        stem, extension = os.path.splitext(entry)
+        if os.path.isdir(path) and os.path.exists(os.path.join(path, dataset_io.MANIFEST_FILENAME)):
+            datasets[entry] = path
+        elif extension in ('.json', '.parquet') and stem not in datasets:
+            datasets[stem] = path
+    return datasets
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve point, window and summary queries over generated datasets.")
+    parser.add_argument('--data', action='append', default=[], metavar='NAME=PATH',
+                        help="Dataset to serve (.npy directory, .json or .parquet file); repeatable")
+    parser.add_argument('--data-dir', default=None, help="Serve every dataset found in this directory")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument('--unix-socket', default=None, metavar='PATH', help="Listen on a Unix socket instead of TCP")
+    parser.add_argument('--cache-entries', type=int, default=DEFAULT_CACHE_ENTRIES,
+                        help=f"Cached responses kept (default: {DEFAULT_CACHE_ENTRIES})")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    datasets = discover_datasets(args.data_dir) if args.data_dir else {}
+    for spec in args.data:
+        name, _, path = spec.partition('=')
+        if not path or '/' in name:
+            print(f"Error: expected NAME=PATH with no '/' in NAME, got '{spec}'.", file=sys.stderr)
+            return 2
+        datasets[name] = path
+    if not datasets:
+        print("Error: no datasets given; use --data NAME=PATH or --data-dir.", file=sys.stderr)
+        return 2
+    MetricsRequestHandler.quiet = not args.verbose
+    server = make_server(MetricsService(datasets, args.cache_entries), args.host, args.port, args.unix_socket)
+    where = args.unix_socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving {len(datasets)} dataset(s) on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
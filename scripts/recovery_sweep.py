@@ -0,0 +1,185 @@
+import argparse
+import datetime
+import sys
+
+import numpy as np
+
+import dataset_io
+import generate_synthetic_data as gsd
+
+# WHOOP recovery zones on the rounded score
+RECOVERY_GREEN_MIN = 67
+RECOVERY_RED_MAX = 33
+# Budget for the (weight sets, rows) temporaries of one broadcast block.
+DEFAULT_BLOCK_BYTES = 4 * 2**20 # Small enough to stay cache-resident, large enough to amortize the per-block calls
+_BLOCK_TEMPORARIES = 6
+_SLEEP_QUALITY_WEIGHTS = ('sleep_duration_in_quality', 'sleep_efficiency_in_quality')
+
+def parameter_grid(weights: dict[str, list] | None = None, bounds: dict[str, list[tuple]] | None = None) -> dict[str, np.ndarray]:
+    """
+    Cartesian product of the given weight values and normalization bounds, as a flat table of
+    parameter sets: '<name>_weight' columns of shape (sets,) for every RECOVERY_WEIGHTS entry
+    and '<component>_bounds' columns of shape (sets, 2) for every normalization bound. Anything
+    not given is held at the generator's value.
+    """
+    weights = {name: list(values) for name, values in (weights or {}).items()}
+    bounds = {name: [tuple(pair) for pair in values] for name, values in (bounds or {}).items()}
+    unknown = (set(weights) - set(gsd.RECOVERY_WEIGHTS)) | (set(bounds) - set(gsd.RECOVERY_NORMALIZATION_BOUNDS))
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(sorted(unknown))}.")
+    axes = [weights.get(name, [value]) for name, value in gsd.RECOVERY_WEIGHTS.items()]
+    axes += [bounds.get(name, [pair]) for name, pair in gsd.RECOVERY_NORMALIZATION_BOUNDS.items()]
+    # Index grid rather than itertools.product over values, so building a large grid stays vectorized
+    index = np.indices([len(axis) for axis in axes]).reshape(len(axes), -1)
+    grid = {}
+    for position, name in enumerate(gsd.RECOVERY_WEIGHTS):
+        grid[f"{name}_weight"] = np.asarray(axes[position], dtype=float)[index[position]]
+    for offset, name in enumerate(gsd.RECOVERY_NORMALIZATION_BOUNDS):
+        position = len(gsd.RECOVERY_WEIGHTS) + offset
+        grid[f"{name}_bounds"] = np.asarray(axes[position], dtype=float).reshape(-1, 2)[index[position]]
+    return grid
+
+def grid_size(grid: dict[str, np.ndarray]) -> int:
+    return len(next(iter(grid.values())))
+
+class RecoverySweep:
+    """
+    Re-scores recovery for a fixed set of days under many weight and normalization settings.
+
+    The raw HRV, RHR, sleep and previous-day strain inputs are kept once; each component is
+    normalized once per distinct bound pair and cached, so a sweep only pays for the weighting,
+    which is broadcast over a block of parameter sets at a time. With the generator's
+    parameters the scores match the generated recovery_score_percent exactly.
+    """
+
+    def __init__(self, hrv: np.ndarray, rhr: np.ndarray, sleep_duration_hours: np.ndarray,
+                 sleep_efficiency_percent: np.ndarray, prev_strain: np.ndarray):
+        self.raw = {
+            'hrv': np.asarray(hrv, dtype=float).ravel(),
+            'rhr': np.asarray(rhr, dtype=float).ravel(),
+            'sleep_duration': np.asarray(sleep_duration_hours, dtype=float).ravel(),
+            'sleep_efficiency': np.asarray(sleep_efficiency_percent, dtype=float).ravel(),
+            'prev_strain': np.asarray(prev_strain, dtype=float).ravel(),
+        }
+        self.num_rows = len(self.raw['hrv'])
+        self._normalized = {}
+        self.reference = np.round(self.score())
+
+    @classmethod
+    def from_table(cls, table) -> "RecoverySweep":
+        """
+        Builds a sweep from generated data (DataFrame, dict of arrays or a loaded .npy layout).
+        Each user's first day gets ASSUMED_PREV_DAY_STRAIN_FOR_DAY_0 as previous strain, so rows
+        must be grouped by user and in date order, as the generators write them.
+        """
+        prev_strain = gsd.previous_day_strain(table['strain_score'], table['user_id'] if 'user_id' in table.keys() else None)
+        return cls(table['hrv'], table['rhr'], table['sleep_duration_hours'], table['sleep_efficiency_percent'], prev_strain)
+
+    def component(self, name: str, low: float, high: float) -> np.ndarray:
+        """Normalized component for one bound pair, computed on first use."""
+        key = (name, float(low), float(high))
+        if key not in self._normalized:
+            self._normalized[key] = gsd.normalize_recovery_component(name, self.raw[name], low, high)
+        return self._normalized[key]
+
+    def score(self, weights: dict | None = None, bounds: dict[str, tuple] | None = None) -> np.ndarray:
+        """Unrounded recovery scores for one parameter set (unspecified values use the generator's)."""
+        bounds = {**gsd.RECOVERY_NORMALIZATION_BOUNDS, **(bounds or {})}
+        components = {name: self.component(name, *bounds[name]) for name in self.raw}
+        return gsd.score_recovery_components(components, weights)
+
+    def sweep(self, grid: dict[str, np.ndarray], block_bytes: int = DEFAULT_BLOCK_BYTES) -> dict[str, np.ndarray]:
+        """
+        Scores every parameter set in `grid` (see parameter_grid) and summarizes each one over
+        all rows: mean and std of the rounded score, the shares of green and red days, and the
+        mean absolute change and share of days changed against the generator's own scores.
+        Returns the grid columns plus one array per statistic, shape (sets,).
+        """
+        num_sets = grid_size(grid)
+        block = max(1, block_bytes // (max(self.num_rows, 1) * 8 * _BLOCK_TEMPORARIES))
+        stats = {name: np.empty(num_sets) for name in
+                 ('mean', 'std', 'green_share', 'red_share', 'mean_abs_change', 'changed_share')}
+        # Sets sharing all normalization bounds and sleep-quality sub-weights share the cached
+        # components and the sleep quality score, so only the four top-level weights broadcast
+        shared = [f"{name}_bounds" for name in self.raw] + [f"{name}_weight" for name in _SLEEP_QUALITY_WEIGHTS]
+        keys = np.concatenate([grid[name].reshape(num_sets, -1) for name in shared], axis=1)
+        unique_keys, group = np.unique(keys, axis=0, return_inverse=True)
+        group = group.ravel()
+        for group_index, key in enumerate(unique_keys.tolist()):
+            components = {name: self.component(name, *key[2 * position:2 * position + 2]) for position, name in enumerate(self.raw)}
+            sub_weights = dict(zip(_SLEEP_QUALITY_WEIGHTS, key[2 * len(self.raw):]))
+            members = np.flatnonzero(group == group_index)
+            for first in range(0, len(members), block):
+                sets = members[first:first + block]
+                weights = {name: grid[f"{name}_weight"][sets, np.newaxis] for name in gsd.RECOVERY_WEIGHTS
+                           if name not in sub_weights}
+                weights.update(sub_weights)
+                scores = np.round(gsd.score_recovery_components(components, weights))
+                scores = np.broadcast_to(scores, (len(sets), self.num_rows))
+                stats['mean'][sets] = scores.mean(axis=1)
+                stats['std'][sets] = scores.std(axis=1)
+                stats['green_share'][sets] = (scores >= RECOVERY_GREEN_MIN).mean(axis=1)
+                stats['red_share'][sets] = (scores <= RECOVERY_RED_MAX).mean(axis=1)
+                change = np.abs(scores - self.reference)
+                stats['mean_abs_change'][sets] = change.mean(axis=1)
+                stats['changed_share'][sets] = (change > 0).mean(axis=1)
+        return {**grid, **stats}
+
+def _parse_axis(spec: str, bounds: bool) -> tuple[str, list]:
+    """Parses 'name=v1,v2' (weights) or 'name=lo:hi,lo:hi' (bounds)."""
+    name, _, values = spec.partition('=')
+    if not values:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUES, got '{spec}'.")
+    if bounds:
+        return name, [tuple(float(part) for part in value.split(':')) for value in values.split(',')]
+    return name, [float(value) for value in values.split(',')]
+
+def write_sweep_csv(f, results: dict[str, np.ndarray], order: np.ndarray) -> None:
+    """Writes one row per parameter set, bounds split into _min/_max columns."""
+    columns = {}
+    for name, values in results.items():
+        if name.endswith('_bounds'):
+            columns[name[:-len('_bounds')] + '_min'] = values[:, 0]
+            columns[name[:-len('_bounds')] + '_max'] = values[:, 1]
+        else:
+            columns[name] = values
+    print(','.join(columns), file=f)
+    for index in order.tolist():
+        print(','.join(f"{values[index]:.6g}" for values in columns.values()), file=f)
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Re-score recovery over a grid of weights and normalization bounds without regenerating data.")
+    parser.add_argument('--data', default=None, help="Directory of a .npy dataset to score (default: generate a population)")
+    parser.add_argument('--users', type=int, default=100, help="Users to generate when --data is not given (default: 100)")
+    parser.add_argument('--days', type=int, default=gsd.NUM_DAYS, help=f"Days to generate when --data is not given (default: {gsd.NUM_DAYS})")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--weight', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help=f"Weight values to sweep; NAME is one of {', '.join(gsd.RECOVERY_WEIGHTS)}")
+    parser.add_argument('--bounds', action='append', default=[], metavar='NAME=LO:HI,...',
+                        help=f"Normalization bounds to sweep; NAME is one of {', '.join(gsd.RECOVERY_NORMALIZATION_BOUNDS)}")
+    parser.add_argument('--sort', default='mean_abs_change', help="Statistic to sort the output by (default: mean_abs_change)")
+    parser.add_argument('--output', default=None, help="CSV file for the results (default: stdout)")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.data:
+        table = dataset_io.load_npy_columns(args.data)
+    else:
+        from generate_population import generate_population
+        start_date = gsd.END_DATE - datetime.timedelta(days=args.days - 1)
+        table = generate_population(args.users, args.days, start_date, args.seed)
+    grid = parameter_grid(dict(_parse_axis(spec, False) for spec in args.weight),
+                          dict(_parse_axis(spec, True) for spec in args.bounds))
+    results = RecoverySweep.from_table(table).sweep(grid)
+    order = np.argsort(results[args.sort], kind='stable')
+    if args.output:
+        with open(args.output, 'w') as f:
+            write_sweep_csv(f, results, order)
+        print(f"{grid_size(grid)} parameter sets written to {args.output}")
+    else:
+        write_sweep_csv(sys.stdout, results, order)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import generate_synthetic_data as gsd
+
+# Runs the AI coach evaluation suite concurrently against a chat endpoint.
+#
+# Cases live under 'evaluation_cases' in the suite file. Each case is a dict with:
+#   case_id                   identifier (default: its position)
+#   user_prompt / prompt      the user's message
+#   ideal_response            reference answer, scored by token overlap (optional)
+#   expected_keywords         terms a good answer mentions (optional)
+#   forbidden_keywords        terms a good answer must not contain (optional)
+#   persona_context_snapshot  how to build the context (optional): 'seed', 'num_days' and
+#                             'end_date' select the generated history, 'metric_overrides'
+#                             replaces values on the latest day, and 'notes' is appended as text
+# The endpoint receives POST {"message": ..., "context": ...} and replies {"reply": ...,
+# "contextSource": "request"}; a reply without that flag means the endpoint ignored the case's
+# context (an older chat function builds its own from the bundled data), which the summary reports.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SUITE_PATH = os.path.join(REPO_ROOT, 'evaluations', 'ai_coach_evaluations.json')
+DEFAULT_PROFILE_PATH = os.path.join(REPO_ROOT, 'netlify', 'functions', 'data', 'persona_profile.json')
+DEFAULT_ENDPOINT = 'http://127.0.0.1:8888/api/chat' # netlify dev
+DEFAULT_CONCURRENCY = 16
+DEFAULT_RETRIES = 2
+DEFAULT_TIMEOUT_SECONDS = 60.0
+RETRY_BACKOFF_SECONDS = 0.5 # Doubled after each failed attempt
+TREND_DAYS = 14
+KEYWORD_PASS_THRESHOLD = 0.6 # Share of expected keywords a passing reply must mention
+STUB_LATENCY_SECONDS = 0.2
+# 5xx replies that no retry can fix, such as the chat function's missing OpenAI API key
+NON_RETRYABLE_ERRORS = ('not configured',)
+
+class EndpointError(Exception):
+    """A failed chat request; `retryable` marks transport errors and 5xx replies other than configuration errors."""
+
+    def __init__(self, message: str, retryable: bool):
+        super().__init__(message)
+        self.retryable = retryable
+
+# --- Persona context ---
+def load_persona_profile(path: str = DEFAULT_PROFILE_PATH) -> dict | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def build_context(snapshot: dict, profile: dict | None, default_seed: int) -> str:
+    """
+    Generates the case's metric history and formats it the way the chat function does:
+    today's metrics, the last TREND_DAYS days and the persona profile.
+    """
+    num_days = int(snapshot.get('num_days', gsd.NUM_DAYS))
+    end_date = datetime.date.fromisoformat(snapshot['end_date']) if 'end_date' in snapshot else gsd.END_DATE
+    start_date = end_date - datetime.timedelta(days=num_days - 1)
+    arrays = gsd.generate_daily_arrays(num_days, start_date, rng=snapshot.get('seed', default_seed))
+    dates = np.datetime_as_string(arrays.pop('date'), unit='D').tolist()
+    rows = [dict(zip(arrays, values), date=date) for date, values in zip(dates, zip(*(values.tolist() for values in arrays.values())))]
+    rows[-1].update(snapshot.get('metric_overrides', {}))
+
+    context = f"Today's Date: {end_date.isoformat()}\n\n## Current Metrics (Today's Snapshot):\n"
+    context += json.dumps(rows[-1], indent=2)
+    context += f"\n\n## Recent Trends (Summary of last {TREND_DAYS} days):\nLast {TREND_DAYS} days of WHOOP data:\n"
+    for day in reversed(rows[-TREND_DAYS:]):
+        context += (f"Date: {day['date']}, HRV: {day['hrv']}ms, Recovery: {day['recovery_score_percent']}%, "
+                    f"RHR: {day['rhr']}bpm, Sleep Efficiency: {day['sleep_efficiency_percent']}%, Sleep Dur: {day['sleep_duration_hours']}h\n")
+    context += "\n## My Persona Profile (Goals, Baselines, Lifestyle):\n"
+    context += json.dumps(profile, indent=2) if profile else "No persona profile available.\n"
+    if snapshot.get('notes'):
+        context += f"\n\n## Notes:\n{snapshot['notes']}"
+    return context
+
+# --- Endpoints ---
+class HttpChatEndpoint:
+    """POSTs JSON to an http:// chat URL over asyncio streams (one connection per request)."""
+
+    def __init__(self, url: str, timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        parts = urlsplit(url)
+        if parts.scheme != 'http':
+            raise ValueError(f"Only http:// endpoints are supported, got '{url}'.")
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.path = parts.path or '/'
+        self.timeout = timeout
+
+    async def send(self, message: str, context: str) -> tuple[str, bool]:
+        """Returns (reply, whether the endpoint says it used the given context)."""
+        try:
+            return await asyncio.wait_for(self._post({'message': message, 'context': context}), self.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            raise EndpointError(f"{type(e).__name__}: {e}", retryable=True) from e
+
+    async def _post(self, payload: dict) -> tuple[str, bool]:
+        body = json.dumps(payload).encode('utf-8')
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write((f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode('latin-1') + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = None
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            response = await (reader.readexactly(length) if length is not None else reader.read())
+        finally:
+            writer.close()
+        if status != 200:
+            text = response[:200].decode('utf-8', 'replace')
+            retryable = status >= 500 and not any(error in text for error in NON_RETRYABLE_ERRORS)
+            raise EndpointError(f"HTTP {status}: {text}", retryable=retryable)
+        try:
+            reply = json.loads(response)
+            return reply['reply'], reply.get('contextSource') == 'request'
+        except (ValueError, TypeError, KeyError) as e: # Not JSON, not an object, or no 'reply'
+            raise EndpointError(f"Malformed reply ({type(e).__name__}): {response[:200].decode('utf-8', 'replace')}",
+                                retryable=False) from e
+
+class StubChatServer:
+    """
+    Offline stand-in for the chat endpoint: answers POST requests after STUB_LATENCY_SECONDS
+    with a reply built from the question and the context's current metrics.
+    """
+
+    def __init__(self, latency: float = STUB_LATENCY_SECONDS):
+        self.latency = latency
+        self.url = None
+        self._server = None
+
+    async def start(self) -> "StubChatServer":
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        self.url = f"http://{host}:{port}/api/chat"
+        return self
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readline()
+            length = 0
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            request = json.loads(await reader.readexactly(length))
+            await asyncio.sleep(self.latency)
+            body = json.dumps({'reply': self.reply(request['message'], request.get('context', '')),
+                               'contextSource': 'request'}).encode('utf-8')
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    @staticmethod
+    def reply(message: str, context: str) -> str:
+        metrics = {}
+        match = re.search(r"## Current Metrics.*?\n(\{.*?\n\})", context, re.S)
+        if match:
+            metrics = json.loads(match.group(1))
+        return (f"(stub) You asked: {message} Today your recovery is {metrics.get('recovery_score_percent', 'unknown')}%, "
+                f"HRV {metrics.get('hrv', 'unknown')} ms and sleep {metrics.get('sleep_duration_hours', 'unknown')} hours.")
+
+# --- Scoring ---
+def _tokens(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+def score_reply(case: dict, reply: str) -> dict:
+    """Keyword coverage, forbidden-term hits and token-overlap F1 against the ideal response."""
+    text = reply.lower()
+    expected = case.get('expected_keywords', [])
+    forbidden = case.get('forbidden_keywords', [])
+    found = [keyword for keyword in expected if keyword.lower() in text]
+    violations = [keyword for keyword in forbidden if keyword.lower() in text]
+    scores = {'keyword_coverage': len(found) / len(expected) if expected else None,
+              'missing_keywords': [keyword for keyword in expected if keyword not in found],
+              'forbidden_hits': violations}
+    if case.get('ideal_response'):
+        reply_tokens, ideal_tokens = set(_tokens(reply)), set(_tokens(case['ideal_response']))
+        overlap = len(reply_tokens & ideal_tokens)
+        precision = overlap / len(reply_tokens) if reply_tokens else 0.0
+        recall = overlap / len(ideal_tokens) if ideal_tokens else 0.0
+        scores['ideal_f1'] = 2 * precision * recall / (precision + recall) if overlap else 0.0
+    scores['passed'] = not violations and (scores['keyword_coverage'] is None or scores['keyword_coverage'] >= KEYWORD_PASS_THRESHOLD)
+    return scores
+
+# --- Runner ---
+@dataclass
+class CaseResult:
+    case_id: str
+    ok: bool
+    attempts: int
+    latency_s: float | None # Successful attempt only
+    total_s: float # Including failed attempts and backoff
+    reply: str | None = None
+    context_used: bool | None = None # Whether the endpoint answered from the case's context
+    error: str | None = None
+    scores: dict = field(default_factory=dict)
+
+async def run_case(endpoint, case: dict, context: str, semaphore: asyncio.Semaphore, retries: int) -> CaseResult:
+    case_id = str(case['case_id'])
+    started = time.perf_counter()
+    error = None
+    async with semaphore:
+        for attempt in range(1, retries + 2):
+            attempt_started = time.perf_counter()
+            try:
+                reply, context_used = await endpoint.send(case.get('user_prompt', case.get('prompt', '')), context)
+            except EndpointError as e:
+                error = str(e)
+                if not e.retryable or attempt > retries:
+                    return CaseResult(case_id, False, attempt, None, time.perf_counter() - started, error=error)
+                await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                continue
+            latency = time.perf_counter() - attempt_started
+            return CaseResult(case_id, True, attempt, latency, time.perf_counter() - started, reply=reply,
+                              context_used=context_used, scores=score_reply(case, reply))
+
+async def run_suite(cases: list[dict], endpoint, concurrency: int = DEFAULT_CONCURRENCY, retries: int = DEFAULT_RETRIES,
+                    profile: dict | None = None) -> dict:
+    """
+    Builds every case's context, dispatches all cases at once (at most `concurrency` in flight)
+    and returns the per-case results with throughput, latency percentiles and pass counts.
+    """
+    cases = [{'case_id': index, **case} for index, case in enumerate(cases)]
+    contexts = [build_context(case.get('persona_context_snapshot', {}), profile, index) for index, case in enumerate(cases)]
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_case(endpoint, case, context, semaphore, retries) for case, context in zip(cases, contexts)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([result.latency_s for result in results if result.ok])
+    summary = {
+        'cases': len(results),
+        'succeeded': sum(result.ok for result in results),
+        'passed': sum(result.ok and result.scores['passed'] for result in results),
+        'wall_time_s': elapsed,
+        'throughput_cases_per_s': len(results) / elapsed if elapsed > 0 else None,
+        'latency_p50_s': float(np.percentile(latencies, 50)) if latencies.size else None,
+        'latency_p95_s': float(np.percentile(latencies, 95)) if latencies.size else None,
+        'retries': sum(result.attempts - 1 for result in results),
+        'context_ignored': sum(result.ok and not result.context_used for result in results),
+    }
+    return {'summary': summary, 'results': [result.__dict__ for result in results]}
+
+def load_cases(path: str) -> list[dict]:
+    with open(path) as f:
+        return json.load(f).get('evaluation_cases', [])
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the AI coach evaluation suite concurrently against a chat endpoint.")
+    parser.add_argument('--suite', default=DEFAULT_SUITE_PATH, help="Evaluation suite JSON (default: evaluations/ai_coach_evaluations.json)")
+    parser.add_argument('--endpoint', default=DEFAULT_ENDPOINT, help=f"Chat endpoint URL (default: {DEFAULT_ENDPOINT})")
+    parser.add_argument('--stub', action='store_true', help="Start the bundled stub server and run against it (offline)")
+    parser.add_argument('--stub-latency', type=float, default=STUB_LATENCY_SECONDS, help="Stub reply delay in seconds")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help=f"Cases in flight at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help=f"Retries per case on transport errors and transient 5xx (default: {DEFAULT_RETRIES})")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS, help="Per-request timeout in seconds")
+    parser.add_argument('--output', default=None, help="Write the full results as JSON to this file")
+    return parser.parse_args(argv)
+
+async def _main(args: argparse.Namespace) -> dict:
+    cases = load_cases(args.suite)
+    stub = await StubChatServer(args.stub_latency).start() if args.stub else None
+    try:
+        endpoint = HttpChatEndpoint(stub.url if stub else args.endpoint, args.timeout)
+        return await run_suite(cases, endpoint, args.concurrency, args.retries, load_persona_profile())
+    finally:
+        if stub is not None:
+            await stub.stop()
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(_main(args))
+    summary = report['summary']
+    for result in report['results']:
+        status = 'PASS' if result['ok'] and result['scores']['passed'] else 'FAIL'
+        latency = f"{result['latency_s'] * 1000:.0f} ms" if result['latency_s'] is not None else result['error']
+        print(f"{status} {result['case_id']}: {latency} ({result['attempts']} attempt(s))")
+    print(f"{summary['passed']}/{summary['cases']} passed, {summary['succeeded']} answered in {summary['wall_time_s']:.2f}s")
+    if summary['latency_p50_s'] is not None:
+        print(f"Throughput {summary['throughput_cases_per_s']:.1f} cases/s, latency p50 {summary['latency_p50_s'] * 1000:.0f} ms, "
+              f"p95 {summary['latency_p95_s'] * 1000:.0f} ms, {summary['retries']} retries")
+    if summary['context_ignored']:
+        print(f"Warning: the endpoint ignored the case context in {summary['context_ignored']} answered case(s); "
+              "their replies are about its bundled persona data, not the case's snapshot")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0 if summary['passed'] == summary['cases'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
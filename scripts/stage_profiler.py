@@ -0,0 +1,65 @@
+import contextlib
+import json
+import time
+import tracemalloc
+
+# Shared no-op context returned by stage() while profiling is disabled, so an
+# instrumented stage costs one global lookup and nothing else.
+_NULL_STAGE = contextlib.nullcontext()
+_active_profiler = None
+
+class StageProfiler:
+    """
+    Collects elapsed time, call counts and (with track_memory) net bytes allocated per named
+    stage. Nested stages are timed independently; an outer stage's figures include its inner ones.
+    """
+
+    def __init__(self, track_memory: bool = True):
+        self.track_memory = track_memory
+        self.stats = {}
+        self._started_tracemalloc = False
+
+    def start(self) -> "StageProfiler":
+        """Makes this the active profiler (starting tracemalloc if memory is tracked)."""
+        global _active_profiler
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        _active_profiler = self
+        return self
+
+    def stop(self) -> None:
+        global _active_profiler
+        if _active_profiler is self:
+            _active_profiler = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        allocated_before = tracemalloc.get_traced_memory()[0] if self.track_memory else 0
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            entry = self.stats.setdefault(name, {'calls': 0, 'elapsed_s': 0.0, 'allocated_bytes': 0})
+            entry['calls'] += 1
+            entry['elapsed_s'] += elapsed
+            if self.track_memory:
+                entry['allocated_bytes'] += tracemalloc.get_traced_memory()[0] - allocated_before
+
+    def report(self) -> dict:
+        """Stages in the order they first ran, with totals."""
+        return {'stages': self.stats, 'track_memory': self.track_memory}
+
+    def write_report(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+def stage(name: str):
+    """Context manager timing `name` on the active profiler; a shared no-op when profiling is off."""
+    if _active_profiler is None:
+        return _NULL_STAGE
+    return _active_profiler.stage(name)
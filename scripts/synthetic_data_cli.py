@@ -0,0 +1,108 @@
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+
+import dataset_io
+import features
+from dataset_cache import DatasetCache, generate_dataset, to_generated_dtypes
+import generate_synthetic_data as gsd
+import heart_rate
+
+# Lightweight generate-and-write entry point. Generation and the csv / json / npy writers
+# use only NumPy and the standard library, so pandas is never imported here; parquet needs pyarrow.
+OUTPUT_FORMATS = ['csv', 'json', 'npy', 'parquet']
+FORMAT_EXTENSIONS = {'csv': '.csv', 'json': '.json', 'npy': '', 'parquet': '.parquet'}
+STRAIN_MODELS = ['sampled', 'heart_rate']
+DEFAULT_CACHE_MAX_MB = 1024
+
+def generate_table(num_days: int, end_date: datetime.date, seed: int | None,
+                   num_users: int = 1) -> tuple[dict[str, np.ndarray], dict]:
+    """
+    Generates num_days ending on end_date as a dict of 1-D arrays, plus the .npy attributes.
+    One user is generated as a stream with a checkpoint, so a single-user .npy output can be
+    extended later with generate_synthetic_data.py --append; several users get a 'user_id' column.
+    """
+    start_date = end_date - datetime.timedelta(days=num_days - 1)
+    if num_users > 1 and seed is None:
+        seed = np.random.SeedSequence().entropy
+    # The same code path as cache entries, so cached and fresh outputs match byte for byte
+    return generate_dataset(num_days, start_date, seed, num_users)
+
+def cached_generate_table(cache: DatasetCache, num_days: int, end_date: datetime.date, seed: int,
+                          num_users: int = 1) -> tuple[dict[str, np.ndarray], dict]:
+    """generate_table() through the dataset cache; the arrays are identical to a fresh generation."""
+    start_date = end_date - datetime.timedelta(days=num_days - 1)
+    table, attributes = cache.get_or_generate(num_days, start_date, seed, num_users)
+    return to_generated_dtypes(table), attributes
+
+def write_table(path: str, table: dict[str, np.ndarray], fmt: str, attributes: dict | None = None) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if fmt == 'csv':
+        dataset_io.write_csv(path, table)
+    elif fmt == 'json':
+        dataset_io.write_json(path, table)
+    elif fmt == 'npy':
+        dataset_io.write_npy_columns(path, table, attributes)
+    elif fmt == 'parquet':
+        dataset_io.write_parquet(path, table)
+    else:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {', '.join(OUTPUT_FORMATS)}.")
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate synthetic WHOOP-like data and write it without importing pandas.")
+    parser.add_argument('--days', type=int, default=gsd.NUM_DAYS, help=f"Days per user (default: {gsd.NUM_DAYS})")
+    parser.add_argument('--end-date', type=datetime.date.fromisoformat, default=gsd.END_DATE,
+                        help=f"Last generated day, YYYY-MM-DD (default: {gsd.END_DATE})")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible output (default: fresh entropy)")
+    parser.add_argument('--users', type=int, default=1, help="Number of users (default: 1)")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv', help="Output format (default: csv)")
+    parser.add_argument('--output', default=None,
+                        help="Output file, or directory for npy (default: data/synthetic_user_data plus the format's extension)")
+    parser.add_argument('--strain-model', choices=STRAIN_MODELS, default='sampled',
+                        help="'heart_rate' derives strain from simulated minute-level heart rate (default: sampled)")
+    parser.add_argument('--heart-rate-output', default=None, metavar='DIR',
+                        help="With --strain-model heart_rate, also store the raw minute-level stream in DIR")
+    parser.add_argument('--features', action='store_true',
+                        help="Also write rolling-baseline features next to the output (as <output>_features in the npy layout)")
+    parser.add_argument('--cache-dir', default=None, metavar='DIR',
+                        help="Reuse datasets from this content-addressed cache instead of regenerating them (requires --seed)")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_CACHE_MAX_MB,
+                        help=f"Evict least recently used cache entries beyond this size (default: {DEFAULT_CACHE_MAX_MB})")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.days <= 0 or args.users <= 0:
+        print("Error: --days and --users must be positive.", file=sys.stderr)
+        return 2
+    if args.cache_dir is not None and args.seed is None:
+        print("Error: --cache-dir needs --seed; only seeded datasets can be cached.", file=sys.stderr)
+        return 2
+    output = args.output or os.path.join(gsd.OUTPUT_DIR, "synthetic_user_data" + FORMAT_EXTENSIONS[args.format])
+    started = time.perf_counter()
+    if args.cache_dir is not None:
+        cache = DatasetCache(args.cache_dir, args.cache_max_mb << 20)
+        table, attributes = cached_generate_table(cache, args.days, args.end_date, args.seed, args.users)
+    else:
+        table, attributes = generate_table(args.days, args.end_date, args.seed, args.users)
+    if args.strain_model == 'heart_rate':
+        table = heart_rate.apply_heart_rate_strain(table, heart_rate.heart_rate_seed_sequence(args.seed),
+                                                   heart_rate_output=args.heart_rate_output)
+        # The checkpoint continues the sampled strain, so a heart-rate dataset cannot be appended to
+        attributes.pop('checkpoint', None)
+        attributes['strain_model'] = 'heart_rate'
+    write_table(output, table, args.format, attributes)
+    if args.features:
+        features.write_features(output, table)
+    print(f"Wrote {len(table['date'])} rows ({args.users} user(s) x {args.days} day(s)) to {output} "
+          f"in {time.perf_counter() - started:.3f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import datetime
+
+import numpy as np
+
+import dataset_io
+import generate_synthetic_data as gsd
+from dataset_cache import generate_dataset
+
+START_DATE = datetime.date(2025, 1, 1)
+SEED = 2
+
+def write_base(path: str) -> None:
+    """The default 90-day dataset with its generation checkpoint, as generate_synthetic_data.py writes it."""
+    table, attributes = generate_dataset(gsd.NUM_DAYS, START_DATE, SEED)
+    dataset_io.write_npy_columns(path, table, attributes)
+
+def single_shot(num_days: int) -> dict[str, np.ndarray]:
+    chunks = list(gsd.iter_daily_chunks(num_days, START_DATE, rng=SEED, trend_days=gsd.NUM_DAYS))
+    return dataset_io.to_compact_columns({name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]})
+
+def test_appends_equal_a_single_shot_run(tmp_path):
+    path = str(tmp_path / 'alex')
+    write_base(path)
+    # Two nightly runs, the second crossing chunk boundaries
+    assert gsd.append_to_dataset(path, START_DATE + datetime.timedelta(days=99)) == 10
+    assert gsd.append_to_dataset(path, START_DATE + datetime.timedelta(days=599), chunk_days=128) == 500
+    appended = dataset_io.load_npy_columns(path, mmap=False)
+    expected = single_shot(600)
+    assert appended.keys() == expected.keys()
+    for name, values in expected.items():
+        np.testing.assert_array_equal(appended[name], values, err_msg=name)
+
+def test_seasonal_trends_stop_at_the_trend_horizon(tmp_path):
+    path = str(tmp_path / 'alex')
+    write_base(path)
+    gsd.append_to_dataset(path, START_DATE + datetime.timedelta(days=1999))
+    sleep = np.asarray(dataset_io.load_npy_columns(path, ['sleep_duration_hours'])['sleep_duration_hours'], dtype=float)
+    last_year = sleep[-365:]
+    # A trend continued past the horizon would pin most nights at the clip floor by now
+    assert abs(last_year.mean() - (gsd.SLEEP_DURATION_MEAN_HOURS + gsd.SLEEP_DURATION_TOTAL_TREND_HOURS)) < 0.1
+    assert np.mean(last_year <= gsd.SLEEP_DURATION_MIN_HOURS) < 0.15
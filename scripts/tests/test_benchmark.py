@@ -0,0 +1,17 @@
+from benchmark_synthetic_data import MIN_REGRESSION_BYTES, compare_to_baseline
+
+def entry(stage: str, wall_time_s: float, peak_memory_bytes: int = 0) -> dict:
+    return {'scale': '90_days', 'stage': stage, 'wall_time_s': wall_time_s,
+            'peak_memory_bytes': peak_memory_bytes, 'worker_peak_rss_bytes': None}
+
+def test_sub_millisecond_noise_is_not_a_regression():
+    baseline = [entry('validate', 0.00015, 1000), entry('query', 0.0008)]
+    results = [entry('validate', 0.00026, 1900), entry('query', 0.0016)]
+    assert compare_to_baseline(results, baseline, threshold=0.25) == []
+
+def test_large_slowdowns_and_growth_are_regressions():
+    baseline = [entry('generate', 0.100, 10 * MIN_REGRESSION_BYTES)]
+    results = [entry('generate', 0.150, 20 * MIN_REGRESSION_BYTES)]
+    regressions = compare_to_baseline(results, baseline, threshold=0.25)
+    assert len(regressions) == 2
+    assert compare_to_baseline(results, baseline, threshold=0.25, min_regression_ms=100) == regressions[1:]
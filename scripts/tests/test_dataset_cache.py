@@ -0,0 +1,27 @@
+import filecmp
+import os
+
+import pytest
+
+import synthetic_data_cli
+
+def assert_same_files(left: str, right: str) -> None:
+    names = sorted(os.listdir(left))
+    assert names == sorted(os.listdir(right))
+    match, mismatch, errors = filecmp.cmpfiles(left, right, names, shallow=False)
+    assert not mismatch and not errors
+
+@pytest.mark.parametrize('users', [1, 5])
+def test_cached_output_is_byte_identical_to_fresh(tmp_path, users):
+    common = ['--format', 'npy', '--seed', '7', '--days', '60', '--users', str(users)]
+    cache = ['--cache-dir', str(tmp_path / 'cache')]
+    assert synthetic_data_cli.main(common + ['--output', str(tmp_path / 'fresh')]) == 0
+    assert synthetic_data_cli.main(common + cache + ['--output', str(tmp_path / 'miss')]) == 0
+    assert synthetic_data_cli.main(common + cache + ['--output', str(tmp_path / 'hit')]) == 0
+    assert_same_files(tmp_path / 'fresh', tmp_path / 'miss')
+    assert_same_files(tmp_path / 'fresh', tmp_path / 'hit')
+
+def test_cache_without_seed_is_rejected(tmp_path, capsys):
+    assert synthetic_data_cli.main(['--cache-dir', str(tmp_path / 'cache'), '--output', str(tmp_path / 'out.csv')]) == 2
+    assert '--seed' in capsys.readouterr().err
+    assert not os.path.exists(tmp_path / 'out.csv')
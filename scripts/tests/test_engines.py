@@ -0,0 +1,62 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import generate_synthetic_data as gsd
+
+# The loop and vectorized engines draw in different orders, so they can only agree in
+# distribution. Each seed is one independent 90-day run (the default horizon, which holds every
+# stress, travel and red-eye event); per-seed means over a group of days are independent samples
+# however autocorrelated the HRV baseline walk is within a run, so they are compared with a
+# two-sample z-test. Z_LIMIT keeps the chance of a false failure across every check below ~1e-4.
+NUM_SEEDS = 300
+Z_LIMIT = 4.5
+
+def day_groups(num_days: int = gsd.NUM_DAYS) -> dict[str, np.ndarray]:
+    """Day offsets of each event kind in the loop engine's schedule, plus the ordinary days."""
+    stress = [day for start in gsd.STRESS_WEEKS_START_DAYS for day in range(start, start + gsd.STRESS_WEEK_DURATION_DAYS)]
+    travel = [day for day in gsd.TRAVEL_DAYS_INDICES if day not in (gsd.RED_EYE_DAY_INDEX, gsd.POST_RED_EYE_DAY_INDEX)]
+    groups = {'stress': stress, 'travel': travel, 'red_eye': [gsd.RED_EYE_DAY_INDEX], 'post_red_eye': [gsd.POST_RED_EYE_DAY_INDEX]}
+    event_days = {day for days in groups.values() for day in days}
+    groups['ordinary'] = [day for day in range(num_days) if day not in event_days]
+    return {name: np.array(days) for name, days in groups.items()}
+
+def generate_runs(engine: str, seed_offset: int) -> dict[str, np.ndarray]:
+    """Every metric as a (seeds, days) array of independent default-horizon runs."""
+    frames = [gsd.generate_daily_metrics(gsd.NUM_DAYS, gsd.START_DATE, engine=engine, rng=seed_offset + seed)
+              for seed in range(NUM_SEEDS)]
+    return {metric: np.stack([frame[metric].to_numpy(dtype=float) for frame in frames]) for metric in gsd.METRIC_COLUMNS}
+
+@pytest.fixture(scope='module')
+def runs() -> dict[str, dict[str, np.ndarray]]:
+    return {'loop': generate_runs('loop', 0), 'vectorized': generate_runs('vectorized', 100_000)}
+
+def z_score(loop_samples: np.ndarray, vectorized_samples: np.ndarray) -> float:
+    standard_error = np.sqrt(loop_samples.var(ddof=1) / len(loop_samples) + vectorized_samples.var(ddof=1) / len(vectorized_samples))
+    difference = vectorized_samples.mean() - loop_samples.mean()
+    return 0.0 if standard_error == 0 and difference == 0 else abs(difference) / standard_error
+
+@pytest.mark.parametrize('metric', gsd.METRIC_COLUMNS)
+@pytest.mark.parametrize('group', list(day_groups()))
+def test_engines_agree_on_means(runs, metric, group):
+    days = day_groups()[group]
+    loop, vectorized = (runs[engine][metric][:, days].mean(axis=1) for engine in ('loop', 'vectorized'))
+    assert z_score(loop, vectorized) < Z_LIMIT, (f"{metric} on {group} days: loop {loop.mean():.3f}, "
+                                                f"vectorized {vectorized.mean():.3f}")
+
+@pytest.mark.parametrize('metric', gsd.METRIC_COLUMNS)
+@pytest.mark.parametrize('group', list(day_groups()))
+def test_engines_agree_on_spread(runs, metric, group):
+    # Per-seed mean squared deviation from the engine's mean on each day of the group
+    days = day_groups()[group]
+    loop, vectorized = (np.mean((runs[engine][metric][:, days] - runs[engine][metric][:, days].mean(axis=0)) ** 2, axis=1)
+                        for engine in ('loop', 'vectorized'))
+    assert z_score(loop, vectorized) < Z_LIMIT, (f"{metric} on {group} days: loop std {np.sqrt(loop.mean()):.3f}, "
+                                                f"vectorized std {np.sqrt(vectorized.mean()):.3f}")
+
+@pytest.mark.parametrize('engine', ['loop', 'vectorized'])
+def test_zero_days_gives_an_empty_frame(engine):
+    frame = gsd.generate_daily_metrics(0, datetime.date(2025, 1, 1), engine=engine, rng=0)
+    assert len(frame) == 0
+    assert list(frame.columns) == ['date'] + gsd.METRIC_COLUMNS
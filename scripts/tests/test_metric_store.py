@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from metric_store import MetricStore
+
+@pytest.fixture
+def store() -> MetricStore:
+    """30 days of January 2025 with hrv = 40 + day offset."""
+    dates = np.datetime64('2025-01-01') + np.arange(30)
+    return MetricStore.from_arrays(dates, {'hrv': 40 + np.arange(30)})
+
+def test_range_queries_inside_the_store(store):
+    assert store.count('2025-01-01', '2025-01-10') == 10
+    assert store.mean('hrv', '2025-01-01', '2025-01-10') == 44.5
+    assert store.min('hrv', '2025-01-05', '2025-01-08') == 44
+    assert store.max('hrv', '2025-01-05', '2025-01-08') == 47
+
+def test_range_queries_overlapping_the_ends_are_clipped(store):
+    assert store.count('2024-12-25', '2025-01-02') == 2
+    assert store.mean('hrv', '2025-01-29', '2025-02-10') == 68.5
+    assert store.max('hrv', '2025-01-29', None) == 69
+
+@pytest.mark.parametrize('start, end', [
+    ('2024-12-01', '2024-12-05'), # Before the store
+    ('2025-03-01', '2025-03-05'), # After the store
+    ('2025-03-01', None),         # Open-ended, after the store
+    ('2025-01-10', '2025-01-05'), # Inverted
+])
+def test_range_queries_outside_the_store_are_empty(store, start, end):
+    assert store.count(start, end) == 0
+    assert store.mean('hrv', start, end) is None
+    assert store.min('hrv', start, end) is None
+    assert store.max('hrv', start, end) is None
@@ -0,0 +1,53 @@
+import datetime
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+import dataset_io
+import generate_synthetic_data as gsd
+from metrics_service import MetricsService, make_server
+
+START_DATE = datetime.date(2025, 1, 1)
+
+@pytest.fixture
+def base_url(tmp_path):
+    """A metrics service on an ephemeral port serving 30 generated days as dataset 'alex'."""
+    path = str(tmp_path / 'alex')
+    dataset_io.write_npy_columns(path, gsd.generate_daily_arrays(30, START_DATE, rng=0),
+                                 {'start_date': START_DATE.isoformat(), 'contiguous': True})
+    server = make_server(MetricsService({'alex': path}), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def get(url: str) -> tuple[int, dict]:
+    try:
+        with urlopen(url) as response:
+            return response.status, json.load(response)
+    except HTTPError as e:
+        return e.code, json.load(e)
+
+def test_window_keeps_integer_metrics_integral(base_url):
+    status, body = get(f"{base_url}/users/alex/window?metric=hrv&start=2025-01-01&end=2025-01-10")
+    assert status == 200
+    assert isinstance(body['min'], int) and isinstance(body['max'], int)
+    assert body['days'] == 10
+
+@pytest.mark.parametrize('query', ['start=2026-01-01', 'start=2024-01-01&end=2024-01-05', 'start=2025-01-10&end=2025-01-05'])
+def test_window_outside_the_data_is_empty(base_url, query):
+    status, body = get(f"{base_url}/users/alex/window?metric=hrv&{query}")
+    assert status == 200
+    assert (body['days'], body['mean'], body['min'], body['max']) == (0, None, None, None)
+
+def test_unexpected_errors_get_a_json_500(base_url, monkeypatch):
+    def fail(self, path, query):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(MetricsService, 'handle', fail)
+    status, body = get(f"{base_url}/users/alex/latest")
+    assert status == 500
+    assert 'boom' in body['error']
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from run_evaluations import HttpChatEndpoint, StubChatServer, run_suite
+
+CASES = [{'case_id': f"case-{index}", 'user_prompt': "How did I sleep?", 'expected_keywords': ['sleep']} for index in range(3)]
+
+async def serve_raw(body: bytes) -> tuple[asyncio.AbstractServer, str]:
+    """A chat endpoint that answers every request with 200 and `body`."""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        length = 0
+        await reader.readline()
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        await reader.readexactly(length)
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+        writer.close()
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/api/chat"
+
+def test_stub_answers_every_case_from_its_context():
+    async def run():
+        stub = await StubChatServer(latency=0.01).start()
+        try:
+            return await run_suite(CASES, HttpChatEndpoint(stub.url))
+        finally:
+            await stub.stop()
+    summary = asyncio.run(run())['summary']
+    assert summary['succeeded'] == len(CASES)
+    assert summary['context_ignored'] == 0
+
+@pytest.mark.parametrize('body', [b'hello', b'[1]', b'{"answer": "hi"}'])
+def test_malformed_replies_fail_only_their_case(body):
+    async def run():
+        server, url = await serve_raw(body)
+        async with server:
+            return await run_suite(CASES, HttpChatEndpoint(url), retries=2)
+    report = asyncio.run(run())
+    assert [result['case_id'] for result in report['results']] == [case['case_id'] for case in CASES]
+    assert all(not result['ok'] and 'Malformed reply' in result['error'] for result in report['results'])
+    assert report['summary']['retries'] == 0